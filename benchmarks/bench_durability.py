@@ -0,0 +1,57 @@
+"""
+Measures throughput of trace writers in different durability modes.
+
+Usage: python benchmarks/bench_durability.py [DIRECTORY]
+
+DIRECTORY should be on the disk where traces are stored (a temporary directory is used by default).
+"""
+
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from nicetrace import DirWriter, trace
+from nicetrace.writer.filewriter import DURABILITY_MODES, write_file
+
+N_FILES = 500
+N_TRACES = 200
+DATA = '{"name": "x", "entries": "' + "x" * 10_000 + '"}'
+
+
+def bench_write_file(path, durability):
+    start = time.perf_counter()
+    for i in range(N_FILES):
+        write_file(f"{path}/file-{i % 10}.json", DATA, durability)
+    return N_FILES / (time.perf_counter() - start)
+
+
+def bench_dir_writer(path, durability):
+    start = time.perf_counter()
+    with DirWriter(
+        path, min_write_delay=timedelta(milliseconds=50), durability=durability
+    ):
+        for i in range(N_TRACES):
+            with trace("root", inputs={"data": "x" * 10_000}):
+                with trace("child"):
+                    pass
+    return N_TRACES / (time.perf_counter() - start)
+
+
+def main():
+    base = sys.argv[1] if len(sys.argv) > 1 else None
+    print(f"{'mode':10} {'write_file/s':>14} {'traces/s':>10}")
+    for durability in DURABILITY_MODES:
+        with tempfile.TemporaryDirectory(dir=base) as path:
+            # "batched" is a writer mode, single write_file calls are not flushed
+            files = (
+                bench_write_file(path, durability) if durability != "batched" else None
+            )
+        with tempfile.TemporaryDirectory(dir=base) as path:
+            traces = bench_dir_writer(path, durability)
+        files_str = f"{files:14.0f}" if files is not None else f"{'-':>14}"
+        print(f"{durability:10} {files_str} {traces:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Measures throughput of `TracedThreadPoolExecutor` compared to a plain `ThreadPoolExecutor`.
+
+Usage: python benchmarks/bench_executors.py
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from nicetrace import trace
+from nicetrace.executors import TracedThreadPoolExecutor
+
+
+def task(i):
+    return i
+
+
+def bench(name, make_pool, n_tasks):
+    with trace("root"):
+        with make_pool() as pool:
+            start = time.perf_counter()
+            for _ in pool.map(task, range(n_tasks)):
+                pass
+            seconds = time.perf_counter() - start
+    print(f"{name:<30} {n_tasks / seconds:10.0f} tasks/s")
+
+
+def main():
+    n_tasks = 20_000
+    bench("ThreadPoolExecutor", lambda: ThreadPoolExecutor(8), n_tasks)
+    bench("TracedThreadPoolExecutor", lambda: TracedThreadPoolExecutor(8), n_tasks)
+    bench(
+        "TracedThreadPoolExecutor (nodes)",
+        lambda: TracedThreadPoolExecutor(8, trace_tasks=True),
+        n_tasks,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compares JSON backends on serialization and parsing of realistic traces.
+
+Usage: python benchmarks/bench_json.py [DIRECTORY]
+
+Traces are generated by `nicetrace.synthetic`; DIRECTORY is used for the file round trip
+(a temporary directory is used by default).
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from nicetrace import jsonbackend
+from nicetrace.synthetic import TraceShape, generate_trace
+from nicetrace.writer.base import serialize_trace
+from nicetrace.writer.filewriter import write_file
+
+SHAPES = {
+    "small": TraceShape(depth=2, fanout=3, payload_size=200),
+    "medium": TraceShape(depth=4, fanout=4, payload_size=1000, error_rate=0.05),
+    "large": TraceShape(depth=5, fanout=5, payload_size=2000, blob_size=5000),
+}
+MIN_TIME = 0.5
+
+
+def measure(fn) -> float:
+    """Returns the mean time of a call in seconds"""
+    count = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME:
+            return elapsed / count
+
+
+def bench(root, path):
+    data = serialize_trace(root)
+    filename = os.path.join(path, "trace.json")
+
+    def round_trip():
+        write_file(filename, serialize_trace(root))
+        with open(filename, "rb") as f:
+            jsonbackend.loads(f.read())
+
+    return (
+        len(data),
+        measure(lambda: serialize_trace(root)),
+        measure(lambda: jsonbackend.loads(data)),
+        measure(round_trip),
+    )
+
+
+def main():
+    base = sys.argv[1] if len(sys.argv) > 1 else None
+    traces = {name: generate_trace(shape, seed=0) for name, shape in SHAPES.items()}
+    print(
+        f"{'trace':8} {'backend':8} {'size':>10} {'encode ms':>10} {'decode ms':>10} {'file ms':>10}"
+    )
+    with tempfile.TemporaryDirectory(dir=base) as path:
+        for name, root in traces.items():
+            for backend in jsonbackend.BACKENDS:
+                try:
+                    jsonbackend.set_json_backend(backend)
+                except ImportError:
+                    continue
+                size, encode, decode, file = bench(root, path)
+                print(
+                    f"{name:8} {backend:8} {size:10} {encode * 1000:10.2f} "
+                    f"{decode * 1000:10.2f} {file * 1000:10.2f}"
+                )
+    jsonbackend.set_json_backend()
+
+
+if __name__ == "__main__":
+    main()
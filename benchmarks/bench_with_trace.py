@@ -0,0 +1,64 @@
+"""
+Measures overhead of `with_trace` decorator per call.
+
+Usage: python benchmarks/bench_with_trace.py
+
+To compare with an earlier version, run the same script against its checkout, e.g.:
+
+    git worktree add /tmp/nicetrace-base <commit>
+    PYTHONPATH=/tmp/nicetrace-base/src python benchmarks/bench_with_trace.py
+
+Variants that the checked out version does not support are skipped.
+"""
+
+import timeit
+
+from nicetrace import trace, with_trace
+
+
+def add(x, y):
+    return x + y
+
+
+def context_manager_add(x, y):
+    # Only an approximation of a decorator built on the `trace` context manager,
+    # not the code path of any released version; compare versions by running this script against them
+    with trace("add", kind="call", inputs={"x": x, "y": y}) as node:
+        output = add(x, y)
+        node.add_output("", output)
+        return output
+
+
+def traced(**kwargs):
+    try:
+        return with_trace(**kwargs)(add) if kwargs else with_trace(add)
+    except TypeError:
+        # Options not supported by this version
+        return None
+
+
+def bench(name, fn, number):
+    if fn is None:
+        print(f"{name:<30} {'skipped':>8}")
+        return
+    with trace("root") as root:
+        seconds = min(timeit.repeat(lambda: fn(1, 2), number=number, repeat=5))
+        root.children = None
+    print(f"{name:<30} {seconds / number * 1e6:8.2f} us/call")
+
+
+def main():
+    number = 20_000
+    bench("plain function", add, number)
+    bench("trace context manager", context_manager_add, number)
+    bench("with_trace", traced(), number)
+    bench("with_trace (selected input)", traced(capture_inputs=["x"]), number)
+    bench(
+        "with_trace (no capture)",
+        traced(capture_inputs=False, capture_output=False),
+        number,
+    )
+
+
+if __name__ == "__main__":
+    main()
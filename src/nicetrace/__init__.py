@@ -6,19 +6,25 @@ from .tracing import (
     trace_instant,
     TracingNodeState,
     current_tracing_node,
+    current_node_ref,
+    NodeRef,
     with_trace,
 )
 from .serialization import (
     register_custom_serializer,
     unregister_custom_serializer,
     serialize_with_type,
+    configure_exceptions,
 )
 from .data.html import Html
 from .data.blob import DataWithMime
 from .writer.base import current_writer, TraceWriter
 from .writer.filewriter import DirWriter, FileWriter
+from .writer.composite import CompositeWriter, Sink
+from .writer.remotewriter import RemoteWriter
+from .writer.socketwriter import SocketWriter
 from .reader.filereader import DirReader, TraceReader
-from .html.statichtml import get_full_html, write_html
+from .html.statichtml import get_full_html, get_compressed_html, write_html
 
 __all__ = [
     "trace",
@@ -29,17 +35,25 @@ __all__ = [
     "TracingNodeState",
     "Tag",
     "current_tracing_node",
+    "current_node_ref",
+    "NodeRef",
     "current_writer",
     "register_custom_serializer",
     "unregister_custom_serializer",
     "serialize_with_type",
+    "configure_exceptions",
     "Html",
     "DataWithMime",
     "TraceWriter",
     "DirWriter",
     "FileWriter",
+    "CompositeWriter",
+    "Sink",
+    "RemoteWriter",
+    "SocketWriter",
     "TraceReader",
     "DirReader",
     "get_full_html",
+    "get_compressed_html",
     "write_html",
 ]
@@ -0,0 +1,245 @@
+import argparse
+import os
+import signal
+import socket
+import stat
+from datetime import timedelta
+from threading import Condition, Event, Lock, Thread
+from typing import Optional
+
+from .writer.filewriter import DURABILITY_MODES, LAYOUTS, DirWriter, read_layout
+from .writer.socketwriter import DEFAULT_SOCKET_PATH, read_message
+
+
+class _Trace:
+    __slots__ = ("root", "nodes", "connection")
+
+    def __init__(self):
+        self.root: Optional[dict] = None
+        self.nodes: dict[str, dict] = {}
+        self.connection = None
+
+
+class Collector:
+    """
+    Receives traces from `SocketWriter`s of local processes over a Unix domain socket
+    and writes them into a directory by a `DirWriter`.
+
+    Traces are assembled from node events in memory; unfinished traces are written at most
+    once per `min_write_delay`, finished traces immediately. When a process disconnects,
+    its unfinished traces are written as they are and forgotten.
+    """
+
+    def __init__(
+        self,
+        writer: DirWriter,
+        socket_path: str = DEFAULT_SOCKET_PATH,
+        min_write_delay: timedelta = timedelta(milliseconds=300),
+    ):
+        self.writer = writer
+        self.socket_path = socket_path
+        self.min_write_delay = min_write_delay
+        self.traces: dict[str, _Trace] = {}
+        self.dirty: set[str] = set()
+        self.errors = 0
+        self.last_error: Optional[Exception] = None
+        self.lock = Lock()
+        self.condition = Condition(self.lock)
+        self.state = "new"
+        self.server: Optional[socket.socket] = None
+        self.threads: list[Thread] = []
+        self.connections: set[socket.socket] = set()
+
+    def _apply(self, message: dict, connection) -> None:
+        trace_uid = message["trace"]
+        trace = self.traces.get(trace_uid)
+        if trace is None:
+            trace = _Trace()
+            self.traces[trace_uid] = trace
+        trace.connection = connection
+        for data in message["nodes"]:
+            parent_uid = data.pop("parent_uid", None)
+            subtree = data.pop("subtree", False)
+            node = trace.nodes.get(data["uid"])
+            if node is not None:
+                # Updated in place, so the node stays referenced by its parent
+                children = node.get("children")
+                node.clear()
+                node.update(data)
+                if children and not subtree:
+                    node["children"] = children
+                continue
+            if parent_uid is None:
+                trace.root = data
+            else:
+                parent = trace.nodes.get(parent_uid)
+                if parent is None:
+                    continue
+                parent.setdefault("children", []).append(data)
+            trace.nodes[data["uid"]] = data
+        if message["final"]:
+            self._write(trace_uid)
+        else:
+            self.dirty.add(trace_uid)
+
+    def _write(self, trace_uid: str, forget: bool = True):
+        if forget:
+            trace = self.traces.pop(trace_uid)
+            self.dirty.discard(trace_uid)
+        else:
+            trace = self.traces[trace_uid]
+        if trace.root is None:
+            return
+        try:
+            self.writer.write_trace_data(trace.root)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+
+    def _handle_connection(self, connection: socket.socket):
+        try:
+            with connection.makefile("rb") as file:
+                while True:
+                    message = read_message(file)
+                    if message is None:
+                        break
+                    with self.lock:
+                        self._apply(message, connection)
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+                self.last_error = e
+        finally:
+            connection.close()
+            with self.lock:
+                self.connections.discard(connection)
+                for trace_uid in [
+                    uid
+                    for uid, trace in self.traces.items()
+                    if trace.connection is connection
+                ]:
+                    self._write(trace_uid)
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                # Server socket was closed
+                return
+            with self.lock:
+                if self.state != "running":
+                    connection.close()
+                    return
+                self.connections.add(connection)
+            Thread(
+                target=self._handle_connection, args=(connection,), daemon=True
+            ).start()
+
+    def _write_loop(self):
+        delay = self.min_write_delay.total_seconds()
+        while True:
+            with self.condition:
+                self.condition.wait(delay)
+                for trace_uid in self.dirty:
+                    self._write(trace_uid, forget=False)
+                self.dirty.clear()
+                if self.state != "running":
+                    return
+
+    def _bind(self) -> socket.socket:
+        if os.path.exists(self.socket_path):
+            if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                raise Exception(f"'{self.socket_path}' exists and it is not a socket")
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                # A socket left by a collector that was not stopped properly
+                os.unlink(self.socket_path)
+            else:
+                raise Exception(
+                    f"A collector is already running at '{self.socket_path}'"
+                )
+            finally:
+                probe.close()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(128)
+        return server
+
+    def start(self):
+        with self.lock:
+            assert self.state == "new"
+            self.state = "running"
+        self.server = self._bind()
+        self.threads = [
+            Thread(target=self._accept_loop, daemon=True),
+            Thread(target=self._write_loop, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stops accepting connections and writes all traces in memory.
+        """
+        with self.condition:
+            self.state = "stopped"
+            self.condition.notify()
+            connections = list(self.connections)
+        # Shutdown wakes up the thread blocked in `accept`
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+        os.unlink(self.socket_path)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for thread in self.threads:
+            thread.join()
+        with self.lock:
+            for trace_uid in list(self.traces):
+                self._write(trace_uid)
+        self.writer.sync()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Collect traces from local processes (SocketWriter) and write them into a directory"
+    )
+    parser.add_argument("path", help="Directory with traces")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--layout", choices=LAYOUTS, default=None)
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default="fast")
+    args = parser.parse_args()
+
+    os.makedirs(args.path, exist_ok=True)
+    writer = DirWriter(
+        args.path,
+        durability=args.durability,
+        layout=args.layout or read_layout(args.path),
+    )
+    stop = Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    with Collector(writer, args.socket):
+        print(f"Collecting traces from {args.socket} into {args.path}")
+        try:
+            stop.wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Iterable, Optional, Sequence
+
+from .reader.base import TraceReader
+from .tracing import TracingNode
+
+Path = tuple[tuple[str, Optional[str]], ...]
+
+
+@dataclass
+class PathStats:
+    """
+    Aggregated values of all nodes with the same call path.
+    """
+
+    count: int = 0
+    duration: float = 0.0
+    counters: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class PathDiff:
+    """
+    Comparison of a call path in two (groups of) traces.
+    Values are averages per trace; `status` is "changed", "new" (only in `b`) or "missing" (only in `a`).
+    """
+
+    path: list[str]
+    status: str
+    count_a: float
+    count_b: float
+    duration_a: float
+    duration_b: float
+    duration_delta: float
+    counters_a: dict[str, float]
+    counters_b: dict[str, float]
+    counters_delta: dict[str, float]
+
+
+def _node_duration(node: dict) -> float:
+    start_time = node.get("start_time")
+    end_time = node.get("end_time")
+    if not start_time or not end_time:
+        return 0.0
+    return (
+        datetime.fromisoformat(end_time) - datetime.fromisoformat(start_time)
+    ).total_seconds()
+
+
+def _collect(
+    node: dict, parent_path: Path, result: dict[Path, PathStats]
+) -> dict[str, float]:
+    path = parent_path + ((node["name"], node.get("kind")),)
+    stats = result.get(path)
+    if stats is None:
+        stats = PathStats()
+        result[path] = stats
+    stats.count += 1
+    stats.duration += _node_duration(node)
+
+    # Counters are summed over the subtree, as the browser shows them
+    counters = dict((node.get("meta") or {}).get("counters") or {})
+    for child in node.get("children", ()):
+        for key, value in _collect(child, path, result).items():
+            counters[key] = counters.get(key, 0) + value
+    for key, value in counters.items():
+        stats.counters[key] = stats.counters.get(key, 0) + value
+    return counters
+
+
+def aggregate_paths(
+    traces: Iterable[dict | TracingNode],
+) -> tuple[dict[Path, PathStats], int]:
+    """
+    Aggregates nodes of traces by their call path (sequence of names and kinds from the root).
+    Returns the aggregation and the number of traces.
+    """
+    result = {}
+    n_traces = 0
+    for trace in traces:
+        if isinstance(trace, TracingNode):
+            trace = trace.to_dict()
+        _collect(trace, (), result)
+        n_traces += 1
+    return result, n_traces
+
+
+def _format_path(path: Path) -> list[str]:
+    return [f"{kind}:{name}" if kind else name for name, kind in path]
+
+
+def _average(counters: dict[str, float], n: int) -> dict[str, float]:
+    return {key: value / n for key, value in counters.items()}
+
+
+def diff_traces(
+    a: dict | TracingNode | Sequence[dict | TracingNode],
+    b: dict | TracingNode | Sequence[dict | TracingNode],
+) -> list[PathDiff]:
+    """
+    Compares two traces or two groups of traces.
+
+    Nodes are aligned by their call path; repeated calls with the same path are summed within a trace
+    and groups are compared by averages per trace.
+    The result is sorted by the absolute difference of durations.
+    """
+    if isinstance(a, (dict, TracingNode)):
+        a = [a]
+    if isinstance(b, (dict, TracingNode)):
+        b = [b]
+    paths_a, n_a = aggregate_paths(a)
+    paths_b, n_b = aggregate_paths(b)
+    if n_a == 0 or n_b == 0:
+        raise Exception("Both sides of a diff need at least one trace")
+
+    empty = PathStats()
+    result = []
+    for path in list(paths_a) + [p for p in paths_b if p not in paths_a]:
+        stats_a = paths_a.get(path, empty)
+        stats_b = paths_b.get(path, empty)
+        if path not in paths_b:
+            status = "missing"
+        elif path not in paths_a:
+            status = "new"
+        else:
+            status = "changed"
+        counters_a = _average(stats_a.counters, n_a)
+        counters_b = _average(stats_b.counters, n_b)
+        result.append(
+            PathDiff(
+                path=_format_path(path),
+                status=status,
+                count_a=stats_a.count / n_a,
+                count_b=stats_b.count / n_b,
+                duration_a=stats_a.duration / n_a,
+                duration_b=stats_b.duration / n_b,
+                duration_delta=stats_b.duration / n_b - stats_a.duration / n_a,
+                counters_a=counters_a,
+                counters_b=counters_b,
+                counters_delta={
+                    key: counters_b.get(key, 0) - counters_a.get(key, 0)
+                    for key in counters_a.keys() | counters_b.keys()
+                },
+            )
+        )
+    result.sort(key=lambda d: abs(d.duration_delta), reverse=True)
+    return result
+
+
+def diff_stored_traces(
+    reader: TraceReader, storage_ids_a: Sequence[str], storage_ids_b: Sequence[str]
+) -> list[PathDiff]:
+    """
+    Compares two groups of traces read from a `TraceReader`.
+    """
+    return diff_traces(
+        [reader.read_trace(storage_id) for storage_id in storage_ids_a],
+        [reader.read_trace(storage_id) for storage_id in storage_ids_b],
+    )
+
+
+def format_diff(diffs: Sequence[PathDiff], limit: Optional[int] = None) -> str:
+    """
+    Formats a diff as a text table.
+    """
+    lines = [f"{'before':>10} {'after':>10} {'delta':>10}  path"]
+    for diff in diffs[:limit]:
+        path = " > ".join(diff.path)
+        if diff.status != "changed":
+            path += f" [{diff.status}]"
+        lines.append(
+            f"{diff.duration_a:10.3f} {diff.duration_b:10.3f} {diff.duration_delta:+10.3f}  {path}"
+        )
+        for key, delta in sorted(diff.counters_delta.items()):
+            if delta:
+                lines.append(f"{'':33}  {key}: {delta:+g}")
+    return "\n".join(lines)
+
+
+def _read_traces(path: str) -> list[dict]:
+    from .reader.filereader import DirReader, read_trace_file
+
+    if os.path.isdir(path):
+        reader = DirReader(path)
+        return [
+            reader.read_trace(summary["storage_id"])
+            for summary in reader.list_summaries()
+        ]
+    return [read_trace_file(path)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare durations and counters of two traces or two directories of traces"
+    )
+    parser.add_argument("before", help="Trace file or directory with traces")
+    parser.add_argument("after", help="Trace file or directory with traces")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print result as JSON")
+    args = parser.parse_args()
+
+    diffs = diff_traces(_read_traces(args.before), _read_traces(args.after))
+    if args.json:
+        print(json.dumps([asdict(d) for d in diffs[: args.limit]], indent=2))
+    else:
+        print(format_diff(diffs, args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .tracing import _TRACING_STACK, TracingNodeState, trace
+
+
+def _run_task(name: Optional[str], kind: str, fn: Callable, *args, **kwargs):
+    parents = _TRACING_STACK.get()
+    if parents and parents[-1].state != TracingNodeState.OPEN:
+        # The submitting node was closed before the task started (nothing waited for it),
+        # the task is traced as a new trace instead of being attached to a closed node
+        _TRACING_STACK.set(())
+    if name is None:
+        return fn(*args, **kwargs)
+    with trace(name, kind=kind):
+        return fn(*args, **kwargs)
+
+
+def _wrap_task(
+    fn: Callable, args, kwargs, trace_task: bool, name: Optional[str], kind: str
+) -> Callable[[], Any]:
+    # Each task needs its own copy, as a context cannot be entered concurrently
+    ctx = contextvars.copy_context()
+    if trace_task:
+        name = name or getattr(fn, "__name__", "task")
+    else:
+        name = None
+    return functools.partial(ctx.run, _run_task, name, kind, fn, *args, **kwargs)
+
+
+class TracedThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    A drop-in replacement of `concurrent.futures.ThreadPoolExecutor` that runs
+    submitted tasks in the context of the caller, so they see the current tracing node
+    and the current writer.
+
+    If `trace_tasks` is `True`, each task is wrapped in its own child node.
+
+    A task that starts after the submitting node was closed is traced as a new trace.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        thread_name_prefix: str = "",
+        initializer=None,
+        initargs=(),
+        *,
+        trace_tasks: bool = False,
+        kind: str = "task",
+    ):
+        super().__init__(max_workers, thread_name_prefix, initializer, initargs)
+        self.trace_tasks = trace_tasks
+        self.kind = kind
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        return super().submit(
+            _wrap_task(fn, args, kwargs, self.trace_tasks, None, self.kind)
+        )
+
+
+def run_in_executor(
+    fn: Callable,
+    *args,
+    executor: Optional[Executor] = None,
+    trace_task: bool = False,
+    name: Optional[str] = None,
+    kind: str = "task",
+) -> asyncio.Future:
+    """
+    Traced variant of `loop.run_in_executor`; it runs `fn` in the tracing context of the caller.
+
+    If `trace_task` is `True`, the call is wrapped in its own child node.
+    """
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(
+        executor, _wrap_task(fn, args, {}, trace_task, name, kind)
+    )
+
+
+def set_traced_default_executor(max_workers: Optional[int] = None, **kwargs):
+    """
+    Sets `TracedThreadPoolExecutor` as the default executor of the running loop.
+    After that, also plain `loop.run_in_executor(None, ...)` calls propagate the tracing context.
+    """
+    loop = asyncio.get_running_loop()
+    executor = TracedThreadPoolExecutor(max_workers, **kwargs)
+    loop.set_default_executor(executor)
+    return executor
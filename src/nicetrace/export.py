@@ -0,0 +1,278 @@
+import argparse
+import json
+from datetime import datetime
+from typing import IO, Iterator, Optional
+
+from .tracing import TracingNode
+
+
+def _as_dict(trace: dict | TracingNode) -> dict:
+    if isinstance(trace, TracingNode):
+        return trace.to_dict()
+    return trace
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value).timestamp() * 1_000_000
+
+
+class _Times:
+    """
+    Start and end times (in microseconds) of all nodes of a trace.
+    Instant nodes end when they start; open nodes end at the latest time seen in the trace.
+    """
+
+    def __init__(self, root: dict):
+        self.times = {}
+        latest = None
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            start = _timestamp(node.get("start_time"))
+            end = _timestamp(node.get("end_time"))
+            if start is None:
+                start = end
+            self.times[node["uid"]] = (start, end)
+            for value in (start, end):
+                if value is not None and (latest is None or value > latest):
+                    latest = value
+            stack.extend(node.get("children", ()))
+        self.origin = self.times[root["uid"]][0]
+        self.latest = latest
+
+    def get(self, node: dict) -> tuple[float, float]:
+        start, end = self.times[node["uid"]]
+        if end is None:
+            end = self.latest
+        return start, end
+
+
+def critical_path(trace: dict | TracingNode) -> list[str]:
+    """
+    Returns uids of nodes that determine the end-to-end latency of the root, from the root downwards.
+
+    Starting at the end of a node, the child that finished last is on the critical path;
+    then the child that finished last before that child started, and so on.
+    The same rule is applied recursively to children on the path.
+    """
+    root = _as_dict(trace)
+    times = _Times(root)
+    result = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        result.append(node["uid"])
+        children = sorted(
+            node.get("children", ()), key=lambda c: times.get(c)[1], reverse=True
+        )
+        cursor = times.get(node)[1]
+        on_path = []
+        for child in children:
+            start, end = times.get(child)
+            if end <= cursor:
+                on_path.append(child)
+                cursor = start
+        # The earliest child is popped first, so the result is in depth-first order
+        stack.extend(on_path)
+    return result
+
+
+def _assign_lanes(children: list[dict], times: _Times) -> list[list[dict]]:
+    """
+    Splits children into lanes of non-overlapping nodes (greedy interval partitioning).
+    """
+    lanes = []
+    lane_ends = []
+    for child in sorted(children, key=lambda c: times.get(c)[0]):
+        start, end = times.get(child)
+        for i, lane_end in enumerate(lane_ends):
+            if lane_end <= start:
+                lanes[i].append(child)
+                lane_ends[i] = end
+                break
+        else:
+            lanes.append([child])
+            lane_ends.append(end)
+    return lanes
+
+
+def _iter_spans(
+    root: dict, times: _Times
+) -> Iterator[tuple[dict, float, float, int, Optional[str]]]:
+    """
+    Yields (node, start, end, lane, lane_name) in the depth-first order;
+    `lane_name` is set only for the first node of a new lane.
+    Children overlapping in time are moved to new lanes, the first lane of children is the lane of the parent.
+    """
+    n_lanes = 1
+    stack = [(root, 0, "main")]
+    while stack:
+        node, lane, lane_name = stack.pop()
+        start, end = times.get(node)
+        yield node, start, end, lane, lane_name
+        children = node.get("children")
+        if not children:
+            continue
+        pushed = []
+        for i, lane_children in enumerate(_assign_lanes(children, times)):
+            if i == 0:
+                child_lane, name = lane, None
+            else:
+                child_lane, name = n_lanes, f"{node['name']} #{i + 1}"
+                n_lanes += 1
+            for j, child in enumerate(lane_children):
+                pushed.append((child, child_lane, name if j == 0 else None))
+        stack.extend(reversed(pushed))
+
+
+def iter_chrome_events(trace: dict | TracingNode, pid: int = 1) -> Iterator[dict]:
+    """
+    Yields events of the Chrome Trace Event format (complete "X" events for nodes, "i" events for instant nodes).
+    Concurrent children are placed into separate threads (lanes); nodes on the critical path
+    have category "critical".
+    """
+    root = _as_dict(trace)
+    times = _Times(root)
+    critical = set(critical_path(root))
+    for node, start, end, lane, lane_name in _iter_spans(root, times):
+        if lane_name is not None:
+            yield {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": lane,
+                "args": {"name": lane_name},
+            }
+        args = {"uid": node["uid"]}
+        if node.get("kind"):
+            args["kind"] = node["kind"]
+        if node.get("state"):
+            args["state"] = node["state"]
+        counters = (node.get("meta") or {}).get("counters")
+        if counters:
+            args["counters"] = counters
+        event = {
+            "name": node["name"],
+            "cat": "critical" if node["uid"] in critical else "node",
+            "pid": pid,
+            "tid": lane,
+            "ts": start - times.origin,
+            "args": args,
+        }
+        if node.get("start_time"):
+            event["ph"] = "X"
+            event["dur"] = end - start
+        else:
+            event["ph"] = "i"
+            event["s"] = "t"
+        yield event
+
+
+def write_chrome_trace(trace: dict | TracingNode, file: IO[str]):
+    """
+    Writes a trace in the Chrome Trace Event format (JSON object format) into an opened text file.
+    Events are written one by one, so the whole output is never held in memory.
+    The file can be opened in `chrome://tracing`, Perfetto or speedscope.
+    """
+    file.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+    first = True
+    for event in iter_chrome_events(trace):
+        if not first:
+            file.write(",\n")
+        file.write(json.dumps(event))
+        first = False
+    file.write("\n]}\n")
+
+
+def to_speedscope(trace: dict | TracingNode) -> dict:
+    """
+    Converts a trace into the speedscope file format; each lane of concurrent nodes is a separate evented profile.
+    Frames of nodes on the critical path are marked by the "critical" file name.
+    """
+    root = _as_dict(trace)
+    times = _Times(root)
+    critical = set(critical_path(root))
+    frames = []
+    frame_ids = {}
+    lanes = {}
+    lane_names = {}
+    # Nodes of one lane do not overlap, so open/close events are generated by a stack per lane
+    open_stacks = {}
+
+    def close_until(lane: int, time: float):
+        stack = open_stacks[lane]
+        while stack and stack[-1][1] <= time:
+            frame_id, end = stack.pop()
+            lanes[lane].append({"type": "C", "frame": frame_id, "at": end})
+
+    for node, start, end, lane, lane_name in _iter_spans(root, times):
+        if lane_name is not None:
+            lane_names[lane] = lane_name
+            lanes[lane] = []
+            open_stacks[lane] = []
+        start -= times.origin
+        end -= times.origin
+        close_until(lane, start)
+        stack = open_stacks[lane]
+        if stack:
+            # Guard against small clock inconsistencies between a child and its parent
+            end = min(end, stack[-1][1])
+        key = (node["name"], node.get("kind"), node["uid"] in critical)
+        frame_id = frame_ids.get(key)
+        if frame_id is None:
+            frame_id = len(frames)
+            frame_ids[key] = frame_id
+            frame = {"name": node["name"]}
+            if key[2]:
+                frame["file"] = "critical"
+            frames.append(frame)
+        lanes[lane].append({"type": "O", "frame": frame_id, "at": start})
+        stack.append((frame_id, end))
+    for lane in lanes:
+        close_until(lane, float("inf"))
+
+    profiles = []
+    for lane, events in lanes.items():
+        profiles.append(
+            {
+                "type": "evented",
+                "name": lane_names[lane],
+                "unit": "microseconds",
+                "startValue": events[0]["at"] if events else 0,
+                "endValue": events[-1]["at"] if events else 0,
+                "events": events,
+            }
+        )
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": root["name"],
+        "activeProfileIndex": 0,
+        "exporter": "nicetrace",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export a trace into Chrome Trace Event or speedscope format"
+    )
+    parser.add_argument("trace", help="Trace JSON file")
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=("chrome", "speedscope"), default="chrome")
+    args = parser.parse_args()
+
+    from .reader.filereader import read_trace_file
+
+    trace = read_trace_file(args.trace)
+    with open(args.output, "w") as f:
+        if args.format == "chrome":
+            write_chrome_trace(trace, f)
+        else:
+            json.dump(to_speedscope(trace), f)
+
+
+if __name__ == "__main__":
+    main()
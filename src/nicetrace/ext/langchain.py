@@ -1,6 +1,18 @@
 # from ..tracing import with_trace
+import dataclasses
+import json
+import threading
+import time
 from typing import Any, Optional
-from ..tracing import start_trace_block, end_trace_block, Metadata
+from ..tracing import (
+    Metadata,
+    TracingNode,
+    _StreamRecorder,
+    _TRACING_STACK,
+    _close_node,
+    _open_node,
+)
+from ..writer.base import current_writer
 
 #
 # def wrap_openai(client):
@@ -8,7 +20,16 @@ from ..tracing import start_trace_block, end_trace_block, Metadata
 #     client.completions.create = with_trace(client.completions.create, name="OpenAI query")
 
 try:
-    from langchain_core.callbacks.base import BaseCallbackHandler
+    from langchain_core.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
+    from langchain_core.documents import Document
+    from langchain_core.messages import BaseMessage
+
+    QUERY_META = Metadata(icon="query")
+
+    # Number of traces for which stored configurations are remembered
+    MAX_CACHED_TRACES = 64
+    # Number of serialized configurations whose keys are remembered
+    MAX_CACHED_CONFIGS = 256
 
     def response_to_output(response):
         if hasattr(response.message, "tool_calls") and response.message.tool_calls:
@@ -21,9 +42,191 @@ try:
             return response.text
         return ""
 
-    class Tracer(BaseCallbackHandler):
+    def _to_data(value):
+        """
+        Converts LangChain objects into plain data, so they are not serialized as opaque objects.
+        """
+        if isinstance(value, BaseMessage):
+            result = {"role": value.type, "content": value.content}
+            tool_calls = getattr(value, "tool_calls", None)
+            if tool_calls:
+                result["tool_calls"] = tool_calls
+            return result
+        if isinstance(value, Document):
+            return {"page_content": value.page_content, "metadata": value.metadata}
+        if isinstance(value, dict):
+            return {key: _to_data(v) for key, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [_to_data(v) for v in value]
+        return value
+
+    def _token_counters(response) -> Optional[dict[str, int]]:
+        llm_output = response.llm_output
+        if llm_output is not None:
+            if "token_usage" in llm_output:
+                usage = llm_output["token_usage"]
+                return {
+                    "input_tokens": usage.get("prompt_tokens", 0),
+                    "output_tokens": usage.get("completion_tokens", 0),
+                }
+            if "usage" in llm_output:
+                usage = llm_output["usage"]
+                return {
+                    "input_tokens": usage.get("input_tokens", 0),
+                    "output_tokens": usage.get("output_tokens", 0),
+                }
+        # Chat models report usage on messages
+        counters = {}
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    for key in "input_tokens", "output_tokens":
+                        counters[key] = counters.get(key, 0) + usage.get(key, 0)
+        return counters or None
+
+    def _run_name(serialized: Optional[dict[str, Any]], kwargs: dict, default: str):
+        name = kwargs.get("name")
+        if name:
+            return name
+        if serialized:
+            if serialized.get("name"):
+                return serialized["name"]
+            if serialized.get("id"):
+                return serialized["id"][-1]
+        return default
+
+    class _Run:
+        __slots__ = ("node", "parents", "writer", "recorder", "start_time")
+
+        def __init__(self, node, parents, writer):
+            self.node = node
+            self.parents = parents
+            self.writer = writer
+            self.recorder = None
+            self.start_time = time.perf_counter()
+
+    class _RunTracker:
+        """
+        Maps LangChain runs to tracing nodes.
+
+        Nodes are parented by `parent_run_id`, not by the tracing stack, as callbacks of one run
+        may be called from different threads or asyncio tasks.
+        A run without a traced parent run is attached to the current tracing node.
+        """
+
         def __init__(self):
-            self.running_nodes = {}
+            self.runs: dict[Any, _Run] = {}
+            # Serialized configurations already stored in a trace: root uid -> (config key -> node uid)
+            self.configs: dict[str, dict[str, str]] = {}
+            # LangChain usually passes the same `serialized` dictionary for each call of a model,
+            # so it is first looked up by identity: id -> (serialized, config key)
+            self.config_keys: dict[int, tuple[dict[str, Any], str]] = {}
+            self.configs_lock = threading.Lock()
+
+        def _start_run(
+            self,
+            run_id,
+            parent_run_id,
+            name: str,
+            kind: str,
+            inputs: dict[str, Any],
+            meta: Optional[Metadata] = None,
+            serialized: Optional[dict[str, Any]] = None,
+        ) -> _Run:
+            parent = self.runs.get(parent_run_id) if parent_run_id else None
+            if parent is not None:
+                parents = parent.parents + (parent.node,)
+                writer = parent.writer
+            else:
+                parents = _TRACING_STACK.get()
+                writer = current_writer()
+            node = _open_node(parents, name, kind, inputs, meta, writer)
+            if serialized:
+                self._add_config(node, parents, serialized)
+            run = _Run(node, parents, writer)
+            self.runs[run_id] = run
+            return run
+
+        def _add_config(
+            self,
+            node: TracingNode,
+            parents: tuple[TracingNode, ...],
+            serialized: dict[str, Any],
+        ):
+            # Serialized configurations (models, prompt templates) are usually the same for all calls;
+            # they are stored only once per trace and later nodes refer to the first one
+            root_uid = parents[0].uid if parents else node.uid
+            with self.configs_lock:
+                configs = self.configs.get(root_uid)
+                if configs is None:
+                    if len(self.configs) >= MAX_CACHED_TRACES:
+                        # Forget the oldest trace
+                        del self.configs[next(iter(self.configs))]
+                    configs = {}
+                    self.configs[root_uid] = configs
+                key = self._config_key(serialized)
+                uid = configs.get(key)
+                if uid is None:
+                    configs[key] = node.uid
+            if uid is None:
+                node.add_input("config", serialized)
+            else:
+                node.add_input("config", {"same_as": uid})
+
+        def _config_key(self, serialized: dict[str, Any]) -> str:
+            cached = self.config_keys.get(id(serialized))
+            # The dictionary is kept alive by the cache, so its id cannot be reused
+            if cached is not None and cached[0] is serialized:
+                return cached[1]
+            key = json.dumps(serialized, sort_keys=True, default=repr)
+            if len(self.config_keys) >= MAX_CACHED_CONFIGS:
+                del self.config_keys[next(iter(self.config_keys))]
+            self.config_keys[id(serialized)] = (serialized, key)
+            return key
+
+        def _end_run(
+            self,
+            run_id,
+            output: Any = None,
+            error: Optional[BaseException] = None,
+            counters: Optional[dict[str, int]] = None,
+        ):
+            run = self.runs.pop(run_id, None)
+            if run is None:
+                return
+            node = run.node
+            if output is not None:
+                node.add_output("", _to_data(output))
+            if counters:
+                with node._lock:
+                    # Metadata is shared by nodes, so it is replaced, not modified
+                    node.meta = dataclasses.replace(
+                        node.meta or Metadata(), counters=counters
+                    )
+            if run.recorder is not None:
+                run.recorder.close(error)
+            else:
+                _close_node(node, error, run.parents, run.writer)
+            if not run.parents:
+                with self.configs_lock:
+                    self.configs.pop(node.uid, None)
+
+    def _llm_name(serialized: dict[str, Any], metadata: Optional[dict[str, Any]]):
+        if "kwargs" in serialized and "model_name" in serialized["kwargs"]:
+            model_name = serialized["kwargs"]["model_name"]
+        elif metadata:
+            model_name = metadata.get("ls_model_name")
+        else:
+            model_name = _run_name(serialized, {}, "model")
+        return f"Query {model_name}"
+
+    class Tracer(_RunTracker, BaseCallbackHandler):
+        """
+        LangChain callback handler that traces LLM calls, chat model calls, chains, tools and retrievers.
+        """
 
         def on_llm_start(
             self,
@@ -41,63 +244,195 @@ try:
                 inputs["prompt"] = prompts[0]
             else:
                 inputs["prompts"] = prompts
+            if metadata:
+                inputs["metadata"] = metadata
+            self._start_run(
+                run_id,
+                parent_run_id,
+                _llm_name(serialized, metadata),
+                "query",
+                inputs,
+                QUERY_META,
+                serialized,
+            )
 
-            if "kwargs" in serialized and "model_name" in serialized["kwargs"]:
-                model_name = serialized["kwargs"]["model_name"]
+        def on_chat_model_start(
+            self,
+            serialized: dict[str, Any],
+            messages: list[list[BaseMessage]],
+            *,
+            run_id,
+            parent_run_id=None,
+            tags=None,
+            metadata: Optional[dict[str, Any]] = None,
+            **kwargs: Any,
+        ) -> Any:
+            inputs = {}
+            if len(messages) == 1:
+                inputs["messages"] = _to_data(messages[0])
             else:
-                model_name = metadata.get("ls_model_name")
-            inputs["serialized"] = serialized
-            inputs["metadata"] = metadata
-            pair = start_trace_block(
-                f"Query {model_name}",
-                kind="query",
-                inputs=inputs,
-                meta=Metadata(icon="query"),
+                inputs["messages"] = _to_data(messages)
+            if metadata:
+                inputs["metadata"] = metadata
+            self._start_run(
+                run_id,
+                parent_run_id,
+                _llm_name(serialized, metadata),
+                "query",
+                inputs,
+                QUERY_META,
+                serialized,
             )
-            self.running_nodes[run_id.hex] = pair
 
-        def on_llm_end(
+        def on_llm_new_token(self, token: str, *, run_id, **kwargs: Any) -> None:
+            run = self.runs.get(run_id)
+            if run is None:
+                return
+            if run.recorder is None:
+                # Tokens are only counted and timed, the output is stored at the end
+                run.recorder = _StreamRecorder(
+                    run.node, run.parents, run.writer, capture_output=False
+                )
+                # Time to the first token is measured from the start of the call
+                run.recorder.start_time = run.start_time
+            run.recorder.add(token)
+
+        def on_llm_end(self, response, *, run_id, **kwargs: Any) -> None:
+            generations = [
+                response_to_output(g) for gg in response.generations for g in gg
+            ]
+            output = generations[0] if len(generations) == 1 else generations
+            self._end_run(run_id, output, counters=_token_counters(response))
+
+        def on_llm_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+            self._end_run(run_id, error=error)
+
+        def on_chain_start(
             self,
-            response,
+            serialized: Optional[dict[str, Any]],
+            inputs: Any,
             *,
             run_id,
             parent_run_id=None,
-            tags: Optional[list[str]] = None,
+            tags=None,
+            metadata: Optional[dict[str, Any]] = None,
             **kwargs: Any,
+        ) -> Any:
+            self._start_run(
+                run_id,
+                parent_run_id,
+                _run_name(serialized, kwargs, "Chain"),
+                "chain",
+                {"inputs": _to_data(inputs)},
+            )
+
+        def on_chain_end(self, outputs: Any, *, run_id, **kwargs: Any) -> None:
+            self._end_run(run_id, outputs)
+
+        def on_chain_error(
+            self, error: BaseException, *, run_id, **kwargs: Any
         ) -> None:
-            node, token = self.running_nodes.pop(run_id.hex)
-            generations = [response_to_output(g) for gg in response.generations for g in gg]
-            if len(generations) == 1:
-                node.add_output("", generations[0])
-            else:
-                node.add_output("", generations)
-
-            if response.llm_output is not None:
-                if "token_usage" in response.llm_output:
-                    usage = response.llm_output["token_usage"]
-                    node.meta.counters = {
-                        "input_tokens": usage.get("prompt_tokens", 0),
-                        "output_tokens": usage.get("completion_tokens", 0),
-                    }
-                elif "usage" in response.llm_output:
-                    usage = response.llm_output["usage"]
-                    node.meta.counters = {
-                        "input_tokens": usage.get("input_tokens", 0),
-                        "output_tokens": usage.get("output_tokens", 0),
-                    }
-            end_trace_block(node, token, None)
-
-        def on_llm_error(
+            self._end_run(run_id, error=error)
+
+        def on_tool_start(
+            self,
+            serialized: dict[str, Any],
+            input_str: str,
+            *,
+            run_id,
+            parent_run_id=None,
+            tags=None,
+            metadata: Optional[dict[str, Any]] = None,
+            inputs: Optional[dict[str, Any]] = None,
+            **kwargs: Any,
+        ) -> Any:
+            self._start_run(
+                run_id,
+                parent_run_id,
+                _run_name(serialized, kwargs, "Tool"),
+                "tool",
+                {"input": _to_data(inputs) if inputs is not None else input_str},
+            )
+
+        def on_tool_end(self, output: Any, *, run_id, **kwargs: Any) -> None:
+            self._end_run(run_id, output)
+
+        def on_tool_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+            self._end_run(run_id, error=error)
+
+        def on_retriever_start(
             self,
-            error: BaseException,
+            serialized: dict[str, Any],
+            query: str,
             *,
             run_id,
             parent_run_id=None,
-            tags: Optional[list[str]] = None,
+            tags=None,
+            metadata: Optional[dict[str, Any]] = None,
             **kwargs: Any,
+        ) -> Any:
+            self._start_run(
+                run_id,
+                parent_run_id,
+                _run_name(serialized, kwargs, "Retriever"),
+                "retriever",
+                {"query": query},
+            )
+
+        def on_retriever_end(self, documents, *, run_id, **kwargs: Any) -> None:
+            self._end_run(run_id, documents)
+
+        def on_retriever_error(
+            self, error: BaseException, *, run_id, **kwargs: Any
         ) -> None:
-            node, token = self.running_nodes.pop(run_id.hex)
-            end_trace_block(node, token, None)
+            self._end_run(run_id, error=error)
+
+    class AsyncTracer(_RunTracker, AsyncCallbackHandler):
+        """
+        Async variant of `Tracer`; callbacks are executed directly in the event loop.
+        """
+
+        async def on_llm_start(self, *args, **kwargs: Any) -> None:
+            Tracer.on_llm_start(self, *args, **kwargs)
+
+        async def on_chat_model_start(self, *args, **kwargs: Any) -> None:
+            Tracer.on_chat_model_start(self, *args, **kwargs)
+
+        async def on_llm_new_token(self, *args, **kwargs: Any) -> None:
+            Tracer.on_llm_new_token(self, *args, **kwargs)
+
+        async def on_llm_end(self, *args, **kwargs: Any) -> None:
+            Tracer.on_llm_end(self, *args, **kwargs)
+
+        async def on_llm_error(self, *args, **kwargs: Any) -> None:
+            Tracer.on_llm_error(self, *args, **kwargs)
+
+        async def on_chain_start(self, *args, **kwargs: Any) -> None:
+            Tracer.on_chain_start(self, *args, **kwargs)
+
+        async def on_chain_end(self, *args, **kwargs: Any) -> None:
+            Tracer.on_chain_end(self, *args, **kwargs)
+
+        async def on_chain_error(self, *args, **kwargs: Any) -> None:
+            Tracer.on_chain_error(self, *args, **kwargs)
+
+        async def on_tool_start(self, *args, **kwargs: Any) -> None:
+            Tracer.on_tool_start(self, *args, **kwargs)
+
+        async def on_tool_end(self, *args, **kwargs: Any) -> None:
+            Tracer.on_tool_end(self, *args, **kwargs)
+
+        async def on_tool_error(self, *args, **kwargs: Any) -> None:
+            Tracer.on_tool_error(self, *args, **kwargs)
+
+        async def on_retriever_start(self, *args, **kwargs: Any) -> None:
+            Tracer.on_retriever_start(self, *args, **kwargs)
+
+        async def on_retriever_end(self, *args, **kwargs: Any) -> None:
+            Tracer.on_retriever_end(self, *args, **kwargs)
+
+        async def on_retriever_error(self, *args, **kwargs: Any) -> None:
+            Tracer.on_retriever_error(self, *args, **kwargs)
 
 except ImportError:
     # Langchain not installed
@@ -12,6 +12,11 @@ def read_index():
         return f.read()
 
 
+def read_static_file(filename: str, mode: str = "r") -> str | bytes:
+    with (resources.files(static) / filename).open(mode) as f:
+        return f.read()
+
+
 def get_current_js_and_css_filenames():
     js = [
         os.path.basename(filename)
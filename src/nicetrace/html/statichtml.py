@@ -1,10 +1,18 @@
 from nicetrace import TracingNode
+from collections import deque
+import base64
+import gzip
 import os
-import json
 import uuid
 
+from ..data.html import Html
+from ..jsonbackend import dumps, dumps_bytes
+from ..reader.memoryreader import MemoryReader
+from ..serialization import resolve_tracebacks, serialize_with_type
+from ..spill import SpilledNode, estimate_size
+from ..tracing import TRACING_FORMAT_VERSION
 from ..writer.filewriter import write_file
-from .staticfiles import get_current_js_and_css_filenames
+from .staticfiles import get_current_js_and_css_filenames, read_static_file
 
 CDN_VERSION = "d91c60c21ae2e7a900a77507b474028185545691"
 CDN_URL = f"https://cdn.jsdelivr.net/gh/spirali/nicetrace@{CDN_VERSION}/src/nicetrace/html/static/"
@@ -34,14 +42,159 @@ HTML_TEMPLATE = """<!doctype html>
 </html>"""
 
 INLINE_HTML_TEMPLATE = """
-<div id="{id}"></div>
+<div id="{id}"><div></div></div>
 <script src="{url_js}"></script>
 <link rel="stylesheet" href="{url_css}">
 <script>
-import("{url_js}").then(() => window.mountTraceView(document.getElementById("{id}"), {node_json}));
+import("{url_js}").then(() => window.mountTraceView(document.getElementById("{id}").firstChild, {node_json}));
 </script>
 """
 
+# Fetches the full trace from the server started in Jupyter into the cell
+INLINE_LOAD_TEMPLATE = """
+<button id="{id}-load">Load the full trace</button>
+<script>
+document.getElementById("{id}-load").onclick = async (event) => {
+  const button = event.target;
+  button.disabled = true;
+  try {
+    const response = await fetch("{url}");
+    if (!response.ok) {
+      throw new Error(response.statusText);
+    }
+    const node = await response.json();
+    const element = document.createElement("div");
+    document.getElementById("{id}").replaceChildren(element);
+    window.mountTraceView(element, node);
+    button.remove();
+  } catch (e) {
+    button.textContent = "The trace is not available in the server";
+  }
+};
+</script>
+"""
+
+
+COMPRESSED_HTML_TEMPLATE = """<!doctype html>
+<html lang="en">
+
+<head>
+  <meta charset="UTF-8" />
+  <link rel="icon" type="image/svg+xml" href="{url_icon}" />
+  <meta name="viewport" content="width=device-width, initial-scale=1.0" />
+  <title>Trace view</title>
+  <script type="application/octet-stream" id="nt-tree">{tree_data}</script>
+  <script type="application/octet-stream" id="nt-entries">{entries_data}</script>
+  <script>
+    async function decodePayload(id) {{
+      const data = atob(document.getElementById(id).textContent);
+      const bytes = new Uint8Array(data.length);
+      for (let i = 0; i < data.length; i++) {{
+        bytes[i] = data.charCodeAt(i);
+      }}
+      const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+      return JSON.parse(await new Response(stream).text());
+    }}
+
+    function attachEntries(node, entries) {{
+      const e = entries[node.uid];
+      if (e) {{
+        // Filled in place, the viewer holds the same (placeholder) arrays;
+        // not spread into arguments, which is limited in size
+        for (const entry of e) {{
+          node.entries.push(entry);
+        }}
+      }}
+      if (node.children) {{
+        for (const child of node.children) {{
+          attachEntries(child, entries);
+        }}
+      }}
+    }}
+
+    async function start() {{
+      // The tree is rendered first, entries are attached when they are decoded;
+      // the view is not mounted again, so the selection and opened nodes are kept
+      const node = await decodePayload("nt-tree");
+      window.mountTraceView(document.getElementById("root"), node);
+      const entries = await decodePayload("nt-entries");
+      attachEntries(node, entries);
+      // Selecting the selected node again re-renders its details with the attached entries
+      document.querySelector("#root .nt-tree-selected")?.click();
+    }}
+  </script>
+  {assets}
+</head>
+
+<body onload="start()">
+  <div id="root"></div>
+</body>
+
+</html>"""
+
+CDN_ASSETS = """<script type="module" crossorigin src="{url_js}"></script>
+  <link rel="stylesheet" crossorigin href="{url_css}">"""
+
+
+def _split_entries(data: dict) -> dict[str, list]:
+    """
+    Moves entries of nodes out of a serialized tree, returns them indexed by uid of nodes.
+    Entries of the root node, which is shown first, are kept; other nodes get empty lists
+    that are filled when the entries are decoded.
+    """
+    result = {}
+    stack = list(data.get("children") or ())
+    while stack:
+        node = stack.pop()
+        entries = node.get("entries")
+        if entries:
+            result[node["uid"]] = entries
+            node["entries"] = []
+        children = node.get("children")
+        if children:
+            stack.extend(children)
+    return result
+
+
+def _compress(obj) -> str:
+    return base64.b64encode(gzip.compress(dumps_bytes(obj), 6)).decode()
+
+
+def _escape_script(code: str) -> str:
+    return code.replace("</script", "<\\/script")
+
+
+def _inline_assets() -> tuple[str, str]:
+    js_path, css_path = get_current_js_and_css_filenames()
+    js = _escape_script(read_static_file(js_path))
+    css = read_static_file(css_path).replace("</style", "<\\/style")
+    icon = base64.b64encode(read_static_file("icon.svg", "rb")).decode()
+    assets = f'<script type="module">{js}</script>\n  <style>{css}</style>'
+    return assets, f"data:image/svg+xml;base64,{icon}"
+
+
+def get_compressed_html(node: TracingNode, offline: bool = True) -> str:
+    """
+    Returns a HTML document where the trace is embedded as gzip-compressed base64 payload.
+    Entries are stored in a separate payload so the tree is rendered before all entries are decoded.
+
+    If `offline` is `True`, JS and CSS assets are inlined, so the file works without network access.
+    """
+    data = resolve_tracebacks(node.to_dict())
+    entries = _split_entries(data)
+    if offline:
+        assets, url_icon = _inline_assets()
+    else:
+        js_path, css_path = get_current_js_and_css_filenames()
+        assets = CDN_ASSETS.format(url_js=CDN_URL + js_path, url_css=CDN_URL + css_path)
+        url_icon = CDN_URL + "icon.svg"
+    return COMPRESSED_HTML_TEMPLATE.format(
+        tree_data=_compress(data),
+        entries_data=_compress(entries),
+        url_icon=url_icon,
+        assets=assets,
+    )
+
 
 def get_static_cdn_html(template, node_json) -> str:
     js_path, css_path = get_current_js_and_css_filenames()
@@ -54,16 +207,153 @@ def get_static_cdn_html(template, node_json) -> str:
 
 
 def get_full_html(node: TracingNode) -> str:
-    node_json = json.dumps(node.to_dict())
+    node_json = dumps(resolve_tracebacks(node.to_dict()))
     return get_static_cdn_html(HTML_TEMPLATE, node_json)
 
 
-def write_html(node: TracingNode, filename: str | os.PathLike):
-    """Write a `TracingNode` as static HTML file"""
-    write_file(filename, get_full_html(node))
+def write_html(
+    node: TracingNode,
+    filename: str | os.PathLike,
+    compressed: bool = False,
+    offline: bool = False,
+):
+    """
+    Write a `TracingNode` as static HTML file.
+
+    If `compressed` is `True`, the trace is embedded as compressed payload (see `get_compressed_html`).
+    If `offline` is `True`, JS and CSS assets are inlined into the file, it implies `compressed`.
+    """
+    if compressed or offline:
+        html = get_compressed_html(node, offline=offline)
+    else:
+        html = get_full_html(node)
+    write_file(filename, html)
+
+
+INLINE_MAX_DEPTH = 3
+"""Maximal depth of nodes embedded into a notebook cell output"""
+INLINE_MAX_BYTES = 1_000_000
+"""Maximal (estimated) size of entries embedded into a notebook cell output"""
+
+_JUPYTER_SERVER: tuple[MemoryReader, str] | None = None
+
+
+def set_jupyter_server(reader: MemoryReader | None, server_name: str | None):
+    """
+    Register a server started in Jupyter that serves traces displayed in notebook cells.
+    Parts of traces that are not embedded into cells are linked to this server.
+    """
+    global _JUPYTER_SERVER
+    if reader is None:
+        _JUPYTER_SERVER = None
+    else:
+        _JUPYTER_SERVER = (reader, server_name)
+
+
+def _count_nodes(node) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, SpilledNode):
+            count += node.n_nodes
+            continue
+        count += 1
+        if node.children:
+            stack.extend(node.children)
+    return count
+
+
+def _truncated_node(uid: str, count: int, link: str | None) -> dict:
+    if link:
+        value = Html(f'<a href="{link}" target="_blank">Open the full trace</a>')
+    else:
+        value = "Start a server by `nicetrace.server.start_server_in_jupyter()` to browse the full trace."
+    return {
+        "uid": uid,
+        "name": f"{count} more node{'s' if count > 1 else ''} not embedded",
+        "kind": "truncated",
+        "entries": [{"kind": "info", "value": serialize_with_type(value)}],
+    }
+
+
+def get_bounded_dict(
+    node: TracingNode,
+    max_depth: int = INLINE_MAX_DEPTH,
+    max_bytes: int = INLINE_MAX_BYTES,
+    link: str | None = None,
+) -> dict:
+    """
+    Serialize the top levels of the tree up to `max_depth` and (approximately) `max_bytes` of entries.
+    Omitted subtrees are replaced by a placeholder node, that contains `link` if it is provided.
+    """
+    return _bounded_dict(node, max_depth, max_bytes, link)[0]
+
+
+def _bounded_dict(
+    node: TracingNode, max_depth: int, max_bytes: int, link: str | None
+) -> tuple[dict, bool]:
+    truncated = False
+    with node._lock:
+        result = node._to_shallow_dict()
+        result["version"] = TRACING_FORMAT_VERSION
+        budget = max_bytes
+        queue = deque([(node, result, 0)])
+        while queue:
+            node, output, depth = queue.popleft()
+            size = estimate_size(output.get("entries", ()))
+            if size > budget:
+                output["entries"] = [
+                    {"kind": "info", "value": f"Entries not embedded ({size} bytes)"}
+                ]
+                budget = 0
+                truncated = True
+            else:
+                budget -= size
+            if not node.children:
+                continue
+            if depth >= max_depth or budget <= 0:
+                count = sum(_count_nodes(c) for c in node.children)
+                output["children"] = [_truncated_node(node.uid + "-more", count, link)]
+                truncated = True
+                continue
+            children = []
+            for child in node.children:
+                if isinstance(child, SpilledNode):
+                    children.append(
+                        {"uid": child.uid, "name": child.name, "kind": child.kind}
+                    )
+                    continue
+                child_output = child._to_shallow_dict()
+                children.append(child_output)
+                queue.append((child, child_output, depth + 1))
+            output["children"] = children
+    # Source lines of frames captured without them are looked up, as in other views of traces
+    return resolve_tracebacks(result), truncated
 
 
-def get_inline_html(node: TracingNode) -> str:
-    node_json = json.dumps(node.to_dict())
-    template = INLINE_HTML_TEMPLATE.replace("{id}", uuid.uuid4().hex)
-    return get_static_cdn_html(template, node_json)
+def get_inline_html(
+    node: TracingNode,
+    max_depth: int = INLINE_MAX_DEPTH,
+    max_bytes: int = INLINE_MAX_BYTES,
+) -> str:
+    """
+    Returns HTML for embedding into a notebook cell. Only top levels of the trace are embedded
+    (see `get_bounded_dict`). If a server was started by `start_server_in_jupyter`, the trace
+    is registered in the server (only as long as it is alive), omitted parts are linked to it
+    and the full trace can be loaded into the cell.
+    """
+    link = None
+    api_url = None
+    if _JUPYTER_SERVER is not None:
+        reader, server_name = _JUPYTER_SERVER
+        storage_id = reader.add_node(node)
+        link = f"{server_name}traces/{storage_id}"
+        api_url = f"{server_name}api/traces/{storage_id}"
+    data, truncated = _bounded_dict(node, max_depth, max_bytes, link)
+    id = uuid.uuid4().hex
+    template = INLINE_HTML_TEMPLATE.replace("{id}", id)
+    html = get_static_cdn_html(template, dumps(data))
+    if truncated and api_url is not None:
+        html += INLINE_LOAD_TEMPLATE.replace("{id}", id).replace("{url}", api_url)
+    return html
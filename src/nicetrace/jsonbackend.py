@@ -0,0 +1,110 @@
+import json
+from typing import Any, Callable, Optional
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+_dumps_bytes: Callable[[Any], bytes]
+_loads: Callable[[str | bytes], Any]
+_fast_errors: tuple[type[Exception], ...] = ()
+_backend = "json"
+
+
+def _json_dumps_bytes(obj: Any) -> bytes:
+    return json.dumps(obj).encode()
+
+
+def _use_json():
+    global _dumps_bytes, _loads, _fast_errors, _backend
+    _dumps_bytes = _json_dumps_bytes
+    _loads = json.loads
+    _fast_errors = ()
+    _backend = "json"
+
+
+def _use_orjson():
+    import orjson
+
+    global _dumps_bytes, _loads, _fast_errors, _backend
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    _dumps_bytes = dumps_bytes
+    _loads = orjson.loads
+    _fast_errors = (orjson.JSONEncodeError,)
+    _backend = "orjson"
+
+
+def _use_msgspec():
+    import msgspec
+
+    global _dumps_bytes, _loads, _fast_errors, _backend
+    decode = msgspec.json.decode
+
+    def loads(data: str | bytes) -> Any:
+        try:
+            return decode(data)
+        except msgspec.DecodeError as e:
+            # Callers handle invalid JSON as `ValueError`, as with the standard library
+            raise ValueError(str(e)) from e
+
+    _dumps_bytes = msgspec.json.Encoder().encode
+    _loads = loads
+    _fast_errors = (msgspec.EncodeError, TypeError, OverflowError)
+    _backend = "msgspec"
+
+
+_SETUPS = {"orjson": _use_orjson, "msgspec": _use_msgspec, "json": _use_json}
+
+
+def set_json_backend(name: Optional[str] = None):
+    """
+    Sets the library used for encoding and decoding of traces: "orjson", "msgspec" or "json" (standard library).
+    If `name` is `None`, the first installed library is used in this order.
+
+    Backends produce the same JSON documents but not byte-identical files: fast backends write
+    compact UTF-8, the standard library writes ASCII with spaces after separators.
+    """
+    if name is not None:
+        if name not in _SETUPS:
+            raise Exception(
+                f"Invalid JSON backend '{name}', expected one of {BACKENDS}"
+            )
+        _SETUPS[name]()
+        return
+    for name in BACKENDS:
+        try:
+            _SETUPS[name]()
+            return
+        except ImportError:
+            pass
+
+
+def get_json_backend() -> str:
+    return _backend
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    Encodes an object into UTF-8 encoded JSON without creating an intermediate string.
+    Objects that the fast backend cannot encode (e.g. integers over 64 bits) are encoded by the standard library.
+    """
+    if _fast_errors:
+        try:
+            return _dumps_bytes(obj)
+        except _fast_errors:
+            pass
+    return _json_dumps_bytes(obj)
+
+
+def dumps(obj: Any) -> str:
+    if not _fast_errors:
+        return json.dumps(obj)
+    return dumps_bytes(obj).decode()
+
+
+def loads(data: str | bytes) -> Any:
+    return _loads(data)
+
+
+set_json_backend()
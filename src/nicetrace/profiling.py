@@ -0,0 +1,150 @@
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any
+
+from . import tracing
+
+
+class Collector(ABC):
+    """
+    Abstract base class for resource collectors.
+
+    `start` is called when a node is opened and `stop` with the returned state when the node is closed.
+    `stop` returns values measured for the whole duration of the node.
+    `thread_counters` lists counters that are measured only for the current thread.
+    """
+
+    thread_counters: tuple[str, ...] = ()
+
+    @abstractmethod
+    def start(self) -> Any:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def stop(self, state: Any) -> dict[str, int]:
+        raise NotImplementedError()
+
+
+class CpuTimeCollector(Collector):
+    """
+    Measures CPU time of the process (`cpu_us`) and of the current thread (`thread_cpu_us`) in microseconds.
+    """
+
+    thread_counters = ("thread_cpu_us",)
+
+    def start(self):
+        return time.process_time_ns(), time.thread_time_ns()
+
+    def stop(self, state):
+        process_time, thread_time = state
+        return {
+            "cpu_us": (time.process_time_ns() - process_time) // 1000,
+            "thread_cpu_us": (time.thread_time_ns() - thread_time) // 1000,
+        }
+
+
+def _read_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # Peak RSS, the only value available on non-Linux systems; kilobytes on Linux, bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class RssCollector(Collector):
+    """
+    Measures change of resident set size of the process in bytes (`rss_bytes`).
+    """
+
+    def start(self):
+        return _read_rss()
+
+    def stop(self, state):
+        return {"rss_bytes": _read_rss() - state}
+
+
+class TracemallocCollector(Collector):
+    """
+    Measures change of memory allocated by Python in bytes (`alloc_bytes`) via `tracemalloc`.
+    It starts `tracemalloc` if it is not running.
+    """
+
+    def __init__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self):
+        return tracemalloc.get_traced_memory()[0]
+
+    def stop(self, state):
+        return {"alloc_bytes": tracemalloc.get_traced_memory()[0] - state}
+
+
+def _gc_totals() -> tuple[int, int]:
+    stats = gc.get_stats()
+    return (
+        sum(s["collections"] for s in stats),
+        sum(s["collected"] for s in stats),
+    )
+
+
+class GcCollector(Collector):
+    """
+    Measures number of garbage collector runs (`gc_collections`) and collected objects (`gc_collected`).
+    """
+
+    def start(self):
+        return _gc_totals()
+
+    def stop(self, state):
+        collections, collected = _gc_totals()
+        return {
+            "gc_collections": collections - state[0],
+            "gc_collected": collected - state[1],
+        }
+
+
+DEFAULT_COLLECTORS = (CpuTimeCollector, RssCollector, GcCollector)
+
+
+def enable_profiling(*collectors: Collector):
+    """
+    Enable resource collectors for all nodes opened after this call.
+    Without arguments, `CpuTimeCollector`, `RssCollector` and `GcCollector` are enabled.
+
+    Measured values are stored in `Metadata.counters` of nodes. As parents sum counters of their children,
+    each node stores only values not covered by its child nodes, so sum over a subtree gives the value
+    for the whole subtree.
+    """
+    if not collectors:
+        collectors = tuple(c() for c in DEFAULT_COLLECTORS)
+    tracing._COLLECTORS = tuple(collectors)
+
+
+def disable_profiling():
+    """
+    Disable all resource collectors. Disabled collectors have no overhead.
+    """
+    tracing._COLLECTORS = ()
+
+
+@contextmanager
+def profiling(*collectors: Collector):
+    """
+    Context manager that enables resource collectors (see `enable_profiling`) within its block.
+    """
+    old = tracing._COLLECTORS
+    enable_profiling(*collectors)
+    try:
+        yield
+    finally:
+        tracing._COLLECTORS = old
@@ -1,12 +1,40 @@
 from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional
+
+
+def local_time(time: Optional[datetime]) -> Optional[datetime]:
+    """
+    Converts a timezone-aware time into a naive local time, the convention of stored traces.
+    """
+    if time is None or time.tzinfo is None:
+        return time
+    return time.astimezone().replace(tzinfo=None)
+
+
+def summary_in_range(
+    summary: dict, since: Optional[datetime], until: Optional[datetime]
+) -> bool:
+    """
+    Returns `True` if the trace of the summary started in the range [since, until)
+    """
+    if since is None and until is None:
+        return True
+    time = summary.get("start_time") or summary.get("end_time")
+    if time is None:
+        return False
+    time = datetime.fromisoformat(time)
+    return (since is None or time >= since) and (until is None or time < until)
 
 
 class TraceReader(ABC):
     """Abstract base class for reading traces"""
 
     @abstractmethod
-    def list_summaries(self) -> list[dict]:
-        """Get summaries of traces in storage"""
+    def list_summaries(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> list[dict]:
+        """Get summaries of traces in storage, optionally only traces started in [since, until)"""
         raise NotImplementedError()
 
     @abstractmethod
@@ -1,51 +1,334 @@
+import queue
+import re
+from datetime import datetime, timedelta
 from threading import Lock
+from typing import Iterator, Optional
 
-from .base import TraceReader
+from .base import TraceReader, local_time, summary_in_range
+from ..jsonbackend import loads
+from ..serialization import resolve_tracebacks
+from ..writer.filewriter import FRAGMENTS_DIR, STORAGE_ID_SEPARATOR, read_layout
+from .watcher import create_watcher
 import os
 import json
 
+# Initial size of a prefix of a trace file read to parse its header
+HEADER_PREFIX_SIZE = 4096
+# Header is not searched beyond this size, files without a header are parsed whole
+MAX_HEADER_SIZE = 1 << 20
+# Depth of the deepest partitioning (the "time" layout), fragments are stored in the root directory
+MAX_PARTITION_DEPTH = 4
+
+_HEADER_START = re.compile(r'\s*\{\s*"header"\s*:\s*')
+_decoder = json.JSONDecoder()
+
+
+def read_header(filename: str | os.PathLike) -> Optional[dict]:
+    """
+    Reads the header of a trace file by parsing only a prefix of the file.
+    Returns `None` if the file has no header (e.g. it was written by an older version).
+    """
+    size = HEADER_PREFIX_SIZE
+    with open(filename, "rb") as f:
+        prefix = f.read(size)
+        while True:
+            # A character cut at the end of the prefix is replaced; if it is in the header,
+            # the header is incomplete and more data are read
+            text = prefix.decode("utf-8", errors="replace")
+            match = _HEADER_START.match(text)
+            if match is None:
+                return None
+            try:
+                header, _ = _decoder.raw_decode(text, match.end())
+                return header
+            except json.JSONDecodeError:
+                if len(prefix) < size or size >= MAX_HEADER_SIZE:
+                    return None
+            prefix += f.read(size)
+            size *= 2
+
+
+def _index_nodes(node: dict, index: dict[str, dict]):
+    index[node["uid"]] = node
+    for child in node.get("children", ()):
+        _index_nodes(child, index)
+
+
+def stitch_fragments(trace: dict, fragments: list[dict]) -> dict:
+    """
+    Insert fragments of the trace (subtrees recorded in other processes)
+    into nodes referenced by their "parent" record.
+    Fragments whose parent node is not found are ignored.
+    """
+    index = {}
+    _index_nodes(trace, index)
+    for fragment in fragments:
+        _index_nodes(fragment, index)
+    fragments = sorted(fragments, key=lambda f: f.get("start_time", ""))
+    for fragment in fragments:
+        parent = index.get(fragment["parent"]["node_uid"])
+        if parent is None:
+            continue
+        parent.setdefault("children", []).append(fragment)
+    return trace
+
+
+def _read_fragments(path: str, trace_uid: str) -> list[dict]:
+    path = os.path.join(path, FRAGMENTS_DIR, trace_uid)
+    if not os.path.isdir(path):
+        return []
+    fragments = []
+    for filename in os.listdir(path):
+        if filename.endswith(".json"):
+            with open(os.path.join(path, filename), "rb") as f:
+                fragment = loads(f.read())
+            fragment.pop("header", None)
+            # Tracebacks are referenced only within the file they were written to
+            fragments.append(resolve_tracebacks(fragment))
+    return fragments
+
+
+def read_trace_file(filename: str | os.PathLike, root: Optional[str] = None) -> dict:
+    """
+    Reads a trace file like `DirReader.read_trace`: the header is removed, tracebacks are resolved
+    and fragments written by other processes are stitched into the trace.
+
+    Fragments are read from the trace directory `root`; by default from the directory of the file
+    or its closest parent with fragments of the trace (the file may be in a partition).
+    """
+    with open(filename, "rb") as f:
+        trace = loads(f.read())
+    trace.pop("header", None)
+    trace = resolve_tracebacks(trace)
+    if root is not None:
+        fragments = _read_fragments(root, trace["uid"])
+    else:
+        path = os.path.dirname(os.path.abspath(filename))
+        for _ in range(MAX_PARTITION_DEPTH + 1):
+            fragments = _read_fragments(path, trace["uid"])
+            if fragments or os.path.dirname(path) == path:
+                break
+            path = os.path.dirname(path)
+    if fragments:
+        stitch_fragments(trace, fragments)
+    return trace
+
+
+def _is_trace_file(filename: str) -> bool:
+    return filename.endswith(".json") and not filename.startswith(".")
+
+
+def _partition_range(parts: list[str]) -> Optional[tuple[datetime, datetime]]:
+    """
+    Returns the time range covered by a partition of the "time" layout (e.g. ["2024", "05"]),
+    or `None` if it is not a valid partition.
+    """
+    try:
+        values = [int(part) for part in parts]
+        if len(values) == 1:
+            return datetime(values[0], 1, 1), datetime(values[0] + 1, 1, 1)
+        if len(values) == 2:
+            year, month = values
+            start = datetime(year, month, 1)
+            if month == 12:
+                return start, datetime(year + 1, 1, 1)
+            return start, datetime(year, month + 1, 1)
+        if len(values) == 3:
+            start = datetime(*values)
+            return start, start + timedelta(days=1)
+        if len(values) == 4:
+            start = datetime(*values)
+            return start, start + timedelta(hours=1)
+    except ValueError:
+        pass
+    return None
+
 
 class DirReader(TraceReader):
     """
     Reads a traces from a given directory.
+
+    If `watch` is `True`, the directory is watched for changes (via inotify on Linux, by polling
+    every `poll_interval` seconds elsewhere) and summaries are served from memory.
+    Changes of summaries can be then received via `subscribe`.
+
+    Partitioned directories (see `DirWriter` layouts) are read as well; when listing a directory
+    with the "time" layout, partitions outside of the requested time range are not opened at all.
+    Partitioned directories are always scanned, `watch` is supported only for the flat layout.
     """
 
-    def __init__(self, path: str):
+    # Maximal number of unconsumed events of a subscriber, further events are dropped
+    MAX_SUBSCRIBER_EVENTS = 1000
+
+    def __init__(self, path: str, watch: bool = False, poll_interval: float = 1.0):
         if not os.path.isdir(path):
             raise Exception(f"Path '{path}' does not exists")
         self.path = path
+        self.layout = read_layout(path)
         self.finished_paths = {}
         self.uids_to_filenames = {}
         self.lock = Lock()
+        self.summaries: dict[str, dict] | None = None
+        self.subscribers: list[queue.Queue] = []
+        self.watcher = None
+        if watch and self.layout == "flat":
+            self.summaries = {}
+            # Watcher is created before the scan, so no change is missed
+            self.watcher = create_watcher(path, self._on_change, poll_interval)
+            self._rescan()
+            self.watcher.start()
+
+    def _read_summary(self, filename: str) -> dict:
+        full_path = os.path.join(self.path, filename)
+        header = read_header(full_path)
+        if header is None:
+            with open(full_path, "rb") as f:
+                header = loads(f.read())
+        summary = {
+            "storage_id": filename[: -len(".json")].replace(
+                os.sep, STORAGE_ID_SEPARATOR
+            ),
+            "uid": header["uid"],
+            "name": header["name"],
+            "state": header.get("state", "finished"),
+            "start_time": header["start_time"],
+            "end_time": header.get("end_time"),
+        }
+        for key in "nodes", "errors", "total_counters":
+            if header.get(key) is not None:
+                summary[key] = header[key]
+        return summary
 
-    def list_summaries(self) -> list[dict]:
+    def _iter_files(
+        self, since: Optional[datetime], until: Optional[datetime]
+    ) -> Iterator[str]:
+        """
+        Yields paths of trace files relative to the root directory.
+        """
+        if self.layout == "flat":
+            for filename in os.listdir(self.path):
+                if _is_trace_file(filename):
+                    yield filename
+            return
+        stack = [[]]
+        while stack:
+            parts = stack.pop()
+            with os.scandir(os.path.join(self.path, *parts)) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.startswith(".") or (not parts and name == FRAGMENTS_DIR):
+                        continue
+                    if entry.is_dir():
+                        child = parts + [name]
+                        if self.layout == "time":
+                            time_range = _partition_range(child)
+                            if time_range is None:
+                                continue
+                            start, end = time_range
+                            if (since is not None and end <= since) or (
+                                until is not None and start >= until
+                            ):
+                                continue
+                        stack.append(child)
+                    elif _is_trace_file(name):
+                        yield os.path.join(*parts, name)
+
+    def list_summaries(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> list[dict]:
+        since, until = local_time(since), local_time(until)
+        if self.summaries is not None:
+            with self.lock:
+                summaries = list(self.summaries.values())
+            return [s for s in summaries if summary_in_range(s, since, until)]
         summaries = []
         with self.lock:
             finished_paths = self.finished_paths
-            for filename in os.listdir(self.path):
-                if filename.endswith(".json"):
-                    summary = finished_paths.get(filename)
-                    if summary:
-                        summaries.append(summary)
-                        continue
-                    with open(os.path.join(self.path, filename)) as f:
-                        snode = json.loads(f.read())
-                        state = snode.get("state", "finished")
-                        summary = {
-                            "storage_id": filename[: -len(".json")],
-                            "uid": snode["uid"],
-                            "name": snode["name"],
-                            "state": state,
-                            "start_time": snode["start_time"],
-                            "end_time": snode.get("end_time"),
-                        }
-                        if state != "open":
-                            finished_paths[filename] = summary
-                        summaries.append(summary)
+            for filename in self._iter_files(since, until):
+                summary = finished_paths.get(filename)
+                if summary is None:
+                    summary = self._read_summary(filename)
+                    if summary["state"] != "open":
+                        finished_paths[filename] = summary
+                if summary_in_range(summary, since, until):
+                    summaries.append(summary)
         return summaries
 
+    def _rescan(self):
+        summaries = {}
+        for filename in os.listdir(self.path):
+            if _is_trace_file(filename):
+                try:
+                    summaries[filename] = self._read_summary(filename)
+                except (OSError, ValueError, KeyError):
+                    pass
+        with self.lock:
+            self.summaries = summaries
+        self._notify({"type": "reset"})
+
+    def _on_change(self, filename: str | None, event: str):
+        if filename is None:
+            self._rescan()
+            return
+        if not _is_trace_file(filename):
+            return
+        storage_id = filename[: -len(".json")]
+        if event == "deleted":
+            with self.lock:
+                removed = self.summaries.pop(filename, None)
+            if removed is not None:
+                self._notify({"type": "deleted", "storage_id": storage_id})
+            return
+        try:
+            summary = self._read_summary(filename)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError):
+            # Not a trace file or not written completely, the next change will be read again
+            return
+        with self.lock:
+            self.summaries[filename] = summary
+        self._notify({"type": "updated", "summary": summary})
+
+    def _notify(self, event: dict):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def subscribe(self) -> queue.Queue:
+        """
+        Returns a queue that receives changes of summaries (only when the directory is watched):
+        `{"type": "updated", "summary": ...}`, `{"type": "deleted", "storage_id": ...}`
+        and `{"type": "reset"}` when all summaries should be listed again.
+        """
+        subscriber = queue.Queue(self.MAX_SUBSCRIBER_EVENTS)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self.lock:
+            self.subscribers.remove(subscriber)
+
+    def close(self):
+        """
+        Stops watching the directory.
+        """
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+            with self.lock:
+                self.summaries = None
+
     def read_trace(self, storage_id: str) -> dict:
-        assert "/" not in storage_id
-        assert not storage_id.startswith(".")
-        with open(os.path.join(self.path, f"{storage_id}.json")) as f:
-            return json.loads(f.read())
+        # Storage id maps directly to the file, no listing of the directory is needed
+        parts = storage_id.split(STORAGE_ID_SEPARATOR)
+        for part in parts:
+            assert part and "/" not in part and os.sep not in part
+            assert not part.startswith(".")
+        parts[-1] += ".json"
+        return read_trace_file(os.path.join(self.path, *parts), self.path)
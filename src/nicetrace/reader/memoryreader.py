@@ -0,0 +1,67 @@
+import weakref
+from datetime import datetime
+from threading import Lock
+from typing import Optional
+
+from .base import TraceReader, local_time, summary_in_range
+from ..serialization import resolve_tracebacks
+from ..tracing import TracingNode
+
+
+class MemoryReader(TraceReader):
+    """
+    Serves traces from `TracingNode` objects living in the current process.
+
+    If `weak` is `True`, the reader does not keep nodes alive; a trace disappears from the reader
+    when it is garbage-collected.
+    """
+
+    def __init__(self, weak: bool = False):
+        self.nodes: dict[str, TracingNode] = (
+            weakref.WeakValueDictionary() if weak else {}
+        )
+        self.lock = Lock()
+
+    def add_node(self, node: TracingNode) -> str:
+        """Register a node, returns its storage id"""
+        storage_id = f"trace-{node.uid}"
+        with self.lock:
+            self.nodes[storage_id] = node
+        return storage_id
+
+    def remove_node(self, node: TracingNode):
+        with self.lock:
+            self.nodes.pop(f"trace-{node.uid}", None)
+
+    def list_summaries(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> list[dict]:
+        since, until = local_time(since), local_time(until)
+        with self.lock:
+            nodes = list(self.nodes.items())
+        summaries = []
+        for storage_id, node in nodes:
+            with node._lock:
+                summaries.append(
+                    {
+                        "storage_id": storage_id,
+                        "uid": node.uid,
+                        "name": node.name,
+                        "state": node.state.value,
+                        "start_time": node.start_time.isoformat()
+                        if node.start_time
+                        else None,
+                        "end_time": node.end_time.isoformat()
+                        if node.end_time
+                        else None,
+                    }
+                )
+                total_counters = node._total_counters()
+                if total_counters:
+                    summaries[-1]["total_counters"] = total_counters
+        return [s for s in summaries if summary_in_range(s, since, until)]
+
+    def read_trace(self, storage_id: str) -> dict:
+        with self.lock:
+            node = self.nodes[storage_id]
+        return resolve_tracebacks(node.to_dict())
@@ -0,0 +1,141 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+from threading import Event, Thread
+from typing import Callable
+
+# Callback called with a filename (relative to the watched directory) and an event: "changed" or "deleted".
+# Filename `None` means that events may have been lost and the whole directory has to be rescanned.
+WatchCallback = Callable[[str | None, str], None]
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """
+    Watches a directory by periodically comparing modification times and sizes of files.
+    Used where inotify is not available.
+    """
+
+    def __init__(self, path: str, callback: WatchCallback, interval: float = 1.0):
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self._stop = Event()
+        self._files = self._scan()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        files = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+                except FileNotFoundError:
+                    pass
+        return files
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            files = self._scan()
+            for name, value in files.items():
+                if self._files.get(name) != value:
+                    self.callback(name, "changed")
+            for name in self._files.keys() - files.keys():
+                self.callback(name, "deleted")
+            self._files = files
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class InotifyWatcher:
+    """
+    Watches a directory via Linux inotify (through ctypes, no dependencies).
+    Only complete writes are reported: files closed after writing and files renamed into the directory.
+    """
+
+    def __init__(self, path: str, callback: WatchCallback):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.path = path
+        self.callback = callback
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = (
+            _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_MOVED_FROM | _IN_DELETE | _IN_ONLYDIR
+        )
+        if libc.inotify_add_watch(self._fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for '{path}'")
+        self._stop = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                # Timeout allows to check the stop flag
+                ready, _, _ = select.select([self._fd], [], [], 0.5)
+                if not ready:
+                    continue
+                try:
+                    data = os.read(self._fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                self._dispatch(data)
+        finally:
+            os.close(self._fd)
+
+    def _dispatch(self, data: bytes):
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                self.callback(None, "changed")
+            elif name:
+                event = "deleted" if mask & (_IN_MOVED_FROM | _IN_DELETE) else "changed"
+                self.callback(os.fsdecode(name), event)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def create_watcher(
+    path: str, callback: WatchCallback, poll_interval: float = 1.0
+) -> InotifyWatcher | PollingWatcher:
+    """
+    Creates a watcher of the directory; inotify is used on Linux, polling elsewhere
+    or when inotify cannot be used (e.g. the limit of watches is reached).
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path, callback)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(path, callback, poll_interval)
@@ -1,6 +1,7 @@
 import dataclasses
 import enum
-import traceback
+import functools
+import linecache
 from typing import Any, Callable, Dict, List, TypeVar
 
 try:
@@ -31,30 +32,221 @@ def check_type_key(serialized, obj):
         serialized["_type"] = type(obj).__name__
 
 
+MAX_EXCEPTION_CHAIN = 8
+MAX_TRACEBACK_FRAMES = 100
+_capture_source_lines = True
+
+
+def configure_exceptions(
+    max_chain: int = MAX_EXCEPTION_CHAIN,
+    max_frames: int = MAX_TRACEBACK_FRAMES,
+    source_lines: bool = True,
+):
+    """
+    Configures serialization of exceptions.
+
+    At most `max_chain` exceptions of a chain (`__cause__` / `__context__`) are serialized,
+    and at most `max_frames` innermost frames of each traceback.
+    If `source_lines` is `False`, only file names, line numbers and function names are captured
+    and source lines are looked up when the trace is read (see `resolve_tracebacks`).
+    """
+    global MAX_EXCEPTION_CHAIN, MAX_TRACEBACK_FRAMES, _capture_source_lines
+    MAX_EXCEPTION_CHAIN = max_chain
+    MAX_TRACEBACK_FRAMES = max_frames
+    _capture_source_lines = source_lines
+
+
+@functools.lru_cache(maxsize=1024)
+def _extract_frames(key: tuple, source_lines: bool) -> list[dict]:
+    # Identical stacks share the list of frames, writers store them only once per trace
+    frames = []
+    for filename, name, lineno in key:
+        frame = {"name": name, "filename": filename, "lineno": lineno}
+        if source_lines:
+            frame["line"] = linecache.getline(filename, lineno).strip()
+        frames.append(frame)
+    return frames
+
+
+def _serialize_traceback(tb) -> dict:
+    tbs = []
+    while tb is not None:
+        tbs.append(tb)
+        tb = tb.tb_next
+    result = {"_type": "$traceback"}
+    skipped = len(tbs) - MAX_TRACEBACK_FRAMES
+    if skipped > 0:
+        tbs = tbs[skipped:]
+    # Code objects compare equal regardless of their file, so the key holds plain values
+    key = tuple(
+        (tb.tb_frame.f_code.co_filename, tb.tb_frame.f_code.co_name, tb.tb_lineno)
+        for tb in tbs
+    )
+    result["frames"] = _extract_frames(key, _capture_source_lines)
+    if skipped > 0:
+        result["skipped_frames"] = skipped
+    return result
+
+
 def _serialize_exception(exc: BaseException) -> Data:
     result = {
         "_type": exc.__class__.__name__,
         "message": str(exc),
-        "traceback": {
-            "_type": "$traceback",
-            "frames": [
-                {
-                    "name": t.name,
-                    "filename": t.filename,
-                    "lineno": t.lineno,
-                    "line": t.line,
-                }
-                for t in traceback.extract_tb(exc.__traceback__)
-            ],
-        },
+        "traceback": _serialize_traceback(exc.__traceback__),
     }
+    # The chain is serialized iteratively, it may be long and contain cycles
+    seen = {id(exc)}
+    current = result
+    depth = 1
+    while True:
+        if exc.__cause__ is not None:
+            exc, key = exc.__cause__, "cause"
+        elif exc.__context__ is not None and not exc.__suppress_context__:
+            exc, key = exc.__context__, "tracing"
+        else:
+            break
+        if id(exc) in seen:
+            break
+        if depth >= MAX_EXCEPTION_CHAIN:
+            current["skipped_chain"] = True
+            break
+        seen.add(id(exc))
+        depth += 1
+        current[key] = {
+            "_type": exc.__class__.__name__,
+            "message": str(exc),
+            "traceback": _serialize_traceback(exc.__traceback__),
+        }
+        current = current[key]
+    return result
+
+
+def _is_exception(value) -> bool:
+    # User data may contain a "traceback" key too, only serialized exceptions are handled
+    if not isinstance(value, dict):
+        return False
+    traceback = value.get("traceback")
+    return isinstance(traceback, dict) and traceback.get("_type") == "$traceback"
 
-    if exc.__context__:
-        result["tracing"] = _serialize_exception(exc.__context__)
 
+def _reference_exception(value: dict, seen: dict) -> dict:
+    result = dict(value)
+    traceback = value["traceback"]
+    if isinstance(traceback.get("frames"), list):
+        frames = traceback["frames"]
+        ref = seen.get(id(frames))
+        if ref is None:
+            # Frames are kept alive, so their id is not reused during the write
+            seen[id(frames)] = (len(seen), frames)
+            result["traceback"] = {**traceback, "id": len(seen) - 1}
+        else:
+            traceback = dict(traceback)
+            del traceback["frames"]
+            traceback["ref"] = ref[0]
+            result["traceback"] = traceback
+    for key in ("cause", "tracing"):
+        inner = value.get(key)
+        if _is_exception(inner):
+            result[key] = _reference_exception(inner, seen)
     return result
 
 
+def reference_entries(entries: list, seen: dict) -> list:
+    """
+    Returns entries where tracebacks already written in the same document are replaced by
+    references (`{"_type": "$traceback", "ref": <id>}`); entries are not modified.
+    `seen` is shared by all nodes of the document.
+    """
+    result = entries
+    for i, entry in enumerate(entries):
+        value = entry.get("value")
+        if _is_exception(value):
+            if result is entries:
+                result = list(entries)
+            result[i] = {**entry, "value": _reference_exception(value, seen)}
+    return result
+
+
+def reference_tracebacks(data: dict) -> dict:
+    """
+    Same as `reference_entries` for a whole trace converted into a dictionary by `to_dict`.
+    """
+    seen = {}
+
+    def visit(node: dict) -> dict:
+        result = dict(node)
+        entries = node.get("entries")
+        if entries:
+            result["entries"] = reference_entries(entries, seen)
+        children = node.get("children")
+        if children:
+            result["children"] = [visit(child) for child in children]
+        return result
+
+    return visit(data)
+
+
+def _source_line(frame: dict) -> str:
+    filename = frame.get("filename")
+    lineno = frame.get("lineno")
+    if not isinstance(filename, str) or not isinstance(lineno, int):
+        return ""
+    return linecache.getline(filename, lineno).strip()
+
+
+def _resolve_exception(value: dict, tracebacks: dict) -> dict:
+    result = dict(value)
+    traceback = dict(value["traceback"])
+    ref = traceback.pop("ref", None)
+    if ref is not None:
+        traceback["frames"] = tracebacks.get(ref, [])
+    else:
+        frames = traceback.get("frames") or []
+        if (
+            isinstance(frames, list)
+            and frames
+            and all(isinstance(frame, dict) for frame in frames)
+            and "line" not in frames[0]
+        ):
+            frames = [{**frame, "line": _source_line(frame)} for frame in frames]
+            traceback["frames"] = frames
+        tb_id = traceback.pop("id", None)
+        if tb_id is not None:
+            tracebacks[tb_id] = frames
+    result["traceback"] = traceback
+    for key in ("cause", "tracing"):
+        inner = value.get(key)
+        if _is_exception(inner):
+            result[key] = _resolve_exception(inner, tracebacks)
+    return result
+
+
+def resolve_tracebacks(data: dict) -> dict:
+    """
+    Expands references created by `reference_entries` and looks up source lines of frames
+    captured without them. Each written document (a trace file or a fragment) has to be resolved on its own.
+    Source lines are found only if the source files are available to the reader.
+    """
+    tracebacks = {}
+
+    def visit(node: dict) -> dict:
+        result = dict(node)
+        entries = node.get("entries")
+        if entries:
+            result["entries"] = [
+                {**entry, "value": _resolve_exception(entry["value"], tracebacks)}
+                if _is_exception(entry.get("value"))
+                else entry
+                for entry in entries
+            ]
+        children = node.get("children")
+        if children:
+            result["children"] = [visit(child) for child in children]
+        return result
+
+    return visit(data)
+
+
 def serialize_with_type(obj: Any) -> Data:
     if obj is None:
         return None
@@ -1,6 +1,7 @@
 import argparse
 
 from ..reader.filereader import DirReader
+from ..writer.filewriter import DirWriter, read_layout
 from .app import start_server
 
 
@@ -10,13 +11,32 @@ def parse_args():
     parser.add_argument("--host", default="localhost")
     parser.add_argument("--port", type=int, default=6040)
     parser.add_argument("--debug", action="store_true")
+    parser.add_argument(
+        "--no-watch",
+        action="store_true",
+        help="Scan the directory on each request instead of watching it for changes",
+    )
+    parser.add_argument(
+        "--ingest",
+        action="store_true",
+        help="Accept traces sent by RemoteWriter and store them into the directory",
+    )
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    reader = DirReader(args.path)
-    start_server(reader, host=args.host, port=args.port, debug=args.debug)
+    reader = DirReader(args.path, watch=not args.no_watch)
+    ingest_writer = (
+        DirWriter(args.path, layout=read_layout(args.path)) if args.ingest else None
+    )
+    start_server(
+        reader,
+        host=args.host,
+        port=args.port,
+        debug=args.debug,
+        ingest_writer=ingest_writer,
+    )
 
 
 if __name__ == "__main__":
@@ -1,22 +1,136 @@
-from flask import Flask
+import json
+import queue
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime
+
+from flask import Flask, Response, request
 from flask_cors import CORS
 
-from ..reader.base import TraceReader
+from ..diff import diff_stored_traces
+from ..reader.base import TraceReader, local_time
+from ..reader.memoryreader import MemoryReader
+from ..writer.filewriter import DirWriter
+from ..writer.remotewriter import INGEST_PATH, MAX_BATCH_BYTES, decode_batch
+from ..html.statichtml import set_jupyter_server
 from ..html.staticfiles import read_index, STATIC_FILE_DIR
 
 
-def create_app(reader: TraceReader, server_name):
+# Interval (in seconds) of keep-alive messages of open event streams
+EVENTS_KEEPALIVE = 15
+
+# Each open event stream occupies one thread of the server
+SERVER_THREADS = 32
+
+# Maximal number of open event streams, the remaining threads serve other requests
+MAX_EVENT_STREAMS = SERVER_THREADS // 2
+
+# Event streams are closed after this time (in seconds) and clients reconnect after `EVENTS_RETRY_MS`,
+# so threads of disconnected clients are eventually released
+EVENTS_MAX_DURATION = 300
+EVENTS_RETRY_MS = 1000
+
+
+def create_app(
+    reader: TraceReader, server_name, ingest_writer: DirWriter | None = None
+):
     app = Flask(__name__, static_url_path="/assets", static_folder=STATIC_FILE_DIR)
     CORS(app)
+    # Number of open event streams
+    event_streams = [0]
+    event_streams_lock = threading.Lock()
 
     @app.route("/api/list")
     def list():
-        return reader.list_summaries()
+        # Optional time range in ISO format, e.g. ?since=2024-05-01T13:00:00
+        # Times with an offset (e.g. 2024-05-01T11:00:00Z) are converted into local time of stored traces
+        try:
+            since, until = (
+                local_time(datetime.fromisoformat(value)) if value else None
+                for value in (request.args.get("since"), request.args.get("until"))
+            )
+        except ValueError:
+            return "Invalid 'since' or 'until', expected a time in ISO format", 400
+        return reader.list_summaries(since=since, until=until)
+
+    @app.route("/api/events")
+    def events():
+        # Server-sent events with changes of summaries, available for watched directories
+        if getattr(reader, "watcher", None) is None:
+            return "Reader does not provide events", 404
+        with event_streams_lock:
+            if event_streams[0] >= MAX_EVENT_STREAMS:
+                return Response(
+                    "Too many event streams", 503, headers={"Retry-After": "10"}
+                )
+            event_streams[0] += 1
+        subscriber = reader.subscribe()
+
+        def stream():
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+            deadline = time.monotonic() + EVENTS_MAX_DURATION
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event = subscriber.get(timeout=min(EVENTS_KEEPALIVE, remaining))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+
+        def close():
+            reader.unsubscribe(subscriber)
+            with event_streams_lock:
+                event_streams[0] -= 1
+
+        response = Response(
+            stream(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+        # Called by the server also when the stream was not started
+        response.call_on_close(close)
+        return response
 
     @app.route("/api/traces/<trace_id>")
     def get_trace(trace_id: str):
         return reader.read_trace(trace_id)
 
+    @app.route("/api/diff")
+    def get_diff():
+        # Comma separated storage ids of both groups, e.g. /api/diff?a=trace-1&b=trace-2,trace-3
+        storage_ids_a = [s for s in request.args.get("a", "").split(",") if s]
+        storage_ids_b = [s for s in request.args.get("b", "").split(",") if s]
+        if not storage_ids_a or not storage_ids_b:
+            return "Parameters 'a' and 'b' with storage ids are required", 400
+        try:
+            diffs = diff_stored_traces(reader, storage_ids_a, storage_ids_b)
+        except (AssertionError, KeyError, OSError, ValueError) as e:
+            # Malformed or unknown storage ids
+            return f"Invalid storage id: {e}", 400
+        return [asdict(d) for d in diffs]
+
+    if ingest_writer is not None:
+        # Compressed request is limited here, the decompressed batch in `decode_batch`
+        app.config["MAX_CONTENT_LENGTH"] = MAX_BATCH_BYTES
+
+        @app.route(INGEST_PATH, methods=["POST"])
+        def ingest():
+            # Batches of trace snapshots sent by `RemoteWriter`
+            try:
+                traces = decode_batch(
+                    request.get_data(), request.headers.get("Content-Encoding")
+                )
+                for data in traces:
+                    ingest_writer.write_trace_data(data)
+            except Exception as e:
+                return f"Invalid batch: {e}", 400
+            ingest_writer.sync()
+            return {"written": len(traces)}
+
     @app.route("/traces/<trace_id>")
     @app.route("/")
     def get_index(trace_id: str | None = None):
@@ -34,16 +148,19 @@ def start_server(
     port: int = 4090,
     debug: bool = False,
     verbose: bool = True,
+    ingest_writer: DirWriter | None = None,
 ):
     """
     This needs feature "server".
     Starts a HTTP server over a given trace reader. It blocks the process.
+
+    If `ingest_writer` is set, the server accepts traces from `RemoteWriter`s and writes them by the writer.
     """
     if server_name is None:
         server_name = f"http://localhost:{port}/"
     elif not server_name.endswith("/"):
         server_name += "/"
-    application = create_app(reader, server_name)
+    application = create_app(reader, server_name, ingest_writer)
     if debug:
         application.run(host=host, port=port, debug=True)
     else:
@@ -51,14 +168,22 @@ def start_server(
 
         if verbose:
             print(f"Running at {server_name}")
-        serve(application, host=host, port=port)
+        serve(application, host=host, port=port, threads=SERVER_THREADS)
 
 
-def start_server_in_jupyter(reader: TraceReader, port: int = 4090, debug: bool = False):
+def start_server_in_jupyter(
+    reader: TraceReader | None = None, port: int = 4090, debug: bool = False
+):
     """
     This needs feature "server".
     Starts a HTTP server over a given trace reader. Stars a server as jupyter background process.
+
+    If `reader` is `None`, the server serves traces displayed in notebook cells; cells then embed
+    only top levels of traces and link the rest to this server.
     """
+    if reader is None:
+        # Displayed traces are served as long as the notebook keeps them
+        reader = MemoryReader(weak=True)
 
     from IPython.lib import backgroundjobs as bg
 
@@ -75,6 +200,8 @@ def start_server_in_jupyter(reader: TraceReader, port: int = 4090, debug: bool =
         server_name = None
         host = "localhost"
         verbose = True
+    if isinstance(reader, MemoryReader):
+        set_jupyter_server(reader, server_name or f"http://localhost:{port}/")
     jobs = bg.BackgroundJobManager()
     jobs.new(
         lambda: start_server(
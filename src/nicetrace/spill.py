@@ -0,0 +1,216 @@
+import os
+import shutil
+import tempfile
+import weakref
+from typing import TYPE_CHECKING, Optional
+
+from .jsonbackend import dumps_bytes, loads
+from .writer.filewriter import write_file
+
+if TYPE_CHECKING:
+    from .tracing import TracingNode
+
+
+def estimate_size(data) -> int:
+    """
+    Cheap estimation of the size of serialized data in JSON (in bytes)
+    """
+    if isinstance(data, str):
+        return len(data) + 2
+    if isinstance(data, dict):
+        return 2 + sum(len(key) + 4 + estimate_size(v) for key, v in data.items())
+    if isinstance(data, list):
+        return 2 + sum(estimate_size(v) + 1 for v in data)
+    return 8
+
+
+class SpilledNode:
+    """
+    A lightweight stub that replaces a finished subtree that was written to disk.
+    """
+
+    def __init__(self, node: "TracingNode", filename: str):
+        self.uid = node.uid
+        self.name = node.name
+        self.kind = node.kind
+        self.state = node.state
+        self.start_time = node.start_time
+        self.end_time = node.end_time
+        self._profile_total = node._profile_total
+        self._profile_thread = node._profile_thread
+        self.filename = filename
+        # Summary of the subtree for trace headers, so the file is not read for them
+        self.n_nodes, self.n_errors = _count_nodes(node)
+
+    def _to_dict(self) -> dict:
+        with open(self.filename, "rb") as f:
+            return loads(f.read())
+
+    def load(self) -> "TracingNode":
+        """
+        Load the spilled subtree as a new (detached) `TracingNode`.
+        """
+        from .tracing import TracingNode
+
+        return TracingNode.from_dict(self._to_dict())
+
+
+def _count_nodes(node: "TracingNode") -> tuple[int, int]:
+    from .tracing import TracingNodeState
+
+    n_nodes = 0
+    n_errors = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, SpilledNode):
+            n_nodes += node.n_nodes
+            n_errors += node.n_errors
+            continue
+        n_nodes += 1
+        if node.state == TracingNodeState.ERROR:
+            n_errors += 1
+        if node.children:
+            stack.extend(node.children)
+    return n_nodes, n_errors
+
+
+def _has_open_node(node: "TracingNode") -> bool:
+    from .tracing import TracingNodeState
+
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.state == TracingNodeState.OPEN:
+            return True
+        if node.children:
+            stack.extend(
+                child for child in node.children if not isinstance(child, SpilledNode)
+            )
+    return False
+
+
+def _inner_stubs(node: "TracingNode") -> list[SpilledNode]:
+    result = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.children:
+            for child in node.children:
+                if isinstance(child, SpilledNode):
+                    result.append(child)
+                else:
+                    stack.append(child)
+    return result
+
+
+class SpillStore:
+    """
+    Tracks the number of nodes and the size of entries held in memory for a single trace
+    and writes finished subtrees to disk when a budget is exceeded.
+
+    If `path` is `None`, a temporary directory is created and it is removed when the store is released.
+
+    When a spill frees little (e.g. the budget is taken by open nodes), the next spill waits
+    until the trace grows by half of the budget, so closing a node does not walk the whole tree each time.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_nodes: Optional[int] = 10_000,
+        max_bytes: Optional[int] = None,
+    ):
+        if path is None:
+            path = tempfile.mkdtemp(prefix="nicetrace-spill-")
+            weakref.finalize(self, shutil.rmtree, path, True)
+        else:
+            os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self.n_nodes = 0
+        self.n_bytes = 0
+        # Limits of the next spill, raised above the budget when the last spill freed little
+        self.next_nodes = max_nodes
+        self.next_bytes = max_bytes
+        self.spilling = False
+
+    def add_node(self):
+        self.n_nodes += 1
+
+    def add_entry(self, entry: dict):
+        self.n_bytes += estimate_size(entry)
+
+    def over_budget(self) -> bool:
+        return (self.next_nodes is not None and self.n_nodes > self.next_nodes) or (
+            self.next_bytes is not None and self.n_bytes > self.next_bytes
+        )
+
+    def spill(self, root: "TracingNode"):
+        """
+        Writes all maximal subtrees of `root` without open nodes to disk and replaces them by `SpilledNode` stubs.
+        It has to be called without holding the lock of the trace.
+        """
+        from .tracing import TracingNodeState
+
+        candidates = []
+        with root._lock:
+            if self.spilling:
+                return
+            self.spilling = True
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                if not node.children:
+                    continue
+                for i, child in enumerate(node.children):
+                    if isinstance(child, SpilledNode):
+                        continue
+                    # A closed node may still have open descendants, e.g. a generator traced by `with_trace`
+                    if child.state == TracingNodeState.OPEN or _has_open_node(child):
+                        stack.append(child)
+                    else:
+                        # Serialized under the lock, so the file matches the replaced subtree
+                        candidates.append(
+                            (node, i, child, dumps_bytes(child._to_dict()))
+                        )
+        try:
+            stubs = []
+            for parent, i, child, data in candidates:
+                filename = os.path.join(self.path, f"{child.uid}.json")
+                write_file(filename, data)
+                stubs.append((parent, i, child, SpilledNode(child, filename)))
+                # Subtrees spilled before are now part of the new file
+                for stub in _inner_stubs(child):
+                    os.unlink(stub.filename)
+            with root._lock:
+                for parent, i, child, stub in stubs:
+                    if parent.children[i] is child:
+                        parent.children[i] = stub
+                self._recount(root)
+        finally:
+            with root._lock:
+                self.spilling = False
+
+    def _recount(self, root: "TracingNode"):
+        n_nodes = 0
+        n_bytes = 0
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            n_nodes += 1
+            if node.entries:
+                n_bytes += sum(estimate_size(entry) for entry in node.entries)
+            if node.children:
+                stack.extend(
+                    child
+                    for child in node.children
+                    if not isinstance(child, SpilledNode)
+                )
+        self.n_nodes = n_nodes
+        self.n_bytes = n_bytes
+        if self.max_nodes is not None:
+            self.next_nodes = max(self.max_nodes, n_nodes + self.max_nodes // 2)
+        if self.max_bytes is not None:
+            self.next_bytes = max(self.max_bytes, n_bytes + self.max_bytes // 2)
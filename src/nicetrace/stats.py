@@ -0,0 +1,165 @@
+import json
+import os
+import time
+from threading import Lock
+from typing import Optional
+
+
+class Histogram:
+    """
+    Histogram with power-of-two buckets; bucket `i` counts values in range [2^(i-1), 2^i).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = {}
+
+    def add(self, value: int):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        bucket = int(value).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0,
+            "max": self.max,
+            "buckets": {
+                f"<{2**bucket}": count for bucket, count in sorted(self.buckets.items())
+            },
+        }
+
+
+class TracingStats:
+    """
+    Internal counters and histograms measuring overhead of tracing itself.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, Histogram] = {}
+
+    def add(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name: str, value: int):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = Histogram()
+                self.histograms[name] = histogram
+            histogram.add(value)
+
+    def record_time(self, name: str, start: float):
+        """Record time elapsed from `start` (a value of `time.perf_counter()`) in microseconds"""
+        self.record(name, int((time.perf_counter() - start) * 1_000_000))
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {
+                    name: histogram.to_dict()
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+
+class TimedLock:
+    """
+    A lock that records time spent waiting for it.
+    Used instead of `threading.Lock` for traces created when stats are enabled.
+    """
+
+    def __init__(self, stats: TracingStats):
+        self._lock = Lock()
+        self._stats = stats
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        start = time.perf_counter()
+        result = self._lock.acquire(blocking, timeout)
+        self._stats.record_time("lock_wait_us", start)
+        return result
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._lock.release()
+
+
+STATS: Optional[TracingStats] = None
+
+
+def enable_stats():
+    """
+    Start collecting statistics about overhead of tracing. Counter `nodes` counts opened nodes,
+    histograms (in microseconds or bytes) measure:
+
+    - `serialize_us` - time spent in serialization of entries
+    - `lock_wait_us` - time spent waiting for locks of traces (only traces created after enabling stats)
+    - `to_dict_us` - time of creating snapshots of traces
+    - `write_file_us`, `write_file_bytes` - time and size of written files
+    - `fsync_us` - time of flushing files to disk in batched durability mode
+    - `flush_us`, `pending_nodes` - time of flushes of `DelayedWriter` and the number of nodes written in a flush
+    """
+    global STATS
+    if STATS is None:
+        STATS = TracingStats()
+
+
+def disable_stats():
+    """
+    Stop collecting statistics; collected values are dropped.
+    """
+    global STATS
+    STATS = None
+
+
+def reset_stats():
+    """
+    Drop collected values, collecting continues if it was enabled.
+    """
+    global STATS
+    if STATS is not None:
+        STATS = TracingStats()
+
+
+def get_stats() -> dict | None:
+    """
+    Returns collected statistics or `None` if stats are not enabled.
+    """
+    if STATS is None:
+        return None
+    return STATS.to_dict()
+
+
+def write_stats(filename: str | os.PathLike):
+    """
+    Write collected statistics as a JSON sidecar file.
+    """
+    from .writer.filewriter import write_file
+
+    write_file(filename, json.dumps(get_stats()))
+
+
+def add_stats_node(name: str = "Tracing stats"):
+    """
+    Add collected statistics as an instant node of kind "stats" into the current tracing node.
+    """
+    from .tracing import trace_instant
+
+    return trace_instant(name, kind="stats", inputs={"stats": get_stats()})
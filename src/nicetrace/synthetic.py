@@ -0,0 +1,271 @@
+import argparse
+import json
+import random
+import string
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
+from .data.blob import DataWithMime
+from .executors import TracedThreadPoolExecutor
+from .tracing import Metadata, trace
+from .writer.base import TraceWriter
+from .writer.filewriter import DirWriter
+
+KINDS = ("chain", "query", "tool", "retriever", "call")
+
+
+class SyntheticError(Exception):
+    pass
+
+
+@dataclass
+class TraceShape:
+    """
+    Parameters of generated traces.
+
+    - `depth` - number of levels below the root.
+    - `fanout` - number of children of each node (above the last level).
+    - `payload_size` - size (in characters) of each input and output.
+    - `blob_size` - size (in bytes) of a binary attachment of leaf nodes; 0 means no attachments.
+    - `error_rate` - probability that a leaf node fails; the error propagates to its ancestors
+      with the same probability at each level.
+    - `node_delay` - time (in seconds) spent in each leaf node.
+    """
+
+    depth: int = 3
+    fanout: int = 3
+    payload_size: int = 200
+    blob_size: int = 0
+    error_rate: float = 0.0
+    node_delay: float = 0.0
+
+
+def _payload(rng: random.Random, size: int) -> str:
+    return "".join(rng.choices(string.ascii_letters + " ", k=size))
+
+
+def _generate_node(shape: TraceShape, rng: random.Random, level: int, index: int):
+    kind = rng.choice(KINDS)
+    counters = {"tokens": rng.randint(1, 1000)} if kind == "query" else None
+    with trace(
+        f"{kind} {index}",
+        kind=kind,
+        inputs={"input": _payload(rng, shape.payload_size)},
+        meta=Metadata(counters=counters) if counters else None,
+    ) as node:
+        if level < shape.depth:
+            for i in range(shape.fanout):
+                try:
+                    _generate_node(shape, rng, level + 1, i)
+                except SyntheticError:
+                    if rng.random() >= shape.error_rate:
+                        # The error is handled here, not propagated further
+                        continue
+                    raise
+        else:
+            if shape.blob_size:
+                node.add_input(
+                    "attachment", DataWithMime(rng.randbytes(shape.blob_size))
+                )
+            if shape.node_delay:
+                time.sleep(shape.node_delay)
+            if rng.random() < shape.error_rate:
+                raise SyntheticError(f"Synthetic failure of {node.name}")
+        node.add_output("", _payload(rng, shape.payload_size))
+
+
+def generate_trace(
+    shape: TraceShape, seed: Optional[int] = None, name: str = "Synthetic trace"
+):
+    """
+    Generates one trace via `trace` into the current writer and returns its root node.
+    """
+    rng = random.Random(seed)
+    with trace(name, kind="root") as root:
+        for i in range(shape.fanout):
+            try:
+                _generate_node(shape, rng, 1, i)
+            except SyntheticError:
+                pass
+    return root
+
+
+def generate_traces(
+    writer: TraceWriter,
+    n_traces: int,
+    shape: TraceShape,
+    concurrency: int = 1,
+    seed: int = 0,
+) -> float:
+    """
+    Generates `n_traces` traces into `writer`, `concurrency` traces at a time.
+    Returns the elapsed time in seconds (including the final writes).
+    """
+    start = time.perf_counter()
+    with writer:
+        with TracedThreadPoolExecutor(concurrency) as pool:
+            futures = [
+                pool.submit(generate_trace, shape, seed + i, f"Synthetic trace {i}")
+                for i in range(n_traces)
+            ]
+            for future in futures:
+                future.result()
+    return time.perf_counter() - start
+
+
+def percentiles(values: list[float], points=(50, 90, 99)) -> dict[str, float]:
+    """
+    Returns given percentiles (nearest-rank) of values.
+    """
+    values = sorted(values)
+    result = {}
+    for point in points:
+        if values:
+            index = max(0, -(-len(values) * point // 100) - 1)
+            result[f"p{point}"] = values[index]
+        else:
+            result[f"p{point}"] = None
+    return result
+
+
+def _fetch(url: str, timeout: float) -> bytes:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+def load_test(
+    url: str,
+    n_requests: int,
+    concurrency: int = 4,
+    list_ratio: float = 0.1,
+    timeout: float = 30.0,
+    seed: int = 0,
+) -> dict:
+    """
+    Sends requests to a running trace server: `/api/list` with the probability `list_ratio`,
+    otherwise `/api/traces/<ID>` of a random listed trace.
+    Returns latencies (in seconds) per endpoint and the number of errors.
+    """
+    url = url.rstrip("/")
+    storage_ids = [
+        s["storage_id"] for s in json.loads(_fetch(f"{url}/api/list", timeout))
+    ]
+    if not storage_ids:
+        raise Exception(f"Server at {url} has no traces")
+    rng = random.Random(seed)
+    requests = [
+        f"{url}/api/list"
+        if rng.random() < list_ratio
+        else f"{url}/api/traces/{rng.choice(storage_ids)}"
+        for _ in range(n_requests)
+    ]
+    latencies = {"list": [], "traces": []}
+    lock = threading.Lock()
+    errors = 0
+
+    def run(request_url: str):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            _fetch(request_url, timeout)
+        except OSError:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - start
+        endpoint = "list" if request_url.endswith("/api/list") else "traces"
+        with lock:
+            latencies[endpoint].append(elapsed)
+
+    start = time.perf_counter()
+    with TracedThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(run, requests))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": n_requests,
+        "errors": errors,
+        "elapsed": elapsed,
+        "requests_per_second": n_requests / elapsed,
+        "latency": {
+            endpoint: {"count": len(values), **percentiles(values)}
+            for endpoint, values in latencies.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic traces or load-test a trace server",
+        epilog="E.g. `generate traces --traces 1000 --depth 4` or `load http://localhost:6040`",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser(
+        "generate", help="Write synthetic traces into a directory"
+    )
+    generate.add_argument("path")
+    generate.add_argument("--traces", type=int, default=100)
+    generate.add_argument("--depth", type=int, default=3)
+    generate.add_argument("--fanout", type=int, default=3)
+    generate.add_argument("--payload-size", type=int, default=200)
+    generate.add_argument("--blob-size", type=int, default=0)
+    generate.add_argument("--error-rate", type=float, default=0.0)
+    generate.add_argument("--node-delay", type=float, default=0.0)
+    generate.add_argument("--concurrency", type=int, default=1)
+    generate.add_argument("--layout", default="flat")
+    generate.add_argument("--durability", default="fast")
+    generate.add_argument("--seed", type=int, default=0)
+
+    load = commands.add_parser("load", help="Send requests to a running trace server")
+    load.add_argument("url")
+    load.add_argument("--requests", type=int, default=1000)
+    load.add_argument("--concurrency", type=int, default=4)
+    load.add_argument("--list-ratio", type=float, default=0.1)
+    load.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        shape = TraceShape(
+            depth=args.depth,
+            fanout=args.fanout,
+            payload_size=args.payload_size,
+            blob_size=args.blob_size,
+            error_rate=args.error_rate,
+            node_delay=args.node_delay,
+        )
+        writer = DirWriter(
+            args.path,
+            min_write_delay=timedelta(milliseconds=300),
+            durability=args.durability,
+            layout=args.layout,
+        )
+        elapsed = generate_traces(
+            writer, args.traces, shape, args.concurrency, args.seed
+        )
+        print(
+            f"{args.traces} traces in {elapsed:.2f}s ({args.traces / elapsed:.1f} traces/s)"
+        )
+    else:
+        result = load_test(
+            args.url, args.requests, args.concurrency, args.list_ratio, seed=args.seed
+        )
+        print(
+            f"{result['requests']} requests in {result['elapsed']:.2f}s "
+            f"({result['requests_per_second']:.1f} req/s), {result['errors']} errors"
+        )
+        for endpoint, stats in result["latency"].items():
+            if stats["count"]:
+                values = " ".join(
+                    f"{key}={value * 1000:.1f}ms"
+                    for key, value in stats.items()
+                    if key != "count"
+                )
+                print(f"/api/{endpoint:8} {stats['count']:6} {values}")
+
+
+if __name__ == "__main__":
+    main()
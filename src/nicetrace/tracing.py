@@ -3,18 +3,24 @@ import contextvars
 from datetime import datetime
 import functools
 import inspect
+import time
+import dataclasses
 from dataclasses import dataclass
 from enum import Enum
-from threading import Lock
-from typing import Any, Callable, Optional
+from threading import Lock, get_ident
+from typing import Any, Callable, Optional, Sequence
 
 from .utils.ids import generate_uid
 from .serialization import serialize_with_type
+from . import stats as _stats
 
 TRACING_FORMAT_VERSION = "4"
 
 _TRACING_STACK = contextvars.ContextVar("_TRACING_STACK", default=())
 
+# Resource collectors, set by `nicetrace.profiling`
+_COLLECTORS = ()
+
 
 class TracingNodeState(Enum):
     """
@@ -55,6 +61,23 @@ class Metadata:
     custom: Any = None
 
 
+@dataclass(frozen=True)
+class NodeRef:
+    """
+    A picklable reference to a tracing node, it allows to attach nodes created in another process.
+    """
+
+    trace_uid: str
+    """UID of the root node of the trace"""
+    node_uid: str
+    """UID of the referenced node"""
+
+
+def _add_counters(target: dict[str, int], counters: dict[str, int]):
+    for key, value in counters.items():
+        target[key] = target.get(key, 0) + value
+
+
 class TracingNode:
     """
     A tracing object that represents a single request or (sub)task in a nested hierarchy.
@@ -67,6 +90,7 @@ class TracingNode:
         meta: Optional[Metadata] = None,
         lock=None,
         is_instant=False,
+        parent_ref: Optional[NodeRef] = None,
     ):
         """
         - `name` - A description or name for the tracing node.
@@ -75,6 +99,8 @@ class TracingNode:
         - `meta` - A dictionary of any metadata for the tracing node, e.g. UI style data.
           This allows you to split the stored data across multiple files.
         - `output` - The output value of the tracing node, if it has already been computed.
+        - `parent_ref` - A reference to a node in another process; the node is then stored as a fragment
+          of the referenced trace.
         """
 
         if meta:
@@ -94,38 +120,114 @@ class TracingNode:
             self.end_time = None
             self.state = TracingNodeState.OPEN
         self.meta = meta
+        self.parent_ref = parent_ref
         self._lock = lock
-
-    def _to_dict(self):
+        self._spill = None
+        self._profile = None
+        # Values measured for the whole node (including children) and the thread that measured them
+        self._profile_total = None
+        self._profile_thread = None
+        # Sums of counters of finished children (and their subtrees)
+        self._child_counters: dict[str, int] | None = None
+
+    def _to_shallow_dict(self):
+        # Small fields go first, so readers find them at the beginning of the serialized node
         result = {"name": self.name, "uid": self.uid}
         if self.state != TracingNodeState.FINISHED:
             result["state"] = self.state.value
-        for name in "kind", "entries":
-            value = getattr(self, name)
-            if value is not None:
-                result[name] = value
         if self.kind:
             result["kind"] = self.kind
-        if self.entries:
-            result["entries"] = self.entries
-        if self.children:
-            result["children"] = [c._to_dict() for c in self.children]
         if self.start_time:
             result["start_time"] = self.start_time.isoformat()
         if self.end_time:
             result["end_time"] = self.end_time.isoformat()
         if self.meta is not None:
             result["meta"] = serialize_with_type(self.meta)
+        total_counters = self._total_counters()
+        if total_counters:
+            result["total_counters"] = total_counters
+        if self.parent_ref is not None:
+            result["parent"] = {
+                "trace_uid": self.parent_ref.trace_uid,
+                "node_uid": self.parent_ref.node_uid,
+            }
+        if self.entries:
+            result["entries"] = self.entries
         return result
 
+    def _to_dict(self):
+        result = self._to_shallow_dict()
+        if self.children:
+            result["children"] = [c._to_dict() for c in self.children]
+        return result
+
+    @classmethod
+    def from_dict(cls, data: dict, lock=None) -> "TracingNode":
+        """
+        Create a `TracingNode` from a JSON structure created by `to_dict`.
+        """
+        node = cls(data["name"], data.get("kind"), lock=lock or Lock())
+        node.uid = data["uid"]
+        node.state = TracingNodeState(data.get("state", "finished"))
+        node.entries = data.get("entries")
+        start_time = data.get("start_time")
+        node.start_time = datetime.fromisoformat(start_time) if start_time else None
+        end_time = data.get("end_time")
+        node.end_time = datetime.fromisoformat(end_time) if end_time else None
+        meta = data.get("meta")
+        if meta is not None:
+            meta = {key: value for key, value in meta.items() if key != "_type"}
+            if meta.get("tags"):
+                meta["tags"] = [
+                    Tag(tag["name"], tag.get("color")) if isinstance(tag, dict) else tag
+                    for tag in meta["tags"]
+                ]
+            node.meta = Metadata(**meta)
+        total_counters = data.get("total_counters")
+        if total_counters:
+            counters = (node.meta.counters if node.meta else None) or {}
+            node._child_counters = {
+                key: value - counters.get(key, 0)
+                for key, value in total_counters.items()
+            }
+        parent = data.get("parent")
+        if parent is not None:
+            node.parent_ref = NodeRef(parent["trace_uid"], parent["node_uid"])
+        children = data.get("children")
+        if children is not None:
+            node.children = [cls.from_dict(child, node._lock) for child in children]
+        return node
+
+    def _total_counters(self) -> dict[str, int]:
+        counters = self.meta.counters if self.meta is not None else None
+        if not self._child_counters:
+            return dict(counters) if counters else {}
+        total = dict(self._child_counters)
+        if counters:
+            _add_counters(total, counters)
+        return total
+
+    @property
+    def total_counters(self) -> dict[str, int]:
+        """
+        Counters of the node summed with counters of its finished descendants.
+        """
+        with self._lock:
+            return self._total_counters()
+
     def to_dict(self):
         """
         Serialize `TracingNode` object into JSON structure.
         """
+        stats = _stats.STATS
+        if stats is not None:
+            start = time.perf_counter()
         with self._lock:
             result = self._to_dict()
             result["version"] = TRACING_FORMAT_VERSION
-            return result
+        if stats is not None:
+            stats.record_time("to_dict_us", start)
+        return result
 
     def add_tag(self, tag: str | Tag):
         """
@@ -149,8 +251,10 @@ class TracingNode:
             name=name,
             kind=kind,
             meta=meta,
+            lock=self._lock,
             is_instant=True,
         )
+        node._spill = self._spill
         if inputs:
             for key, value in inputs.items():
                 node._add_entry("input", key, value)
@@ -158,8 +262,17 @@ class TracingNode:
             if self.children is None:
                 self.children = []
             self.children.append(node)
+            if self._spill is not None:
+                self._spill.add_node()
+            if meta is not None and meta.counters:
+                self._add_child_counters(meta.counters)
         return node
 
+    def _add_child_counters(self, counters: dict[str, int]):
+        if self._child_counters is None:
+            self._child_counters = {}
+        _add_counters(self._child_counters, counters)
+
     def add_entry(self, kind: str, name: str, value: object):
         """
         Add a entry into the node.
@@ -170,10 +283,18 @@ class TracingNode:
     def _add_entry(self, kind: str, name: str, value: object):
         if self.entries is None:
             self.entries = []
-        entry = {"kind": kind, "value": serialize_with_type(value)}
+        stats = _stats.STATS
+        if stats is None:
+            entry = {"kind": kind, "value": serialize_with_type(value)}
+        else:
+            start = time.perf_counter()
+            entry = {"kind": kind, "value": serialize_with_type(value)}
+            stats.record_time("serialize_us", start)
         if name:
             entry["name"] = name
         self.entries.append(entry)
+        if self._spill is not None:
+            self._spill.add_entry(entry)
 
     def add_input(self, name: str, value: object):
         """
@@ -208,13 +329,17 @@ class TracingNode:
         Find all nodes matching the given callable `predicate`.
 
         The predicate is called with a single argument, the `TracingNode` to check, and should return `bool`.
+        Nodes from subtrees spilled to disk are loaded as detached copies.
         """
+        from .spill import SpilledNode
 
         def _helper(node: TracingNode):
             if predicate(node):
                 result.append(node)
             if node.children:
                 for child in node.children:
+                    if isinstance(child, SpilledNode):
+                        child = child.load()
                     _helper(child)
 
         result = []
@@ -222,50 +347,151 @@ class TracingNode:
             _helper(self)
         return result
 
+    def enable_spilling(
+        self,
+        path: Optional[str] = None,
+        max_nodes: Optional[int] = 10_000,
+        max_bytes: Optional[int] = None,
+    ):
+        """
+        Bound memory of a long-running trace. When the trace holds more than `max_nodes` nodes
+        or more than (approximately) `max_bytes` bytes of entries in memory, its finished subtrees are
+        written into `path` and replaced by lightweight stubs. If `path` is `None`, a temporary directory is used.
+
+        Stubs are transparently loaded by `to_dict` and `find_nodes`.
+        It should be called on the root node.
+        """
+        from .spill import SpillStore, SpilledNode
+
+        store = SpillStore(path, max_nodes, max_bytes)
+        with self._lock:
+            stack = [self]
+            while stack:
+                node = stack.pop()
+                node._spill = store
+                if node.children:
+                    stack.extend(
+                        c for c in node.children if not isinstance(c, SpilledNode)
+                    )
+            store._recount(self)
+
     def _repr_html_(self):
         from .html.statichtml import get_inline_html
 
         return get_inline_html(self)
 
 
-def start_trace_block(
+def _open_node(
+    parents: tuple[TracingNode, ...],
     name: str,
-    kind: Optional[str] = None,
-    inputs: Optional[dict[str, Any]] = None,
-    meta: Optional[Metadata] = None,
-    writer: Optional["TraceWriter"] = None,
-) -> tuple[TracingNode, Any]:
-    parents = _TRACING_STACK.get()
+    kind: Optional[str],
+    inputs: Optional[dict[str, Any]],
+    meta: Optional[Metadata],
+    writer: Optional["TraceWriter"],
+    parent_ref: Optional[NodeRef] = None,
+) -> TracingNode:
+    """
+    Creates a new node and attaches it to the last node of `parents`; it does not touch the tracing stack.
+    """
+    stats = _stats.STATS
+    if stats is not None:
+        stats.add("nodes")
     if parents:
-        parent = parents[-1]
-        lock = parent._lock
+        lock = parents[-1]._lock
+    elif stats is not None:
+        lock = _stats.TimedLock(stats)
     else:
-        parent = None
         lock = Lock()
-    node = TracingNode(name, kind, meta, lock=lock)
+    node = TracingNode(name, kind, meta, lock=lock, parent_ref=parent_ref)
+    if _COLLECTORS:
+        node._profile = [(c, c.start()) for c in _COLLECTORS]
+        node._profile_thread = get_ident()
+    if parents:
+        node._spill = parents[-1]._spill
     if inputs:
         for key, value in inputs.items():
             # We do not have hold lock, as node is private for us now
             node._add_entry("input", key, value)
-    token = _TRACING_STACK.set(parents + (node,))
-    if writer is None:
-        writer = current_writer()
-    if parent:
+    if parents:
+        parent_node = parents[-1]
         with lock:
-            assert parent.state == TracingNodeState.OPEN
-            if parent.children is None:
-                parent.children = []
-            parent.children.append(node)
+            assert parent_node.state == TracingNodeState.OPEN
+            if parent_node.children is None:
+                parent_node.children = []
+            parent_node.children.append(node)
+            if node._spill is not None:
+                node._spill.add_node()
         if writer:
             writer.write_node(parents[0], False)
     else:
         if writer:
             writer.write_node(node, False)
-    return node, token
+    return node
 
 
-def end_trace_block(node, token, error, writer=None):
-    _TRACING_STACK.reset(token)
+def _sequential_children(node: TracingNode) -> list:
+    """
+    Profiled children that do not overlap in time with any other profiled child.
+    """
+    children = [
+        child
+        for child in node.children or ()
+        if getattr(child, "_profile_total", None)
+        and child.start_time is not None
+        and child.end_time is not None
+    ]
+    children.sort(key=lambda child: child.start_time)
+    result = []
+    end = None
+    for i, child in enumerate(children):
+        overlaps = end is not None and child.start_time < end
+        if i + 1 < len(children) and children[i + 1].start_time < child.end_time:
+            overlaps = True
+        if not overlaps:
+            result.append(child)
+        if end is None or child.end_time > end:
+            end = child.end_time
+    return result
+
+
+def _stop_collectors(node: TracingNode):
+    total = {}
+    thread_counters = set()
+    for collector, state in node._profile:
+        total.update(collector.stop(state))
+        thread_counters.update(collector.thread_counters)
+    node._profile = None
+    with node._lock:
+        node._profile_total = total
+        counters = dict(total)
+        # Store only what is not covered by children, as counters are summed over subtrees.
+        # Values of concurrent children (thread pools, async tasks) overlap each other, so they
+        # are not subtracted; per-thread values are subtracted only for children on the same thread.
+        for child in _sequential_children(node):
+            same_thread = child._profile_thread == node._profile_thread
+            for key, value in child._profile_total.items():
+                if key in counters and (same_thread or key not in thread_counters):
+                    counters[key] -= value
+        if node.meta is None:
+            node.meta = Metadata(counters=counters)
+        else:
+            # Metadata may be shared between nodes (e.g. by `with_trace`)
+            if node.meta.counters:
+                counters = {**node.meta.counters, **counters}
+            node.meta = dataclasses.replace(node.meta, counters=counters)
+
+
+def _close_node(
+    node: TracingNode,
+    error: Optional[BaseException],
+    parents: tuple[TracingNode, ...],
+    writer: Optional["TraceWriter"],
+):
+    """
+    Finishes a node created by `_open_node`; `parents` are the ancestors of the node.
+    """
+    if node._profile is not None:
+        _stop_collectors(node)
     with node._lock:
         if node.state == TracingNodeState.OPEN:
             if error is None:
@@ -274,16 +500,48 @@ def end_trace_block(node, token, error, writer=None):
                 node.state = TracingNodeState.ERROR
                 node._add_entry("error", "", error)
         node.end_time = datetime.now()
-    if writer is None:
-        writer = current_writer()
-    if writer:
-        parents = _TRACING_STACK.get()
+        # Counters are rolled up into the parent, so totals are available without walking the tree
         if parents:
+            total_counters = node._total_counters()
+            if total_counters:
+                parents[-1]._add_child_counters(total_counters)
+    spill = node._spill
+    if spill is not None and parents and spill.over_budget():
+        spill.spill(parents[0])
+    if writer:
+        if parents and node.parent_ref is None:
             writer.write_node(parents[0], False)
         else:
             writer.write_node(node, True)
 
 
+def start_trace_block(
+    name: str,
+    kind: Optional[str] = None,
+    inputs: Optional[dict[str, Any]] = None,
+    meta: Optional[Metadata] = None,
+    writer: Optional["TraceWriter"] = None,
+    parent: Optional[NodeRef] = None,
+) -> tuple[TracingNode, Any]:
+    if parent is None:
+        parents = _TRACING_STACK.get()
+    else:
+        # Node is a root of a fragment of a trace living in another process
+        parents = ()
+    if writer is None:
+        writer = current_writer()
+    node = _open_node(parents, name, kind, inputs, meta, writer, parent)
+    token = _TRACING_STACK.set(parents + (node,))
+    return node, token
+
+
+def end_trace_block(node, token, error, writer=None):
+    _TRACING_STACK.reset(token)
+    if writer is None:
+        writer = current_writer()
+    _close_node(node, error, _TRACING_STACK.get(), writer)
+
+
 @contextmanager
 def trace(
     name: str,
@@ -291,6 +549,7 @@ def trace(
     inputs: dict[str, Any] | None = None,
     meta: Metadata | None = None,
     writer: Optional["TraceWriter"] = None,
+    parent: Optional[NodeRef] = None,
 ):
     """
     The main function that creates a tracing context manager. Returns an instance of `TracingNode`.
@@ -303,8 +562,12 @@ def trace(
         c.add_output("", y)
     # <- Here the tracing node is already closed.
     ```
+
+    If `parent` is set (a `NodeRef` obtained by `current_node_ref()` usually in another process),
+    the node is not attached to the current tracing node but it is written as a fragment
+    of the referenced trace.
     """
-    node, token = start_trace_block(name, kind, inputs, meta, writer)
+    node, token = start_trace_block(name, kind, inputs, meta, writer, parent)
     try:
         yield node
     except BaseException as e:
@@ -326,8 +589,169 @@ def trace_instant(
     return current_tracing_node().add_instant(name, kind, inputs, meta)
 
 
+STREAM_BATCH_SIZE = 64
+"""Maximal number of items yielded by a traced generator that are collected before they are stored into the node"""
+STREAM_BATCH_DELAY = 0.25
+"""Maximal time (in seconds) that items yielded by a traced generator wait before they are stored into the node"""
+
+
+class _StreamRecorder:
+    """
+    Collects items yielded by a traced generator and stores them in batches
+    into a single "output" entry of the node.
+    """
+
+    def __init__(
+        self,
+        node: TracingNode,
+        parents: tuple[TracingNode, ...],
+        writer: Optional["TraceWriter"],
+        capture_output: bool,
+    ):
+        self.node = node
+        self.parents = parents
+        self.writer = writer
+        self.capture_output = capture_output
+        self.pending = []
+        self.output = None
+        self.count = 0
+        self.start_time = time.perf_counter()
+        self.first_time = None
+        self.last_time = None
+        self.max_gap = 0.0
+        self.flush_time = self.start_time + STREAM_BATCH_DELAY
+
+    def add(self, item: Any):
+        now = time.perf_counter()
+        if self.first_time is None:
+            self.first_time = now
+        else:
+            gap = now - self.last_time
+            if gap > self.max_gap:
+                self.max_gap = gap
+        self.last_time = now
+        self.count += 1
+        if self.capture_output:
+            self.pending.append(item)
+            if len(self.pending) >= STREAM_BATCH_SIZE or now >= self.flush_time:
+                self.flush()
+                self.flush_time = now + STREAM_BATCH_DELAY
+
+    def flush(self):
+        if not self.pending:
+            return
+        stats = _stats.STATS
+        if stats is not None:
+            start = time.perf_counter()
+        values = [serialize_with_type(item) for item in self.pending]
+        if stats is not None:
+            stats.record_time("serialize_us", start)
+        self.pending = []
+        node = self.node
+        with node._lock:
+            if self.output is None:
+                self.output = values
+                if node.entries is None:
+                    node.entries = []
+                node.entries.append({"kind": "output", "value": values})
+            else:
+                self.output.extend(values)
+        if self.writer:
+            self.writer.write_node(self.parents[0] if self.parents else node, False)
+
+    def close(self, error: Optional[BaseException]):
+        self.flush()
+        stats = {"items": self.count}
+        if self.first_time is not None:
+            stats["time_to_first_item"] = self.first_time - self.start_time
+            if self.count > 1:
+                stats["mean_inter_item_time"] = (self.last_time - self.first_time) / (
+                    self.count - 1
+                )
+                stats["max_inter_item_time"] = self.max_gap
+        self.node.add_entry("stream", "", stats)
+        _close_node(self.node, error, self.parents, self.writer)
+
+
+def _make_input_binder(
+    func: Callable,
+    capture_inputs: bool | Sequence[str],
+    exclude_inputs: Sequence[str],
+) -> Optional[Callable[[tuple, dict], dict]]:
+    """
+    Precomputes mapping of call arguments to parameter names, so `inspect.Signature.bind`
+    is not called on every call. It returns `None` if no input is captured.
+    """
+    if capture_inputs is False:
+        return None
+    parameters = list(inspect.signature(func).parameters.values())
+    if capture_inputs is True:
+        captured = {p.name for p in parameters}
+    else:
+        captured = set(capture_inputs)
+    captured.difference_update(exclude_inputs)
+    if not captured:
+        return None
+
+    order = {p.name: i for i, p in enumerate(parameters)}
+    positional = [
+        p.name
+        for p in parameters
+        if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)
+    ]
+    keywords = {
+        p.name
+        for p in parameters
+        if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)
+    }
+    var_positional = var_keyword = None
+    for p in parameters:
+        if p.kind == p.VAR_POSITIONAL and p.name in captured:
+            var_positional = p.name
+        elif p.kind == p.VAR_KEYWORD:
+            var_keyword = p.name
+    captured_positional = [
+        (i, name) for i, name in enumerate(positional) if name in captured
+    ]
+    n_positional = len(positional)
+    capture_var_keyword = var_keyword is not None and var_keyword in captured
+
+    def bind(args: tuple, kwargs: dict) -> dict:
+        inputs = {}
+        n_args = len(args)
+        for i, name in captured_positional:
+            if i >= n_args:
+                break
+            inputs[name] = args[i]
+        if var_positional is not None and n_args > n_positional:
+            inputs[var_positional] = args[n_positional:]
+        if kwargs:
+            extra = {}
+            for key, value in kwargs.items():
+                if key in keywords:
+                    if key in captured:
+                        inputs[key] = value
+                else:
+                    extra[key] = value
+            if extra and capture_var_keyword:
+                inputs[var_keyword] = extra
+            if len(inputs) > 1:
+                # Keep the order of parameters as in the signature
+                inputs = dict(sorted(inputs.items(), key=lambda item: order[item[0]]))
+        return inputs
+
+    return bind
+
+
 def with_trace(
-    fn: Callable = None, *, name=None, kind=None, meta: Optional[Metadata] = None
+    fn: Callable = None,
+    *,
+    name=None,
+    kind=None,
+    meta: Optional[Metadata] = None,
+    capture_inputs: bool | Sequence[str] = True,
+    exclude_inputs: Sequence[str] = (),
+    capture_output: bool = True,
 ):
     """
     A decorator wrapping every execution of the function in a new `TracingNode`.
@@ -335,6 +759,14 @@ def with_trace(
     The `inputs`, `output`, and `error` (if any) are set automatically.
     Note that you can access the created tracing in your function using `current_tracing_node`.
 
+    - `capture_inputs` - `True` captures all arguments, `False` none of them,
+      or a list of names of captured arguments.
+    - `exclude_inputs` - Names of arguments that are never captured.
+    - `capture_output` - If `False`, the returned value is not stored.
+
+    Generators and async generators are also supported; the node stays open while the generator is iterated.
+    Yielded items are stored in batches into the output entry and timing of items is stored in "stream" entry.
+
     *Usage:*
 
     ```python
@@ -342,44 +774,156 @@ def with_trace(
     def func():
         pass
 
-    @with_trace(name="custom_name", kind="custom_kind", tags=['tag1', 'tag2'])
+    @with_trace(name="custom_name", kind="custom_kind", meta=Metadata(icon="eye"))
     def func():
         pass
+
+    @with_trace(exclude_inputs=["client"], capture_output=False)
+    def func(client, query):
+        pass
     ```
     """
     if isinstance(fn, str):
         raise TypeError("use `with_tracing()` with explicit `name=...` parameter")
 
     def helper(func):
-        signature = inspect.signature(func)
+        bind = _make_input_binder(func, capture_inputs, exclude_inputs)
+        node_name = name or func.__name__
 
         @functools.wraps(func)
         def wrapper(*a, **kw):
-            binding = signature.bind(*a, **kw)
-            with trace(
-                name=name or func.__name__,
-                kind=kind or "call",
-                inputs=binding.arguments,
-                meta=meta,
-            ) as node:
+            inputs = bind(a, kw) if bind is not None else None
+            node, token = start_trace_block(node_name, node_kind, inputs, meta)
+            try:
                 output = func(*a, **kw)
+            except BaseException as e:
+                end_trace_block(node, token, e)
+                raise
+            if capture_output:
                 node.add_output("", output)
-                return output
+            end_trace_block(node, token, None)
+            return output
 
+        @functools.wraps(func)
         async def async_wrapper(*a, **kw):
-            binding = signature.bind(*a, **kw)
-            with trace(
-                name=name or func.__name__,
-                kind=kind or "acall",
-                inputs=binding.arguments,
-            ) as node:
+            inputs = bind(a, kw) if bind is not None else None
+            node, token = start_trace_block(node_name, node_kind, inputs, meta)
+            try:
                 output = await func(*a, **kw)
+            except BaseException as e:
+                end_trace_block(node, token, e)
+                raise
+            if capture_output:
                 node.add_output("", output)
-                return output
+            end_trace_block(node, token, None)
+            return output
+
+        @functools.wraps(func)
+        def generator_wrapper(*a, **kw):
+            inputs = bind(a, kw) if bind is not None else None
+            parents = _TRACING_STACK.get()
+            writer = current_writer()
+            node = _open_node(parents, node_name, node_kind, inputs, meta, writer)
+            stack = parents + (node,)
+            recorder = _StreamRecorder(node, parents, writer, capture_output)
+            try:
+                token = _TRACING_STACK.set(stack)
+                try:
+                    gen = func(*a, **kw)
+                finally:
+                    _TRACING_STACK.reset(token)
+                send = gen.send
+                value = None
+                while True:
+                    token = _TRACING_STACK.set(stack)
+                    try:
+                        item = send(value)
+                    finally:
+                        _TRACING_STACK.reset(token)
+                    recorder.add(item)
+                    send = gen.send
+                    try:
+                        value = yield item
+                    except GeneratorExit:
+                        raise
+                    except BaseException as e:
+                        # Forward exception thrown into the wrapper to the wrapped generator
+                        send = gen.throw
+                        value = e
+            except StopIteration as e:
+                if capture_output and e.value is not None:
+                    node.add_output("return", e.value)
+                recorder.close(None)
+                return e.value
+            except GeneratorExit:
+                token = _TRACING_STACK.set(stack)
+                try:
+                    gen.close()
+                finally:
+                    _TRACING_STACK.reset(token)
+                recorder.close(None)
+                raise
+            except BaseException as e:
+                recorder.close(e)
+                raise
 
-        if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_generator_wrapper(*a, **kw):
+            inputs = bind(a, kw) if bind is not None else None
+            parents = _TRACING_STACK.get()
+            writer = current_writer()
+            node = _open_node(parents, node_name, node_kind, inputs, meta, writer)
+            stack = parents + (node,)
+            recorder = _StreamRecorder(node, parents, writer, capture_output)
+            try:
+                token = _TRACING_STACK.set(stack)
+                try:
+                    agen = func(*a, **kw)
+                finally:
+                    _TRACING_STACK.reset(token)
+                send = agen.asend
+                value = None
+                while True:
+                    token = _TRACING_STACK.set(stack)
+                    try:
+                        item = await send(value)
+                    finally:
+                        _TRACING_STACK.reset(token)
+                    recorder.add(item)
+                    send = agen.asend
+                    try:
+                        value = yield item
+                    except GeneratorExit:
+                        raise
+                    except BaseException as e:
+                        send = agen.athrow
+                        value = e
+            except StopAsyncIteration:
+                recorder.close(None)
+                return
+            except GeneratorExit:
+                token = _TRACING_STACK.set(stack)
+                try:
+                    await agen.aclose()
+                finally:
+                    _TRACING_STACK.reset(token)
+                recorder.close(None)
+                raise
+            except BaseException as e:
+                recorder.close(e)
+                raise
+
+        if inspect.isasyncgenfunction(func):
+            node_kind = kind or "acall"
+            return async_generator_wrapper
+        elif inspect.isgeneratorfunction(func):
+            node_kind = kind or "call"
+            return generator_wrapper
+        elif inspect.iscoroutinefunction(func):
+            node_kind = kind or "acall"
             return async_wrapper
         else:
+            node_kind = kind or "call"
             return wrapper
 
     if fn is not None:
@@ -404,4 +948,18 @@ def current_tracing_node(check: bool = True) -> Optional[TracingNode]:
     return stack[-1]
 
 
+def current_node_ref() -> NodeRef:
+    """
+    Returns a picklable reference to the inner-most open tracing node.
+
+    The reference can be sent to another process and used as `parent` argument of `trace`.
+    """
+    stack = _TRACING_STACK.get()
+    if not stack:
+        raise Exception("No current tracing")
+    root = stack[0]
+    trace_uid = root.parent_ref.trace_uid if root.parent_ref else root.uid
+    return NodeRef(trace_uid, stack[-1].uid)
+
+
 from .writer.base import current_writer, TraceWriter
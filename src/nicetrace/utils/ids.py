@@ -2,7 +2,9 @@ import random
 import string
 
 chars = string.ascii_letters + string.digits
+# Drawing pairs of chars halves the number of random draws
+_pairs = [a + b for a in chars for b in chars]
 
 
 def generate_uid() -> str:
-    return "".join(random.choice(chars) for _ in range(10))
+    return "".join(random.choices(_pairs, k=5))
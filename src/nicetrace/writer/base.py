@@ -2,6 +2,8 @@ from contextvars import ContextVar
 from abc import ABC, abstractmethod
 from typing import Optional
 
+from ..jsonbackend import dumps_bytes
+from ..serialization import reference_tracebacks
 from ..tracing import TracingNode
 
 _TRACE_WRITER: ContextVar[Optional["TraceWriter"]] = ContextVar(
@@ -40,6 +42,53 @@ class TraceWriter(ABC):
         _TRACE_WRITER.reset(self.__token)
 
 
+def trace_header(data: dict) -> dict:
+    """
+    Summary of a serialized trace that writers store at the beginning of trace files.
+    """
+    nodes = 0
+    errors = 0
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        nodes += 1
+        if node.get("state") == "error":
+            errors += 1
+        children = node.get("children")
+        if children:
+            stack.extend(children)
+    header = {
+        "uid": data["uid"],
+        "name": data["name"],
+        "state": data.get("state", "finished"),
+        "start_time": data.get("start_time"),
+        "end_time": data.get("end_time"),
+        "nodes": nodes,
+        "errors": errors,
+    }
+    if data.get("total_counters"):
+        header["total_counters"] = data["total_counters"]
+    return header
+
+
+def serialize_trace(node: TracingNode) -> bytes:
+    """
+    Serializes a trace into UTF-8 encoded JSON that starts with a fixed "header" record (see `trace_header`),
+    so readers may get summaries of traces by parsing only a prefix of files.
+    Repeated tracebacks are stored once (see `reference_entries`).
+    """
+    return serialize_trace_data(reference_tracebacks(node.to_dict()))
+
+
+def serialize_trace_data(data: dict) -> bytes:
+    """
+    Same as `serialize_trace` for a trace that is already converted into a dictionary.
+    """
+    body = memoryview(dumps_bytes(data))
+    # The body is not copied before the final join
+    return b"".join((b'{"header": ', dumps_bytes(trace_header(data)), b", ", body[1:]))
+
+
 def current_writer() -> TraceWriter | None:
     """
     Get the current global writer.
@@ -0,0 +1,137 @@
+import atexit
+import time
+from abc import abstractmethod
+from datetime import timedelta
+from threading import Condition, Lock, Thread
+
+from .base import TraceWriter
+from ..tracing import TracingNode
+
+PendingItem = tuple[TracingNode, bool]
+
+
+class BufferedWriter(TraceWriter):
+    """
+    Base class of writers that send traces to another process by a background thread.
+
+    `write_node` only records the trace and returns; traces are sent at most once per `min_write_delay`
+    (finished traces cut the delay short). Traces that could not be sent are kept for the next cycle.
+    At most `max_pending` traces are buffered; when the buffer is full, the oldest trace is dropped
+    (unfinished traces first, as they will be written again anyway), `dropped` counts the losses.
+
+    Buffered traces are also sent when the process exits without stopping the writer.
+    """
+
+    def __init__(self, min_write_delay: timedelta, max_pending: int):
+        self.min_write_delay = min_write_delay
+        self.max_pending = max_pending
+        self.dropped = 0
+
+        self.lock = Lock()
+        self.condition = Condition(self.lock)
+        # Insertion order is the order of the last update, the oldest traces are first
+        self.pending: dict[str, PendingItem] = {}
+        self.has_final = False
+        self.state = "new"
+        self.thread = Thread(target=self._run, daemon=True)
+        # Serializes sending by the background thread, `sync` and the exit handler
+        self.send_lock = Lock()
+
+    @abstractmethod
+    def _send(self, items: list[PendingItem]) -> list[PendingItem]:
+        """
+        Sends traces, returns traces that were not sent. It is called under the send lock.
+        """
+
+    def _drop_oldest(self):
+        for uid, (_, final) in self.pending.items():
+            if not final:
+                break
+        else:
+            uid = next(iter(self.pending))
+        del self.pending[uid]
+        self.dropped += 1
+
+    def _add_pending(self, node: TracingNode, final: bool):
+        previous = self.pending.pop(node.uid, None)
+        if previous is None and len(self.pending) >= self.max_pending:
+            self._drop_oldest()
+        self.pending[node.uid] = (node, final or (previous is not None and previous[1]))
+
+    def write_node(self, node: TracingNode, final: bool):
+        with self.condition:
+            self._add_pending(node, final)
+            if final:
+                self.has_final = True
+                self.condition.notify()
+
+    def _send_pending(self) -> bool:
+        with self.send_lock:
+            with self.condition:
+                items = list(self.pending.values())
+                self.pending = {}
+                self.has_final = False
+            if not items:
+                return True
+            failed = self._send(items)
+        if failed:
+            self._requeue(failed)
+            return False
+        return True
+
+    def _requeue(self, items: list[PendingItem]):
+        with self.condition:
+            pending = self.pending
+            self.pending = {}
+            for node, final in items:
+                self._add_pending(node, final)
+            # Traces written in the meantime replace the requeued ones
+            for node, final in pending.values():
+                self._add_pending(node, final)
+
+    def _run(self):
+        delay = self.min_write_delay.total_seconds()
+        while True:
+            with self.condition:
+                while not self.pending and self.state == "running":
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                stopping = self.state != "running"
+            if not self._send_pending() and stopping:
+                # The receiver is not reachable, remaining traces are lost
+                return
+            deadline = time.monotonic() + delay
+            with self.condition:
+                while self.state == "running" and not self.has_final:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+
+    def _send_at_exit(self):
+        # The background thread is a daemon, it is killed at the exit of the process
+        self._send_pending()
+
+    def start(self):
+        with self.condition:
+            assert self.state == "new"
+            self.state = "running"
+            self.thread.start()
+        atexit.register(self._send_at_exit)
+
+    def sync(self):
+        self._send_pending()
+
+    def stop(self):
+        atexit.unregister(self._send_at_exit)
+        with self.condition:
+            self.state = "stopped"
+            self.condition.notify()
+        self.thread.join()
+        self._close()
+
+    def _close(self):
+        """
+        Called when the writer is stopped, after all traces were sent.
+        """
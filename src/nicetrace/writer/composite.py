@@ -0,0 +1,212 @@
+import time
+import zlib
+from datetime import timedelta
+from threading import Condition, Lock, Thread
+from typing import Callable, Optional, Sequence
+
+from .base import TraceWriter, serialize_trace
+from ..tracing import TracingNode
+
+
+class Sink:
+    """
+    A writer used by `CompositeWriter` together with its write policy.
+
+    - `min_write_delay` - minimal delay between writes of unfinished traces; finished traces are written immediately.
+    - `sample_rate` - fraction of traces that are written; the decision is made by the trace uid,
+      so a trace is either written completely or not at all.
+    - `filter` - called on the root node of the trace before each write; the write is skipped if it returns `False`.
+      E.g. `lambda node: node.state != TracingNodeState.OPEN` writes only finished traces.
+
+    Errors of the writer and of the filter do not propagate into the traced code;
+    they are counted in `errors` and the last one is kept in `last_error`.
+    """
+
+    def __init__(
+        self,
+        writer: TraceWriter,
+        min_write_delay: timedelta = timedelta(milliseconds=300),
+        sample_rate: float = 1.0,
+        filter: Optional[Callable[[TracingNode], bool]] = None,
+    ):
+        self.writer = writer
+        self.min_write_delay = min_write_delay
+        self.sample_rate = sample_rate
+        self.filter = filter
+        self.errors = 0
+        self.last_error: Optional[Exception] = None
+
+        self._composite: Optional["CompositeWriter"] = None
+        self._condition = Condition(Lock())
+        self._write_lock = Lock()
+        self._pending: dict[str, tuple[TracingNode, bool]] = {}
+        self._has_final = False
+        self._state = "new"
+        self._thread: Optional[Thread] = None
+        # Writers without `write_serialized` serialize traces on their own
+        self._serialized = hasattr(writer, "write_serialized")
+
+    def accepts(self, node: TracingNode) -> bool:
+        if self.sample_rate < 1.0:
+            if zlib.crc32(node.uid.encode()) / 0x100000000 >= self.sample_rate:
+                return False
+        if self.filter is None:
+            return True
+        try:
+            return bool(self.filter(node))
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+            return False
+
+    def _enqueue(self, node: TracingNode, final: bool):
+        with self._condition:
+            previous = self._pending.get(node.uid)
+            final = final or (previous is not None and previous[1])
+            self._pending[node.uid] = (node, final)
+            if final:
+                self._has_final = True
+            self._condition.notify()
+
+    def _take_pending(self) -> dict[str, tuple[TracingNode, bool]]:
+        pending = self._pending
+        self._pending = {}
+        self._has_final = False
+        return pending
+
+    def _write(self, pending: dict[str, tuple[TracingNode, bool]]):
+        with self._write_lock:
+            for node, final in pending.values():
+                try:
+                    if self._serialized:
+                        # Snapshot is taken under the write lock, so an older snapshot never overwrites a newer one
+                        data = self._composite._snapshot(node)
+                        self.writer.write_serialized(node, data)
+                    else:
+                        self.writer.write_node(node, final)
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = e
+                if final:
+                    self._composite._release(node)
+            # End of a write cycle, e.g. batched durability of `DirWriter` flushes files to disk
+            self.writer.sync()
+
+    def _run(self):
+        delay = self.min_write_delay.total_seconds()
+        while True:
+            with self._condition:
+                while not self._pending and self._state == "running":
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                pending = self._take_pending()
+            self._write(pending)
+            # Unfinished traces are written at most once per delay
+            deadline = time.monotonic() + delay
+            with self._condition:
+                while self._state == "running" and not self._has_final:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+    def _start(self, composite: "CompositeWriter"):
+        with self._condition:
+            assert self._state == "new"
+            self._composite = composite
+            self._state = "running"
+            if not self._serialized:
+                self.writer.start()
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _sync(self):
+        with self._condition:
+            pending = self._take_pending()
+        self._write(pending)
+
+    def _stop(self):
+        with self._condition:
+            self._state = "stopped"
+            self._condition.notify()
+        self._thread.join()
+        if not self._serialized:
+            self.writer.stop()
+
+
+class CompositeWriter(TraceWriter):
+    """
+    Writes traces into several writers (sinks) at once.
+
+    Each sink has its own write policy (see `Sink`) and its own worker thread, so a slow sink
+    does not block the traced code or the other sinks. A snapshot of a trace is serialized once
+    and shared by all sinks that write the same version of the trace.
+
+    Writers with `write_serialized` (`DirWriter` and `FileWriter`) get the shared snapshots
+    and are used only through the composite writer, they are not started on their own.
+    Other writers (e.g. `SocketWriter` or `RemoteWriter`) serialize traces themselves in `write_node`;
+    they are started and stopped together with the composite writer.
+    """
+
+    def __init__(self, sinks: Sequence[Sink | TraceWriter]):
+        self.sinks = [sink if isinstance(sink, Sink) else Sink(sink) for sink in sinks]
+        self.lock = Lock()
+        # Every `write_node` creates a new version of the node; snapshots are shared for the same version
+        self._versions: dict[str, int] = {}
+        self._snapshots: dict[str, tuple[int, str]] = {}
+        # Number of sinks that have not written the final version of the node yet
+        self._final_refs: dict[str, int] = {}
+
+    def write_node(self, node: TracingNode, final: bool):
+        sinks = [sink for sink in self.sinks if sink.accepts(node)]
+        uid = node.uid
+        if not sinks:
+            if final:
+                with self.lock:
+                    if uid not in self._final_refs:
+                        self._versions.pop(uid, None)
+                        self._snapshots.pop(uid, None)
+            return
+        with self.lock:
+            self._versions[uid] = self._versions.get(uid, 0) + 1
+            if final:
+                self._final_refs[uid] = self._final_refs.get(uid, 0) + len(sinks)
+        for sink in sinks:
+            sink._enqueue(node, final)
+
+    def _snapshot(self, node: TracingNode) -> str:
+        uid = node.uid
+        with self.lock:
+            version = self._versions.get(uid)
+            cached = self._snapshots.get(uid)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        data = serialize_trace(node)
+        with self.lock:
+            if uid in self._versions:
+                self._snapshots[uid] = (version, data)
+        return data
+
+    def _release(self, node: TracingNode):
+        uid = node.uid
+        with self.lock:
+            refs = self._final_refs.get(uid, 0) - 1
+            if refs > 0:
+                self._final_refs[uid] = refs
+            else:
+                self._final_refs.pop(uid, None)
+                self._versions.pop(uid, None)
+                self._snapshots.pop(uid, None)
+
+    def start(self):
+        for sink in self.sinks:
+            sink._start(self)
+
+    def sync(self):
+        for sink in self.sinks:
+            sink._sync()
+
+    def stop(self):
+        for sink in self.sinks:
+            sink._stop()
@@ -1,24 +1,132 @@
+import atexit
 from abc import abstractmethod
 from threading import Lock, Thread, Condition
-from .base import TraceWriter
+from .base import TraceWriter, serialize_trace_data
+from .stream import write_trace
 from ..tracing import TracingNode
+from .. import stats as _stats
 from datetime import datetime, timedelta
+import re
 import time
 import uuid
 import os
-import json
 from pathlib import Path
+from typing import IO, Callable, Iterable, Optional
+import zlib
 
+FRAGMENTS_DIR = "fragments"
 
-def write_file(filename: str | os.PathLike, data: str):
-    tmp_filename = f".{uuid.uuid4().hex}._tmp"
+DURABILITY_MODES = ("fast", "safe", "batched")
+
+LAYOUTS = ("flat", "time", "hash")
+# A file in the root of a trace directory that stores its layout (if it is not flat)
+LAYOUT_FILE = ".nicetrace-layout"
+# Separates partitions in storage ids of partitioned traces, e.g. "2024~05~01~13~trace-<ID>"
+STORAGE_ID_SEPARATOR = "~"
+# Number of partitions of the "hash" layout
+HASH_PARTITIONS = 256
+# Uids of traces received from other processes are used in filenames
+_SAFE_UID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def trace_partition(layout: str, uid: str, time: Optional[datetime]) -> list[str]:
+    """
+    Returns directories (relative to the root of a trace directory) where a trace is stored.
+    """
+    if layout == "time":
+        return [
+            f"{time.year:04}",
+            f"{time.month:02}",
+            f"{time.day:02}",
+            f"{time.hour:02}",
+        ]
+    if layout == "hash":
+        return [f"{zlib.crc32(uid.encode()) % HASH_PARTITIONS:02x}"]
+    return []
+
+
+def read_layout(path: str | os.PathLike) -> str:
+    try:
+        with open(os.path.join(path, LAYOUT_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "flat"
+
+
+def fsync_dir(path: str | os.PathLike):
+    """
+    Makes a rename or a creation of a file in the directory durable.
+    """
+    if os.name == "nt":
+        # Directories cannot be opened on Windows, renames are durable with the file
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_files(filenames: Iterable[str | os.PathLike]):
+    """
+    Flushes already written files and their directories to disk.
+    """
+    stats = _stats.STATS
+    if stats is not None:
+        start = time.perf_counter()
+    dirs = set()
+    for filename in filenames:
+        try:
+            fd = os.open(filename, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        dirs.add(os.path.dirname(filename) or ".")
+    for path in dirs:
+        fsync_dir(path)
+    if stats is not None:
+        stats.record_time("fsync_us", start)
+
+
+def write_file(
+    filename: str | os.PathLike,
+    data: str | bytes | Callable[[IO[bytes]], None],
+    durability: str = "fast",
+):
+    """
+    Atomically replaces the content of the file; `bytes` are written without any conversion.
+    If `data` is a function, it is called with the file opened in binary mode and it writes the content. The temporary file is created
+    in the target directory, so the final rename never crosses filesystems.
+
+    If `durability` is "safe", the file and its directory are flushed to disk before returning.
+    """
+    stats = _stats.STATS
+    if stats is not None:
+        start = time.perf_counter()
+    dirname = os.path.dirname(filename)
+    tmp_filename = os.path.join(dirname, f".{uuid.uuid4().hex}._tmp")
     try:
-        with open(tmp_filename, "w") as f:
-            f.write(data)
-        os.rename(tmp_filename, filename)
+        with open(tmp_filename, "w" if isinstance(data, str) else "wb") as f:
+            if callable(data):
+                data(f)
+            else:
+                f.write(data)
+            size = f.tell()
+            if durability == "safe":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_filename, filename)
     finally:
         if os.path.exists(tmp_filename):
             os.unlink(tmp_filename)
+    if durability == "safe":
+        fsync_dir(dirname or ".")
+    if stats is not None:
+        stats.record_time("write_file_us", start)
+        stats.record("write_file_bytes", size)
 
 
 def _delay_write_thread(writer):
@@ -35,7 +143,25 @@ def _delay_write_thread(writer):
 
 
 class DelayedWriter(TraceWriter):
-    def __init__(self, min_write_delay: timedelta):
+    """
+    Base class of writers that delay writes of running traces.
+
+    `durability` is one of:
+
+    - "fast" - files are not flushed to disk (the operating system writes them later),
+    - "safe" - every write is flushed to disk (file and directory) before the write returns,
+    - "batched" - files written during one write cycle (`min_write_delay`) are flushed to disk together
+      at the end of the cycle and when the writer is synced or stopped.
+    """
+
+    def __init__(self, min_write_delay: timedelta, durability: str = "fast"):
+        if durability not in DURABILITY_MODES:
+            raise Exception(
+                f"Invalid durability '{durability}', expected one of {DURABILITY_MODES}"
+            )
+        self.durability = durability
+        self.unsynced = set()
+        self.unsynced_lock = Lock()
         self.lock = Lock()
         self.last_write = {}
         self.pending = set()
@@ -49,8 +175,11 @@ class DelayedWriter(TraceWriter):
             assert self.state == "new"
             self.state = "running"
             self.thread.start()
+        # The write thread is a daemon, so pending writes are done at the exit of the process
+        atexit.register(self.sync)
 
     def stop(self):
+        atexit.unregister(self.sync)
         with self.lock:
             self._sync()
             self.state = "stopped"
@@ -63,6 +192,9 @@ class DelayedWriter(TraceWriter):
             self.last_write.pop(uid, None)
             if node in self.pending:
                 self.pending.remove(node)
+            if self.durability == "batched":
+                # Wakes up the write thread, that flushes files to disk
+                self.condition.notify()
         else:
             last_write = self.last_write.get(uid)
             now = datetime.now()
@@ -74,10 +206,35 @@ class DelayedWriter(TraceWriter):
                 self.last_write[uid] = now
 
     def _sync(self):
+        stats = _stats.STATS
+        if stats is not None and self.pending:
+            start = time.perf_counter()
+            stats.record("pending_nodes", len(self.pending))
         for node in self.pending:
             self._write_node_to_file(node)
             self.last_write[node.uid] = datetime.now()
+        if stats is not None and self.pending:
+            stats.record_time("flush_us", start)
         self.pending.clear()
+        if self.durability == "batched":
+            self._fsync_written()
+
+    def _write_file(
+        self, filename: str, data: str | bytes | Callable[[IO[bytes]], None]
+    ):
+        if self.durability == "batched":
+            write_file(filename, data)
+            with self.unsynced_lock:
+                self.unsynced.add(filename)
+        else:
+            write_file(filename, data, self.durability)
+
+    def _fsync_written(self):
+        with self.unsynced_lock:
+            filenames = self.unsynced
+            self.unsynced = set()
+        if filenames:
+            fsync_files(filenames)
 
     def sync(self):
         with self.lock:
@@ -93,18 +250,89 @@ class DirWriter(DelayedWriter):
     Writes JSON serialized trace into a given directory.
     Trace is saved under filename trace-<ID>.json.
     It allows to write multiple traces at once.
+
+    Fragments of traces (nodes created with `parent` reference in another process)
+    are saved under fragments/<TRACE_ID>/<ID>.json and they are stitched into
+    their traces by `DirReader`.
+
+    For very large stores, traces can be partitioned into subdirectories by `layout`:
+
+    - "flat" - all traces are stored directly in the directory,
+    - "time" - traces are stored in YYYY/MM/DD/HH/ directories by the start time of the trace,
+    - "hash" - traces are stored in 256 directories by a hash of the trace uid.
     """
 
     def __init__(
-        self, path: str, min_write_delay: timedelta = timedelta(milliseconds=300)
+        self,
+        path: str,
+        min_write_delay: timedelta = timedelta(milliseconds=300),
+        durability: str = "fast",
+        layout: str = "flat",
     ):
-        super().__init__(min_write_delay)
+        super().__init__(min_write_delay, durability)
+        if layout not in LAYOUTS:
+            raise Exception(f"Invalid layout '{layout}', expected one of {LAYOUTS}")
         Path(path).mkdir(parents=True, exist_ok=True)
+        current_layout = read_layout(path)
+        if current_layout != layout:
+            if os.path.exists(os.path.join(path, LAYOUT_FILE)):
+                raise Exception(
+                    f"Directory '{path}' uses layout '{current_layout}', not '{layout}'"
+                )
+            write_file(os.path.join(path, LAYOUT_FILE), layout)
         self.path = path
+        self.layout = layout
+        self.created_dirs = set()
 
     def _write_node_to_file(self, node):
-        json_data = json.dumps(node.to_dict())
-        write_file(os.path.join(self.path, f"trace-{node.uid}.json"), json_data)
+        # Streamed node by node, the serialized trace is never held in memory as a whole
+        self.write_serialized(node, lambda f: write_trace(node, f))
+
+    def _trace_filename(
+        self, uid: str, parent_trace_uid: Optional[str], time: Optional[datetime]
+    ) -> str:
+        if parent_trace_uid is not None:
+            path = os.path.join(self.path, FRAGMENTS_DIR, parent_trace_uid)
+            os.makedirs(path, exist_ok=True)
+            return os.path.join(path, f"{uid}.json")
+        if self.layout == "flat":
+            return os.path.join(self.path, f"trace-{uid}.json")
+        partition = trace_partition(self.layout, uid, time or datetime.now())
+        path = os.path.join(self.path, *partition)
+        if path not in self.created_dirs:
+            os.makedirs(path, exist_ok=True)
+            self.created_dirs.add(path)
+        return os.path.join(path, f"trace-{uid}.json")
+
+    def write_serialized(
+        self, node: TracingNode, json_data: bytes | Callable[[IO[bytes]], None]
+    ):
+        filename = self._trace_filename(
+            node.uid,
+            node.parent_ref.trace_uid if node.parent_ref is not None else None,
+            node.start_time or node.end_time,
+        )
+        self._write_file(filename, json_data)
+
+    def write_trace_data(self, data: dict):
+        """
+        Immediately writes a trace (or a fragment) that is already converted into a dictionary,
+        e.g. a trace received from a `RemoteWriter`.
+        """
+        parent = data.get("parent")
+        parent_trace_uid = parent["trace_uid"] if parent else None
+        for uid in (data["uid"], parent_trace_uid):
+            if uid is not None and not _SAFE_UID.match(uid):
+                raise Exception(f"Invalid uid '{uid}'")
+        time = data.get("start_time") or data.get("end_time")
+        json_data = serialize_trace_data(data)
+        with self.lock:
+            filename = self._trace_filename(
+                data["uid"],
+                parent_trace_uid,
+                datetime.fromisoformat(time) if time else None,
+            )
+            self._write_file(filename, json_data)
 
     def write_node(self, node: TracingNode, final: bool):
         with self.lock:
@@ -119,9 +347,12 @@ class FileWriter(DelayedWriter):
     """
 
     def __init__(
-        self, filename: str, min_write_delay: timedelta = timedelta(milliseconds=300)
+        self,
+        filename: str,
+        min_write_delay: timedelta = timedelta(milliseconds=300),
+        durability: str = "fast",
     ):
-        super().__init__(min_write_delay)
+        super().__init__(min_write_delay, durability)
 
         filename = os.path.abspath(filename)
         path = os.path.dirname(filename)
@@ -133,8 +364,13 @@ class FileWriter(DelayedWriter):
         self.current_node = None
 
     def _write_node_to_file(self, node):
-        json_data = json.dumps(node.to_dict())
-        write_file(self.filename, json_data)
+        # Streamed node by node, the serialized trace is never held in memory as a whole
+        self.write_serialized(node, lambda f: write_trace(node, f))
+
+    def write_serialized(
+        self, node: TracingNode, json_data: bytes | Callable[[IO[bytes]], None]
+    ):
+        self._write_file(self.filename, json_data)
 
     def write_node(self, node: TracingNode, final: bool):
         with self.lock:
@@ -0,0 +1,151 @@
+import gzip
+import http.client
+import time
+import zlib
+from datetime import timedelta
+from typing import Optional
+from urllib.parse import urlsplit
+
+from ..jsonbackend import dumps_bytes, loads
+from .buffered import BufferedWriter, PendingItem
+
+INGEST_PATH = "/api/ingest"
+
+# Maximal size of a decompressed batch accepted by the ingest endpoint
+MAX_BATCH_BYTES = 64 * 1024 * 1024
+
+
+def encode_batch(traces: list[dict], compress: bool = True) -> bytes:
+    """
+    Encodes snapshots of traces (dictionaries created by `TracingNode.to_dict`) into a body of an ingest request.
+    """
+    body = dumps_bytes({"traces": traces})
+    if compress:
+        # Level 1 is much faster than the default and the ratio of JSON traces is still good
+        body = gzip.compress(body, compresslevel=1)
+    return body
+
+
+def decode_batch(
+    body: bytes, content_encoding: Optional[str] = None, max_size: int = MAX_BATCH_BYTES
+) -> list[dict]:
+    """
+    Decodes a body of an ingest request; the size of the decompressed body is limited by `max_size`.
+    """
+    if content_encoding == "gzip":
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        body = decompressor.decompress(body, max_size)
+        if decompressor.unconsumed_tail:
+            raise Exception("Batch is too large")
+    elif content_encoding not in (None, "", "identity"):
+        raise Exception(f"Unsupported encoding '{content_encoding}'")
+    elif len(body) > max_size:
+        raise Exception("Batch is too large")
+    data = loads(body)
+    traces = data.get("traces") if isinstance(data, dict) else None
+    if not isinstance(traces, list) or not all(isinstance(t, dict) for t in traces):
+        raise Exception("Batch has to contain a list of traces")
+    return traces
+
+
+class RemoteWriter(BufferedWriter):
+    """
+    Sends traces to a trace server started with ingest enabled
+    (`python -m nicetrace.server <DIR> --ingest`), that stores them into its directory.
+
+    Snapshots of traces are collected and sent in batches at most once per `min_write_delay`
+    (finished traces cut the delay short). Batches have at most `max_batch_size` traces,
+    they are compressed by gzip and sent over one persistent HTTP connection by a background thread.
+
+    A failed request is retried `retries` times with an exponential backoff; traces of a batch that
+    could not be sent are kept and sent in the next cycle. At most `max_pending` traces are buffered;
+    when the buffer is full, the oldest snapshot is dropped (unfinished traces first,
+    as their newer snapshots will be sent later anyway). `dropped` and `errors` count the losses.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        min_write_delay: timedelta = timedelta(milliseconds=500),
+        max_batch_size: int = 100,
+        max_pending: int = 1000,
+        retries: int = 3,
+        retry_delay: float = 0.5,
+        timeout: float = 10.0,
+        compress: bool = True,
+    ):
+        parsed = urlsplit(url)
+        if parsed.scheme not in ("http", "https"):
+            raise Exception(f"Invalid url '{url}', expected http:// or https://")
+        super().__init__(min_write_delay, max_pending)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.ingest_path = parsed.path.rstrip("/") + INGEST_PATH
+        self.max_batch_size = max_batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.compress = compress
+
+        self.errors = 0
+        self.last_error: Optional[Exception] = None
+        # Connection is used only under the send lock
+        self.connection: Optional[http.client.HTTPConnection] = None
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _post(self, body: bytes) -> bool:
+        """
+        Sends a batch; returns `False` if it failed and it should be sent again later.
+        """
+        headers = {"Content-Type": "application/json"}
+        if self.compress:
+            headers["Content-Encoding"] = "gzip"
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                if self.connection is None:
+                    self.connection = self._connect()
+                self.connection.request("POST", self.ingest_path, body, headers)
+                response = self.connection.getresponse()
+                message = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                error = e
+                if self.connection is not None:
+                    self.connection.close()
+                    self.connection = None
+                continue
+            if response.status == 200:
+                return True
+            error = Exception(
+                f"Ingest failed with status {response.status}: {message[:200]!r}"
+            )
+            if 400 <= response.status < 500 and response.status != 429:
+                # The batch is rejected, sending it again would not help
+                self.errors += 1
+                self.last_error = error
+                return True
+        self.errors += 1
+        self.last_error = error
+        return False
+
+    def _send(self, items: list[PendingItem]) -> list[PendingItem]:
+        for i in range(0, len(items), self.max_batch_size):
+            batch = items[i : i + self.max_batch_size]
+            body = encode_batch([node.to_dict() for node, _ in batch], self.compress)
+            if not self._post(body):
+                return items[i:]
+        return []
+
+    def _close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
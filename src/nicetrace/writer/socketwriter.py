@@ -0,0 +1,123 @@
+import os
+import socket
+import struct
+import tempfile
+from datetime import timedelta
+from typing import IO, Optional
+
+from ..jsonbackend import dumps_bytes, loads
+from .buffered import BufferedWriter, PendingItem
+from ..tracing import TRACING_FORMAT_VERSION, TracingNode, TracingNodeState
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "nicetrace-collector.sock")
+
+# Messages are framed by their length
+_FRAME_HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 1 << 30
+
+
+def encode_messages(messages: list[dict]) -> bytes:
+    chunks = []
+    for message in messages:
+        data = dumps_bytes(message)
+        chunks.append(_FRAME_HEADER.pack(len(data)))
+        chunks.append(data)
+    return b"".join(chunks)
+
+
+def read_message(file: IO[bytes]) -> Optional[dict]:
+    """
+    Reads one message from a socket file; returns `None` at the end of the stream.
+    """
+    header = file.read(_FRAME_HEADER.size)
+    if len(header) < _FRAME_HEADER.size:
+        return None
+    (size,) = _FRAME_HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise Exception(f"Message is too large ({size} bytes)")
+    data = file.read(size)
+    if len(data) < size:
+        return None
+    return loads(data)
+
+
+class SocketWriter(BufferedWriter):
+    """
+    Sends traces to a local collector (`python -m nicetrace.collector <DIR>`) over a Unix domain socket;
+    the collector owns all writes to the trace directory.
+
+    Only nodes changed since the last send are sent: a node is sent again only while it is open,
+    so finished subtrees are serialized just once. If the connection fails, the next send
+    starts from whole traces, as the collector may have been restarted.
+
+    See `BufferedWriter` for buffering of traces when the collector is not reachable.
+    """
+
+    def __init__(
+        self,
+        socket_path: str = DEFAULT_SOCKET_PATH,
+        min_write_delay: timedelta = timedelta(milliseconds=100),
+        max_pending: int = 1000,
+        timeout: float = 5.0,
+    ):
+        super().__init__(min_write_delay, max_pending)
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.errors = 0
+        self.last_error: Optional[Exception] = None
+        # Socket and sent nodes are used only under the send lock
+        self.socket: Optional[socket.socket] = None
+        # Root uid -> uids of nodes that were sent closed
+        self.sent: dict[str, set[str]] = {}
+
+    def _trace_message(self, root: TracingNode, final: bool) -> dict:
+        closed = self.sent.setdefault(root.uid, set())
+        nodes = []
+        with root._lock:
+            stack = [(root, None)]
+            while stack:
+                node, parent_uid = stack.pop()
+                if not isinstance(node, TracingNode):
+                    # A finished subtree spilled to disk
+                    if node.uid not in closed:
+                        data = node._to_dict()
+                        data["parent_uid"] = parent_uid
+                        data["subtree"] = True
+                        nodes.append(data)
+                        closed.add(node.uid)
+                    continue
+                if node.uid not in closed:
+                    data = node._to_shallow_dict()
+                    data["parent_uid"] = parent_uid
+                    if parent_uid is None:
+                        data["version"] = TRACING_FORMAT_VERSION
+                    nodes.append(data)
+                    if node.state != TracingNodeState.OPEN:
+                        closed.add(node.uid)
+                # Children of closed nodes are visited too, an open node may be under a closed one
+                if node.children:
+                    stack.extend((child, node.uid) for child in reversed(node.children))
+        if final:
+            del self.sent[root.uid]
+        return {"trace": root.uid, "final": final, "nodes": nodes}
+
+    def _send(self, items: list[PendingItem]) -> list[PendingItem]:
+        try:
+            if self.socket is None:
+                self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.socket.settimeout(self.timeout)
+                self.socket.connect(self.socket_path)
+            messages = [self._trace_message(node, final) for node, final in items]
+            self.socket.sendall(encode_messages(messages))
+        except OSError as e:
+            self.errors += 1
+            self.last_error = e
+            self._close()
+            return items
+        return []
+
+    def _close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+        self.sent = {}
@@ -0,0 +1,103 @@
+import shutil
+from typing import IO, Optional
+
+from ..jsonbackend import dumps_bytes
+from ..serialization import reference_entries
+from ..tracing import TRACING_FORMAT_VERSION, TracingNode, TracingNodeState
+
+
+def _stream_header(root: TracingNode) -> dict:
+    """
+    Same as `trace_header`, but computed from the tree without converting it into a dictionary.
+    """
+    nodes = 0
+    errors = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, TracingNode):
+            # Subtree spilled to disk
+            nodes += node.n_nodes
+            errors += node.n_errors
+            continue
+        with node._lock:
+            nodes += 1
+            if node.state == TracingNodeState.ERROR:
+                errors += 1
+            if node.children:
+                stack.extend(node.children)
+    with root._lock:
+        header = {
+            "uid": root.uid,
+            "name": root.name,
+            "state": root.state.value,
+            "start_time": root.start_time.isoformat() if root.start_time else None,
+            "end_time": root.end_time.isoformat() if root.end_time else None,
+            "nodes": nodes,
+            "errors": errors,
+        }
+        total_counters = root._total_counters()
+    if total_counters:
+        header["total_counters"] = total_counters
+    return header
+
+
+def _encode_node(
+    node: TracingNode, is_root: bool, tracebacks: dict
+) -> tuple[memoryview, Optional[list]]:
+    with node._lock:
+        data = node._to_shallow_dict()
+        children = list(node.children) if node.children else None
+    if "entries" in data:
+        data["entries"] = reference_entries(data["entries"], tracebacks)
+    if is_root:
+        data["version"] = TRACING_FORMAT_VERSION
+    return memoryview(dumps_bytes(data)), children
+
+
+def write_trace(root: TracingNode, file: IO[bytes]):
+    """
+    Writes the same JSON document as `serialize_trace` into a binary file, node by node.
+
+    The lock of the trace is held only while a single node is read, so the traced code
+    is not blocked for the whole write; only one node and the path to it are held in memory.
+    As the tree is not locked as a whole, nodes changed during the write may be written
+    in different states (e.g. a node in the header may be still open in the body).
+    """
+    file.write(b'{"header": ')
+    file.write(dumps_bytes(_stream_header(root)))
+    file.write(b", ")
+    # Repeated tracebacks are written once, see `reference_entries`
+    tracebacks = {}
+    encoded, children = _encode_node(root, True, tracebacks)
+    # The opening brace of the root is already written
+    encoded = encoded[1:]
+    # Iterators over children of nodes on the path and flags whether a child was written
+    stack = []
+    while True:
+        if children:
+            file.write(encoded[:-1])
+            file.write(b', "children": [')
+            stack.append([iter(children), True])
+        else:
+            file.write(encoded)
+        while True:
+            if not stack:
+                return
+            frame = stack[-1]
+            child = next(frame[0], None)
+            if child is None:
+                stack.pop()
+                file.write(b"]}")
+                continue
+            if frame[1]:
+                frame[1] = False
+            else:
+                file.write(b", ")
+            if not isinstance(child, TracingNode):
+                # Subtree spilled to disk is copied from its file
+                with open(child.filename, "rb") as f:
+                    shutil.copyfileobj(f, file)
+                continue
+            encoded, children = _encode_node(child, False, tracebacks)
+            break
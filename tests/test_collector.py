@@ -0,0 +1,88 @@
+import tempfile
+import time
+from datetime import timedelta
+
+import pytest
+
+from nicetrace import DirReader, DirWriter, SocketWriter, trace
+from nicetrace.collector import Collector
+
+
+@pytest.fixture
+def socket_path():
+    # Paths of Unix sockets are limited to ~100 characters, pytest's tmp_path may be longer
+    with tempfile.TemporaryDirectory() as path:
+        yield f"{path}/collector.sock"
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_collector(tmp_path, socket_path):
+    with Collector(DirWriter(str(tmp_path)), socket_path) as collector:
+        with SocketWriter(
+            socket_path, min_write_delay=timedelta(milliseconds=10)
+        ) as writer:
+            roots = []
+            for i in range(5):
+                with trace(f"Trace {i}", inputs={"i": i}) as root:
+                    for j in range(3):
+                        with trace(f"Child {j}") as child:
+                            child.add_output("", j)
+                roots.append(root)
+            with trace("Open") as open_root:
+                with trace("Finished child"):
+                    pass
+                writer.sync()
+                _wait_for(lambda: len(DirReader(str(tmp_path)).list_summaries()) == 6)
+                summary = next(
+                    s
+                    for s in DirReader(str(tmp_path)).list_summaries()
+                    if s["name"] == "Open"
+                )
+                assert summary["state"] == "open"
+        assert writer.errors == 0
+        # Traces of the closed connection are written and forgotten
+        _wait_for(lambda: not collector.traces)
+    assert collector.errors == 0
+
+    reader = DirReader(str(tmp_path))
+    for root in roots + [open_root]:
+        assert reader.read_trace(f"trace-{root.uid}") == root.to_dict()
+
+
+def test_socket_writer_sends_changes(socket_path):
+    writer = SocketWriter(socket_path)
+    with trace("Root") as root:
+        with trace("Child 1"):
+            pass
+        message = writer._trace_message(root, False)
+        assert [n["name"] for n in message["nodes"]] == ["Root", "Child 1"]
+        with trace("Child 2") as child:
+            message = writer._trace_message(root, False)
+            # Closed "Child 1" is not sent again
+            assert [n["name"] for n in message["nodes"]] == ["Root", "Child 2"]
+            assert message["nodes"][1]["parent_uid"] == root.uid
+            child.add_output("", 1)
+    message = writer._trace_message(root, True)
+    assert [n["name"] for n in message["nodes"]] == ["Root", "Child 2"]
+    assert writer.sent == {}
+
+
+def test_socket_writer_without_collector(socket_path):
+    writer = SocketWriter(socket_path)
+    with trace("Root", writer=writer):
+        pass
+    writer.sync()
+    assert writer.errors == 1
+    assert len(writer.pending) == 1
+
+
+def test_collector_already_running(tmp_path, socket_path):
+    with Collector(DirWriter(str(tmp_path)), socket_path):
+        with pytest.raises(Exception, match="already running"):
+            Collector(DirWriter(str(tmp_path)), socket_path).start()
@@ -0,0 +1,154 @@
+import json
+import threading
+from datetime import timedelta
+
+from nicetrace import DirWriter, TraceWriter, TracingNodeState, trace
+from nicetrace.writer.buffered import BufferedWriter
+from nicetrace.writer.composite import CompositeWriter, Sink
+
+
+class RecordingWriter(TraceWriter):
+    def __init__(self, block: threading.Event = None):
+        self.writes = []
+        self.block = block
+
+    def write_serialized(self, node, json_data):
+        if self.block is not None:
+            self.block.wait()
+        self.writes.append((node.uid, json_data))
+
+    def write_node(self, node, final):
+        raise NotImplementedError()
+
+    def sync(self):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+def test_composite_writer(tmp_path):
+    errors_only = RecordingWriter()
+    with CompositeWriter(
+        [
+            DirWriter(str(tmp_path)),
+            Sink(
+                errors_only,
+                filter=lambda node: node.state == TracingNodeState.ERROR,
+            ),
+        ]
+    ) as writer:
+        with trace("ok") as ok:
+            with trace("child"):
+                pass
+        try:
+            with trace("failing") as failing:
+                raise Exception("Failed")
+        except Exception:
+            pass
+        writer.sync()
+
+    with open(tmp_path / f"trace-{ok.uid}.json") as f:
+        assert json.load(f)["children"][0]["name"] == "child"
+    assert (tmp_path / f"trace-{failing.uid}.json").exists()
+
+    assert [uid for uid, _ in errors_only.writes] == [failing.uid]
+    assert json.loads(errors_only.writes[0][1])["state"] == "error"
+    # Finished traces are not kept in memory
+    assert writer._snapshots == {}
+    assert writer._versions == {}
+
+
+def test_composite_shared_snapshots():
+    w1 = RecordingWriter()
+    w2 = RecordingWriter()
+    with CompositeWriter([w1, w2]):
+        with trace("root"):
+            pass
+    assert w1.writes[-1] == w2.writes[-1]
+    # Both sinks got the same serialized string
+    assert w1.writes[-1][1] is w2.writes[-1][1]
+
+
+def test_composite_sampling():
+    sampled = RecordingWriter()
+    with CompositeWriter([Sink(sampled, sample_rate=0.5)]):
+        roots = []
+        for i in range(200):
+            with trace("root") as root:
+                with trace("child"):
+                    pass
+            roots.append(root.uid)
+    written = {uid for uid, _ in sampled.writes}
+    assert 50 < len(written) < 150
+    # Sampling is decided per trace, so each sampled trace is written in its final state
+    for uid, data in sampled.writes:
+        assert json.loads(data)["uid"] == uid
+
+
+def test_composite_slow_sink():
+    block = threading.Event()
+    slow = RecordingWriter(block)
+    fast = RecordingWriter()
+    writer = CompositeWriter(
+        [Sink(slow), Sink(fast, min_write_delay=timedelta(seconds=0))]
+    )
+    with writer:
+        for i in range(3):
+            with trace(f"root{i}"):
+                pass
+        # The traced code and the other sink are not blocked by the slow sink
+        writer.sinks[1]._sync()
+        assert {json.loads(data)["name"] for _, data in fast.writes} == {
+            "root0",
+            "root1",
+            "root2",
+        }
+        assert slow.writes == []
+        block.set()
+    assert {json.loads(data)["name"] for _, data in slow.writes} == {
+        "root0",
+        "root1",
+        "root2",
+    }
+
+
+def test_composite_filter_error():
+    def broken_filter(node):
+        raise ValueError("Broken filter")
+
+    failing = Sink(RecordingWriter(), filter=broken_filter)
+    other = RecordingWriter()
+    with CompositeWriter([failing, other]):
+        with trace("root") as root:
+            pass
+    assert root.state == TracingNodeState.FINISHED
+    assert failing.writer.writes == []
+    assert failing.errors > 0
+    assert str(failing.last_error) == "Broken filter"
+    assert other.writes[-1][0] == root.uid
+
+
+class SendingWriter(BufferedWriter):
+    def __init__(self):
+        super().__init__(timedelta(seconds=0), max_pending=100)
+        self.sent = []
+
+    def _send(self, items):
+        self.sent.extend((node.name, final) for node, final in items)
+        return []
+
+
+def test_composite_buffered_sink(tmp_path):
+    sending = SendingWriter()
+    sink = Sink(sending)
+    with CompositeWriter([DirWriter(tmp_path), sink]):
+        with trace("root") as root:
+            pass
+    assert sink.errors == 0
+    assert sending.state == "stopped"
+    assert sending.sent[-1] == ("root", True)
+    assert (tmp_path / f"trace-{root.uid}.json").exists()
@@ -0,0 +1,131 @@
+import pytest
+
+from nicetrace import DirReader, DirWriter, current_node_ref, trace
+from nicetrace.diff import _read_traces, diff_stored_traces, diff_traces, format_diff
+
+
+def make_node(name, start, end, children=(), kind=None, counters=None):
+    node = {
+        "name": name,
+        "uid": name,
+        "start_time": f"2024-01-01T00:00:{start:02}",
+        "end_time": f"2024-01-01T00:00:{end:02}",
+    }
+    if kind:
+        node["kind"] = kind
+    if counters:
+        node["meta"] = {"counters": counters}
+    if children:
+        node["children"] = list(children)
+    return node
+
+
+def test_diff_traces():
+    a = make_node(
+        "root",
+        0,
+        10,
+        [
+            make_node("llm", 0, 4, kind="call", counters={"tokens": 10}),
+            make_node("llm", 4, 6, kind="call", counters={"tokens": 5}),
+            make_node("old", 6, 10),
+        ],
+    )
+    b = make_node(
+        "root",
+        0,
+        20,
+        [
+            make_node("llm", 0, 15, kind="call", counters={"tokens": 30}),
+            make_node("new", 15, 20),
+        ],
+    )
+    diffs = {tuple(d.path): d for d in diff_traces(a, b)}
+    assert len(diffs) == 4
+
+    root = diffs[("root",)]
+    assert root.status == "changed"
+    assert root.duration_delta == 10
+    assert root.counters_delta == {"tokens": 15}
+
+    llm = diffs[("root", "call:llm")]
+    assert (llm.count_a, llm.count_b) == (2, 1)
+    assert (llm.duration_a, llm.duration_b) == (6, 15)
+    assert llm.counters_a == {"tokens": 15}
+
+    assert diffs[("root", "old")].status == "missing"
+    assert diffs[("root", "new")].status == "new"
+    assert diffs[("root", "new")].duration_delta == 5
+
+    text = format_diff(diff_traces(a, b))
+    assert "root > new [new]" in text
+    assert "tokens: +15" in text
+
+
+def test_diff_groups():
+    a = [make_node("root", 0, 2), make_node("root", 0, 4)]
+    b = [make_node("root", 0, 5)]
+    (diff,) = diff_traces(a, b)
+    assert diff.duration_a == 3
+    assert diff.duration_b == 5
+
+
+def test_diff_stored_traces(tmp_path):
+    with DirWriter(str(tmp_path)):
+        for i in range(3):
+            with trace("root"):
+                with trace(f"child{i % 2}"):
+                    pass
+    reader = DirReader(str(tmp_path))
+    storage_ids = sorted(s["storage_id"] for s in reader.list_summaries())
+    diffs = diff_stored_traces(reader, storage_ids[:1], storage_ids[1:])
+    assert {tuple(d.path) for d in diffs} == {
+        ("root",),
+        ("root", "child0"),
+        ("root", "child1"),
+    }
+
+
+def test_diff_read_trace_file(tmp_path):
+    def fail():
+        raise ValueError("Failed")
+
+    with DirWriter(str(tmp_path), layout="time"):
+        with trace("root") as root:
+            ref = current_node_ref()
+            for _ in range(2):
+                try:
+                    with trace("attempt"):
+                        fail()
+                except ValueError:
+                    pass
+        with trace("worker", parent=ref):
+            pass
+    [summary] = DirReader(str(tmp_path)).list_summaries(since=root.start_time)
+    filename = tmp_path.joinpath(*summary["storage_id"].split("~")).with_suffix(".json")
+    # A single file is read like the whole directory: fragments and tracebacks are resolved
+    assert _read_traces(str(filename)) == _read_traces(str(tmp_path))
+    [data] = _read_traces(str(filename))
+    assert [c["name"] for c in data["children"]] == ["attempt", "attempt", "worker"]
+    traceback = data["children"][1]["entries"][0]["value"]["traceback"]
+    assert traceback["frames"][-1]["line"] == 'raise ValueError("Failed")'
+
+
+def test_diff_endpoint(tmp_path):
+    pytest.importorskip("flask")
+    from nicetrace.server.app import create_app
+
+    with DirWriter(str(tmp_path)):
+        for i in range(2):
+            with trace("root"):
+                pass
+    reader = DirReader(str(tmp_path))
+    a, b = sorted(s["storage_id"] for s in reader.list_summaries())
+    client = create_app(reader, "http://localhost/").test_client()
+
+    response = client.get(f"/api/diff?a={a}&b={b}")
+    assert response.status_code == 200
+    assert [d["path"] for d in response.get_json()] == [["root"]]
+
+    for query in ("", f"?a={a}", f"?a={a}&b=", f"?a={a}&b=../x", f"?a={a}&b=trace-x"):
+        assert client.get(f"/api/diff{query}").status_code == 400
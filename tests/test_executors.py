@@ -0,0 +1,87 @@
+import asyncio
+import threading
+
+import pytest
+
+from nicetrace import (
+    DirWriter,
+    TracingNodeState,
+    current_tracing_node,
+    current_writer,
+    trace,
+)
+from nicetrace.executors import (
+    TracedThreadPoolExecutor,
+    run_in_executor,
+    set_traced_default_executor,
+)
+
+
+def test_thread_pool_context():
+    def task():
+        return current_tracing_node().name
+
+    with trace("root"):
+        with TracedThreadPoolExecutor(4) as pool:
+            assert pool.submit(task).result() == "root"
+            assert list(pool.map(lambda _: task(), range(3))) == ["root"] * 3
+
+
+def test_thread_pool_writer(tmp_path):
+    with DirWriter(tmp_path) as writer:
+        with trace("root"):
+            with TracedThreadPoolExecutor(2) as pool:
+                assert pool.submit(current_writer).result() is writer
+
+
+def test_thread_pool_trace_many_tasks():
+    n_tasks = 10_000
+    thread_ids = set()
+
+    def task(i):
+        thread_ids.add(threading.get_ident())
+        current_tracing_node().add_output("", i)
+        return i
+
+    with trace("root") as root:
+        with TracedThreadPoolExecutor(8, trace_tasks=True) as pool:
+            results = list(pool.map(task, range(n_tasks)))
+    assert results == list(range(n_tasks))
+    assert len(root.children) == n_tasks
+    assert len({c.uid for c in root.children}) == n_tasks
+    assert sorted(c.entries[0]["value"] for c in root.children) == results
+    assert all(c.name == "task" and c.kind == "task" for c in root.children)
+    assert len(thread_ids) > 1
+
+
+def test_thread_pool_task_after_parent_closed():
+    def task():
+        with trace("inner"):
+            return current_tracing_node()
+
+    for trace_tasks in (True, False):
+        started = threading.Event()
+        with TracedThreadPoolExecutor(1, trace_tasks=trace_tasks) as pool:
+            pool.submit(started.wait)
+            with trace("short") as short:
+                # The node does not wait for the task
+                future = pool.submit(task)
+            started.set()
+            node = future.result()
+        assert short.children is None
+        assert node.name == "inner"
+        assert node.state == TracingNodeState.FINISHED
+
+
+@pytest.mark.asyncio
+async def test_run_in_executor():
+    with trace("root") as root:
+        name = await run_in_executor(lambda: current_tracing_node().name)
+        assert name == "root"
+        await run_in_executor(lambda: None, trace_task=True, name="job")
+
+        set_traced_default_executor(2)
+        loop = asyncio.get_running_loop()
+        name = await loop.run_in_executor(None, lambda: current_tracing_node().name)
+        assert name == "root"
+    assert [c.name for c in root.children] == ["job"]
@@ -0,0 +1,99 @@
+import io
+import json
+
+from nicetrace import trace
+from nicetrace.export import (
+    critical_path,
+    iter_chrome_events,
+    to_speedscope,
+    write_chrome_trace,
+)
+
+
+def make_node(name, start, end, children=()):
+    node = {
+        "name": name,
+        "uid": name,
+        "start_time": f"2024-01-01T00:00:{start:02}",
+        "end_time": f"2024-01-01T00:00:{end:02}",
+    }
+    if children:
+        node["children"] = list(children)
+    return node
+
+
+# root runs "a" and "b" concurrently and then "c"; "b" determines the latency
+TRACE = make_node(
+    "root",
+    0,
+    10,
+    [
+        make_node("a", 0, 3),
+        make_node("b", 1, 6, [make_node("b1", 1, 2), make_node("b2", 2, 5)]),
+        make_node("c", 6, 9),
+    ],
+)
+
+
+def test_critical_path():
+    assert critical_path(TRACE) == ["root", "b", "b1", "b2", "c"]
+
+
+def test_chrome_events():
+    events = list(iter_chrome_events(TRACE))
+    lanes = {e["name"]: e["tid"] for e in events if e["ph"] == "X"}
+    assert lanes["root"] == lanes["a"] == lanes["c"] == 0
+    assert lanes["b"] == lanes["b1"] == lanes["b2"] == 1
+    threads = [e for e in events if e["ph"] == "M"]
+    assert [t["args"]["name"] for t in threads] == ["main", "root #2"]
+
+    b = [e for e in events if e["name"] == "b"][0]
+    assert b["ts"] == 1_000_000
+    assert b["dur"] == 5_000_000
+    assert b["cat"] == "critical"
+    assert [e for e in events if e["name"] == "a"][0]["cat"] == "node"
+
+    out = io.StringIO()
+    write_chrome_trace(TRACE, out)
+    data = json.loads(out.getvalue())
+    assert data["traceEvents"] == events
+
+
+def test_speedscope():
+    data = to_speedscope(TRACE)
+    frames = [f["name"] for f in data["shared"]["frames"]]
+    main, lane = data["profiles"]
+
+    def show(profile):
+        return [
+            (e["type"], frames[e["frame"]], e["at"] / 1_000_000)
+            for e in profile["events"]
+        ]
+
+    assert show(main) == [
+        ("O", "root", 0),
+        ("O", "a", 0),
+        ("C", "a", 3),
+        ("O", "c", 6),
+        ("C", "c", 9),
+        ("C", "root", 10),
+    ]
+    assert show(lane) == [
+        ("O", "b", 1),
+        ("O", "b1", 1),
+        ("C", "b1", 2),
+        ("O", "b2", 2),
+        ("C", "b2", 5),
+        ("C", "b", 6),
+    ]
+    assert data["shared"]["frames"][frames.index("b")]["file"] == "critical"
+
+
+def test_export_tracing_node():
+    with trace("root") as root:
+        with trace("child"):
+            pass
+        root.add_instant("event")
+    events = list(iter_chrome_events(root))
+    assert [e["ph"] for e in events] == ["M", "X", "X", "i"]
+    assert critical_path(root)[0] == root.uid
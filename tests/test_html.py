@@ -1,5 +1,6 @@
 from nicetrace import trace, write_html
 import requests
+import pytest
 
 
 def extract(s, start, end):
@@ -30,3 +31,133 @@ def test_cdn_html(tmp_path):
     assert r.status_code == 200
     r = requests.get(url_css)
     assert r.status_code == 200
+
+
+def test_compressed_offline_html(tmp_path):
+    import base64
+    import gzip
+    import json
+
+    with trace("Root") as root:
+        with trace("Child1", inputs={"x": "</script>"}):
+            pass
+
+    target = tmp_path / "out.html"
+    write_html(root, target, offline=True)
+
+    with open(target, "r") as f:
+        data = f.read()
+
+    assert "cdn.jsdelivr.net" not in data
+    assert "window.mountTraceView" in data
+    assert data.count("</script>") == 4
+
+    def decode(id):
+        payload = extract(
+            data, f'<script type="application/octet-stream" id="{id}">', "<"
+        )
+        return json.loads(gzip.decompress(base64.b64decode(payload)))
+
+    tree = decode("nt-tree")
+    entries = decode("nt-entries")
+    child = tree["children"][0]
+    assert child["entries"] == []
+    assert entries == {
+        child["uid"]: [{"kind": "input", "name": "x", "value": "</script>"}]
+    }
+    child["entries"] = entries[child["uid"]]
+    assert tree == root.to_dict()
+
+
+def test_compressed_html_root_entries():
+    from nicetrace.html.statichtml import _split_entries
+
+    with trace("Root", inputs={"a": 1}) as root:
+        with trace("Child1", inputs={"x": 2}):
+            pass
+        with trace("Child2"):
+            pass
+    data = root.to_dict()
+    entries = _split_entries(data)
+    assert data["entries"] == [{"kind": "input", "name": "a", "value": 1}]
+    child1, child2 = data["children"]
+    assert entries == {child1["uid"]: [{"kind": "input", "name": "x", "value": 2}]}
+    assert child1["entries"] == []
+    assert "entries" not in child2
+
+
+def test_bounded_inline_dict():
+    from nicetrace.html.statichtml import get_bounded_dict
+
+    with trace("Root") as root:
+        for i in range(3):
+            with trace(f"A{i}", inputs={"x": "a" * 100}):
+                with trace("B"):
+                    with trace("C"):
+                        pass
+
+    data = get_bounded_dict(root, max_depth=1)
+    assert [c["name"] for c in data["children"]] == ["A0", "A1", "A2"]
+    child = data["children"][0]
+    assert child["entries"] == [{"kind": "input", "name": "x", "value": "a" * 100}]
+    assert child["children"][0]["name"] == "2 more nodes not embedded"
+    assert child["children"][0]["kind"] == "truncated"
+
+    data = get_bounded_dict(root, max_bytes=250, link="http://localhost:4090/traces/x")
+    children = data["children"]
+    assert "children" in children[0]
+    assert children[2]["entries"][0]["value"].startswith("Entries not embedded")
+    truncated = children[2]["children"][0]
+    assert truncated["name"] == "2 more nodes not embedded"
+    assert "http://localhost:4090/traces/x" in truncated["entries"][0]["value"]["html"]
+
+    assert get_bounded_dict(root, max_depth=10) == root.to_dict()
+
+
+def test_bounded_inline_dict_tracebacks():
+    from nicetrace import configure_exceptions
+    from nicetrace.html.statichtml import get_bounded_dict
+
+    configure_exceptions(source_lines=False)
+    try:
+        with pytest.raises(ValueError):
+            with trace("Root") as root:
+                raise ValueError("Failed")
+    finally:
+        configure_exceptions()
+    frames = get_bounded_dict(root)["entries"][0]["value"]["traceback"]["frames"]
+    assert frames[-1]["line"] == 'raise ValueError("Failed")'
+
+
+def test_inline_html_jupyter_server(tmp_path):
+    import gc
+
+    from nicetrace.html.statichtml import (
+        _count_nodes,
+        get_inline_html,
+        set_jupyter_server,
+    )
+    from nicetrace.reader.memoryreader import MemoryReader
+
+    reader = MemoryReader(weak=True)
+    set_jupyter_server(reader, "http://localhost:4090/")
+    try:
+        with trace("Root") as root:
+            root.enable_spilling(tmp_path / "spill", max_nodes=5)
+            for i in range(10):
+                with trace(f"A{i}"):
+                    with trace("B"):
+                        pass
+        assert _count_nodes(root) == 21
+
+        html = get_inline_html(root, max_depth=1)
+        assert "Load the full trace" in html
+        assert f"http://localhost:4090/api/traces/trace-{root.uid}" in html
+        assert "Load the full trace" not in get_inline_html(root, max_depth=5)
+
+        assert [s["uid"] for s in reader.list_summaries()] == [root.uid]
+        del root
+        gc.collect()
+        assert reader.list_summaries() == []
+    finally:
+        set_jupyter_server(None, None)
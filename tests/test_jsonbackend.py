@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from nicetrace import DirReader, DirWriter, trace
+from nicetrace import jsonbackend
+from nicetrace.reader.filereader import read_header
+
+
+def _available_backends():
+    result = []
+    for name in jsonbackend.BACKENDS:
+        try:
+            jsonbackend.set_json_backend(name)
+            result.append(name)
+        except ImportError:
+            pass
+    jsonbackend.set_json_backend()
+    return result
+
+
+@pytest.fixture(params=_available_backends())
+def backend(request):
+    jsonbackend.set_json_backend(request.param)
+    yield request.param
+    jsonbackend.set_json_backend()
+
+
+def test_backend_format(backend):
+    data = {
+        "a": [1, 2.5, None, True],
+        "ž": "ěščř",
+        3: {"x": "</script>"},
+        "big": 1 << 70,
+    }
+    encoded = jsonbackend.dumps_bytes(data)
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == json.loads(json.dumps(data))
+    assert jsonbackend.loads(encoded) == jsonbackend.loads(json.dumps(data))
+    assert jsonbackend.dumps(data) == encoded.decode()
+    with pytest.raises(ValueError):
+        jsonbackend.loads(b"{broken")
+
+
+def test_backend_traces(tmp_path, backend):
+    with DirWriter(str(tmp_path)):
+        # Non-ASCII characters around the boundary of the initial header prefix
+        with trace("Kořen " + "ž" * 3000, inputs={"data": "ř" * 10_000}) as root:
+            with trace("Child"):
+                pass
+    filename = tmp_path / f"trace-{root.uid}.json"
+    assert read_header(filename)["name"] == root.name
+    assert json.loads(filename.read_bytes())["name"] == root.name
+    reader = DirReader(str(tmp_path))
+    (summary,) = reader.list_summaries()
+    assert summary["nodes"] == 2
+    assert reader.read_trace(summary["storage_id"]) == root.to_dict()
+
+
+def test_invalid_backend():
+    with pytest.raises(Exception, match="Invalid JSON backend"):
+        jsonbackend.set_json_backend("yaml")
@@ -0,0 +1,143 @@
+import threading
+import uuid
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, LLMResult  # noqa: E402
+
+from nicetrace import TracingNodeState, trace  # noqa: E402
+from nicetrace.ext.langchain import AsyncTracer, Tracer  # noqa: E402
+
+MODEL = {"id": ["langchain", "chat_models", "Fake"], "kwargs": {"model_name": "fake"}}
+
+
+def value(node, kind, name=None):
+    [entry] = [
+        e
+        for e in node.to_dict()["entries"]
+        if e["kind"] == kind and e.get("name") == name
+    ]
+    return entry["value"]
+
+
+def chat_result(text, input_tokens=3, output_tokens=5):
+    message = AIMessage(
+        content=text,
+        usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        },
+    )
+    return LLMResult(generations=[[ChatGeneration(message=message)]])
+
+
+def chat(tracer, parent_run_id=None, text="Hello", serialized=MODEL):
+    run_id = uuid.uuid4()
+    tracer.on_chat_model_start(
+        serialized,
+        [[HumanMessage(content="Hi")]],
+        run_id=run_id,
+        parent_run_id=parent_run_id,
+    )
+    tracer.on_llm_end(chat_result(text), run_id=run_id)
+
+
+def test_langchain_nested_runs():
+    tracer = Tracer()
+    with trace("root") as root:
+        chain_id = uuid.uuid4()
+        tracer.on_chain_start({"name": "MyChain"}, {"q": "x"}, run_id=chain_id)
+        chat(tracer, chain_id)
+        tool_id = uuid.uuid4()
+        tracer.on_tool_start(
+            {"name": "search"}, "x", run_id=tool_id, parent_run_id=chain_id
+        )
+        tracer.on_tool_end("found", run_id=tool_id)
+        tracer.on_chain_end({"answer": "Hello"}, run_id=chain_id)
+
+    [chain] = root.children
+    assert chain.name == "MyChain"
+    assert chain.kind == "chain"
+    assert [c.name for c in chain.children] == ["Query fake", "search"]
+    query, tool = chain.children
+    assert value(query, "input", "messages") == [{"role": "human", "content": "Hi"}]
+    assert value(query, "output") == "Hello"
+    assert query.to_dict()["meta"]["counters"] == {
+        "input_tokens": 3,
+        "output_tokens": 5,
+    }
+    assert value(tool, "output") == "found"
+    assert all(n.state == TracingNodeState.FINISHED for n in (chain, query, tool))
+    assert tracer.runs == {}
+
+
+def test_langchain_error():
+    tracer = Tracer()
+    with trace("root") as root:
+        run_id = uuid.uuid4()
+        tracer.on_chain_start({"name": "Failing"}, {}, run_id=run_id)
+        tracer.on_chain_error(ValueError("Broken"), run_id=run_id)
+    [node] = root.children
+    assert node.state == TracingNodeState.ERROR
+    assert value(node, "error")["message"] == "Broken"
+
+
+def test_langchain_config_dedup():
+    tracer = Tracer()
+    with trace("root") as root:
+        chat(tracer)
+        chat(tracer)
+        chat(tracer, serialized={**MODEL, "kwargs": {"model_name": "other"}})
+    first, second, third = root.children
+    assert value(first, "input", "config") == MODEL
+    assert value(second, "input", "config") == {"same_as": first.uid}
+    assert value(third, "input", "config")["kwargs"]["model_name"] == "other"
+
+    # Configurations are stored again in another trace
+    with trace("root 2") as root2:
+        chat(tracer)
+    assert value(root2.children[0], "input", "config") == MODEL
+
+
+def test_langchain_threads():
+    tracer = Tracer()
+    with trace("root") as root:
+        chain_id = uuid.uuid4()
+        tracer.on_chain_start({"name": "Parallel"}, {}, run_id=chain_id)
+        threads = [
+            threading.Thread(target=chat, args=(tracer, chain_id, f"Answer {i}"))
+            for i in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        tracer.on_chain_end({}, run_id=chain_id)
+
+    [chain] = root.children
+    assert len(chain.children) == 8
+    assert sorted(value(c, "output") for c in chain.children) == [
+        f"Answer {i}" for i in range(8)
+    ]
+    configs = [value(c, "input", "config") for c in chain.children]
+    assert configs.count(MODEL) == 1
+
+
+@pytest.mark.asyncio
+async def test_langchain_async_tracer():
+    tracer = AsyncTracer()
+    with trace("root") as root:
+        run_id = uuid.uuid4()
+        await tracer.on_chat_model_start(
+            MODEL, [[HumanMessage(content="Hi")]], run_id=run_id
+        )
+        for token in ("Hel", "lo"):
+            await tracer.on_llm_new_token(token, run_id=run_id)
+        await tracer.on_llm_end(chat_result("Hello"), run_id=run_id)
+    [query] = root.children
+    assert query.state == TracingNodeState.FINISHED
+    assert value(query, "output") == "Hello"
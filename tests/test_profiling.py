@@ -0,0 +1,100 @@
+import gc
+
+from nicetrace import Metadata, trace, with_trace
+from nicetrace.profiling import (
+    CpuTimeCollector,
+    GcCollector,
+    RssCollector,
+    TracemallocCollector,
+    disable_profiling,
+    enable_profiling,
+    profiling,
+)
+from nicetrace import tracing
+
+
+def burn_cpu():
+    x = 0
+    for i in range(200_000):
+        x += i
+    return x
+
+
+def test_profiling_counters():
+    meta = Metadata(icon="eye")
+
+    @with_trace(meta=meta)
+    def work():
+        burn_cpu()
+        data = [bytearray(1000) for _ in range(1000)]
+        gc.collect()
+        return len(data)
+
+    with profiling(
+        CpuTimeCollector(), RssCollector(), TracemallocCollector(), GcCollector()
+    ):
+        with trace("root") as root:
+            work()
+            work()
+    assert tracing._COLLECTORS == ()
+
+    c1, c2 = root.children
+    for child in (c1, c2):
+        counters = child.meta.counters
+        assert counters["cpu_us"] > 0
+        assert counters["thread_cpu_us"] > 0
+        assert counters["gc_collections"] >= 1
+        assert "rss_bytes" in counters
+        assert "alloc_bytes" in counters
+        assert child.meta.icon == "eye"
+    assert c1.meta is not c2.meta
+    assert meta.counters is None
+
+    # Root stores only values not covered by its children
+    total_cpu = root._profile_total["cpu_us"]
+    assert root.meta.counters["cpu_us"] == total_cpu - sum(
+        c._profile_total["cpu_us"] for c in root.children
+    )
+    assert root.meta.counters["gc_collections"] == 0
+
+
+def test_profiling_disabled():
+    enable_profiling()
+    try:
+        with trace("root") as root:
+            pass
+        assert set(root.meta.counters) == {
+            "cpu_us",
+            "thread_cpu_us",
+            "rss_bytes",
+            "gc_collections",
+            "gc_collected",
+        }
+    finally:
+        disable_profiling()
+    with trace("root") as root:
+        pass
+    assert root.meta is None
+
+
+def test_profiling_concurrent_children():
+    from nicetrace.executors import TracedThreadPoolExecutor
+
+    with profiling(CpuTimeCollector(), GcCollector()):
+        with trace("root") as root:
+            with trace("sequential"):
+                burn_cpu()
+            with TracedThreadPoolExecutor(4, trace_tasks=True) as pool:
+                list(pool.map(lambda _: burn_cpu(), range(8)))
+
+    nodes = root.find_nodes(lambda n: True)
+    assert len(nodes) == 10
+    for node in nodes:
+        assert all(value >= 0 for value in node.meta.counters.values()), node.name
+        assert all(value >= 0 for value in node.total_counters.values()), node.name
+    # The child that ran alone is subtracted, tasks overlapping in the pool are not
+    sequential = root.children[0]
+    for key in ("cpu_us", "thread_cpu_us"):
+        assert root.meta.counters[key] <= (
+            root._profile_total[key] - sequential._profile_total[key]
+        )
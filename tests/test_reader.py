@@ -1,4 +1,21 @@
-from nicetrace import DirReader, DirWriter, trace, FileWriter
+import json
+import os
+import sys
+import time
+from datetime import timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from nicetrace import (
+    DirReader,
+    DirWriter,
+    trace,
+    FileWriter,
+    current_node_ref,
+    Metadata,
+)
+from nicetrace.reader.watcher import PollingWatcher
 
 
 def strip_summary(summary):
@@ -10,6 +27,8 @@ def strip_summary(summary):
         assert isinstance(end_time, str)
     else:
         assert end_time is None
+    assert isinstance(summary.pop("nodes", 0), int)
+    assert isinstance(summary.pop("errors", 0), int)
     return summary
 
 
@@ -80,3 +99,280 @@ def test_reader_running(tmp_path):
     s = [strip_summary(s) for s in reader.list_summaries()]
     assert len(s) == 1
     assert s[0]["state"] == "finished"
+
+
+def _fragment_worker(path, ref, x):
+    with DirWriter(path):
+        with trace(f"Worker {x}", parent=ref, inputs={"x": x}) as node:
+            with trace("Inner"):
+                inner_ref = current_node_ref()
+                assert inner_ref.trace_uid == ref.trace_uid
+            node.add_output("", x * 2)
+    return x * 2
+
+
+def test_reader_stitch_fragments(tmp_path):
+    dir = tmp_path / "traces"
+    dir.mkdir()
+    reader = DirReader(dir)
+
+    with DirWriter(dir):
+        with trace("Root") as root:
+            with trace("Fan-out") as fan_out:
+                ref = current_node_ref()
+                assert ref.trace_uid == root.uid
+                assert ref.node_uid == fan_out.uid
+                with ProcessPoolExecutor(2) as pool:
+                    results = list(
+                        pool.map(_fragment_worker, [dir] * 3, [ref] * 3, [1, 2, 3])
+                    )
+    assert results == [2, 4, 6]
+
+    summaries = reader.list_summaries()
+    assert [s["uid"] for s in summaries] == [root.uid]
+
+    data = reader.read_trace(f"trace-{root.uid}")
+    children = data["children"][0]["children"]
+    assert sorted(c["name"] for c in children) == ["Worker 1", "Worker 2", "Worker 3"]
+    for child in children:
+        assert child["parent"] == {"trace_uid": root.uid, "node_uid": fan_out.uid}
+        assert child["children"][0]["name"] == "Inner"
+
+
+def test_memory_reader():
+    from nicetrace.reader.memoryreader import MemoryReader
+
+    reader = MemoryReader()
+    with trace("Root") as root:
+        storage_id = reader.add_node(root)
+        s = [strip_summary(s) for s in reader.list_summaries()]
+        assert s == [
+            {"storage_id": storage_id, "uid": root.uid, "name": "Root", "state": "open"}
+        ]
+    assert reader.read_trace(storage_id) == root.to_dict()
+
+
+def test_reader_total_counters(tmp_path):
+    with DirWriter(str(tmp_path)):
+        with trace("Root") as root:
+            with trace("llm", meta=Metadata(counters={"tokens": 3})):
+                pass
+            with trace("llm", meta=Metadata(counters={"tokens": 4})):
+                pass
+    reader = DirReader(str(tmp_path))
+    (summary,) = reader.list_summaries()
+    assert summary["uid"] == root.uid
+    assert summary["total_counters"] == {"tokens": 7}
+
+
+def test_reader_header(tmp_path):
+    with DirWriter(str(tmp_path)):
+        with trace("Root", inputs={"data": "x" * 100_000}) as root:
+            with trace("Child"):
+                pass
+            try:
+                with trace("Failing"):
+                    raise Exception("Failed")
+            except Exception:
+                pass
+
+    filename = tmp_path / f"trace-{root.uid}.json"
+    with open(filename) as f:
+        assert f.read(11) == '{"header": '
+    (summary,) = DirReader(str(tmp_path)).list_summaries()
+    assert summary["nodes"] == 3
+    assert summary["errors"] == 1
+    assert DirReader(str(tmp_path)).read_trace(f"trace-{root.uid}") == root.to_dict()
+
+    # Only the header is parsed
+    with open(filename, "r+") as f:
+        content = f.read()
+        f.seek(0)
+        f.write(content[: content.index('"children"')] + "broken" * 1000)
+        f.truncate()
+    (summary,) = DirReader(str(tmp_path)).list_summaries()
+    assert summary["uid"] == root.uid
+    assert summary["name"] == "Root"
+    assert summary["state"] == "finished"
+
+
+def test_reader_without_header(tmp_path):
+    with trace("Root") as root:
+        pass
+    with open(tmp_path / "old.json", "w") as f:
+        f.write(json.dumps(root.to_dict()))
+    (summary,) = DirReader(str(tmp_path)).list_summaries()
+    assert strip_summary(summary) == {
+        "storage_id": "old",
+        "uid": root.uid,
+        "name": "Root",
+        "state": "finished",
+    }
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("polling", [False, True])
+def test_reader_watch(tmp_path, monkeypatch, polling):
+    if polling:
+        monkeypatch.setattr(sys, "platform", "other")
+    reader = DirReader(str(tmp_path), watch=True, poll_interval=0.05)
+    try:
+        assert isinstance(reader.watcher, PollingWatcher) == polling
+        events = reader.subscribe()
+        assert reader.list_summaries() == []
+
+        with DirWriter(str(tmp_path)) as writer:
+            with trace("Root") as root:
+                writer.sync()
+                _wait_for(lambda: len(reader.list_summaries()) == 1)
+                assert reader.list_summaries()[0]["state"] == "open"
+        storage_id = f"trace-{root.uid}"
+        _wait_for(lambda: reader.list_summaries()[0]["state"] == "finished")
+
+        os.unlink(tmp_path / f"{storage_id}.json")
+        _wait_for(lambda: reader.list_summaries() == [])
+
+        received = []
+        while not events.empty():
+            received.append(events.get())
+        assert received[0]["type"] == "updated"
+        assert received[0]["summary"]["storage_id"] == storage_id
+        assert received[-1] == {"type": "deleted", "storage_id": storage_id}
+        reader.unsubscribe(events)
+    finally:
+        reader.close()
+
+
+def test_server_event_streams(tmp_path, monkeypatch):
+    pytest.importorskip("flask")
+    from nicetrace.server import app as server_app
+
+    monkeypatch.setattr(server_app, "MAX_EVENT_STREAMS", 1)
+    monkeypatch.setattr(server_app, "EVENTS_MAX_DURATION", 0.2)
+    monkeypatch.setattr(server_app, "EVENTS_KEEPALIVE", 0.05)
+    reader = DirReader(str(tmp_path), watch=True, poll_interval=0.05)
+    try:
+        client = server_app.create_app(reader, "http://localhost/").test_client()
+        first = client.get("/api/events", buffered=False)
+        assert first.status_code == 200
+        second = client.get("/api/events")
+        assert second.status_code == 503
+        assert second.headers["Retry-After"]
+
+        # The stream ends after its maximal duration and tells the client when to reconnect
+        chunks = [chunk.decode() for chunk in first.response]
+        assert chunks[0] == f"retry: {server_app.EVENTS_RETRY_MS}\n\n"
+        first.close()
+        assert reader.subscribers == []
+        third = client.get("/api/events", buffered=False)
+        assert third.status_code == 200
+        third.close()
+    finally:
+        reader.close()
+
+
+def test_reader_time_layout(tmp_path):
+    with DirWriter(str(tmp_path), layout="time"):
+        with trace("Root") as root:
+            with trace("Child"):
+                pass
+    t = root.start_time
+    partition = (
+        tmp_path / f"{t.year:04}" / f"{t.month:02}" / f"{t.day:02}" / f"{t.hour:02}"
+    )
+    assert (partition / f"trace-{root.uid}.json").is_file()
+
+    # A partition outside of the range is never opened
+    old = tmp_path / "2001" / "01" / "01" / "00"
+    old.mkdir(parents=True)
+    (old / "trace-broken.json").write_text("broken")
+
+    reader = DirReader(str(tmp_path))
+    (summary,) = reader.list_summaries(since=t - timedelta(hours=1))
+    storage_id = summary["storage_id"]
+    assert (
+        storage_id
+        == f"{t.year:04}~{t.month:02}~{t.day:02}~{t.hour:02}~trace-{root.uid}"
+    )
+    assert reader.read_trace(storage_id) == root.to_dict()
+    with pytest.raises(ValueError):
+        reader.list_summaries()
+    assert reader.list_summaries(since=t + timedelta(seconds=1)) == []
+    assert reader.list_summaries(since=t, until=t + timedelta(seconds=1)) == [summary]
+
+
+def test_server_list_time_range(tmp_path):
+    pytest.importorskip("flask")
+    from nicetrace.server.app import create_app
+
+    with DirWriter(str(tmp_path), layout="time"):
+        with trace("Root") as root:
+            pass
+    client = create_app(DirReader(str(tmp_path)), "http://localhost/").test_client()
+    # Stored times are local, times with an offset are converted
+    since = (root.start_time - timedelta(hours=1)).astimezone(timezone.utc)
+    response = client.get(f"/api/list?since={since.isoformat().replace('+00:00', 'Z')}")
+    assert response.status_code == 200
+    assert [s["uid"] for s in response.json] == [root.uid]
+    until = since.astimezone(timezone(timedelta(hours=5)))
+    response = client.get("/api/list", query_string={"until": until.isoformat()})
+    assert response.json == []
+    assert client.get("/api/list?since=yesterday").status_code == 400
+
+
+def test_reader_hash_layout(tmp_path):
+    with DirWriter(str(tmp_path), layout="hash"):
+        for i in range(10):
+            with trace(f"Trace {i}"):
+                pass
+    reader = DirReader(str(tmp_path))
+    summaries = reader.list_summaries()
+    assert sorted(s["name"] for s in summaries) == [f"Trace {i}" for i in range(10)]
+    for summary in summaries:
+        partition, name = summary["storage_id"].split("~")
+        assert len(partition) == 2
+        assert reader.read_trace(summary["storage_id"])["name"] == summary["name"]
+
+    with pytest.raises(Exception, match="layout"):
+        DirWriter(str(tmp_path), layout="time")
+
+
+def test_reader_repeated_tracebacks(tmp_path):
+    from nicetrace import configure_exceptions
+
+    def fail(i):
+        raise Exception(f"Attempt {i}")
+
+    configure_exceptions(source_lines=False)
+    try:
+        with DirWriter(tmp_path):
+            with trace("retries") as root:
+                for i in range(5):
+                    try:
+                        with trace("attempt"):
+                            fail(i)
+                    except Exception:
+                        pass
+    finally:
+        configure_exceptions()
+
+    with open(tmp_path / f"trace-{root.uid}.json") as f:
+        raw = json.load(f)
+    tracebacks = [c["entries"][0]["value"]["traceback"] for c in raw["children"]]
+    assert tracebacks[0]["id"] == 0
+    assert "line" not in tracebacks[0]["frames"][-1]
+    assert tracebacks[1:] == [{"_type": "$traceback", "ref": 0}] * 4
+
+    trace_data = DirReader(tmp_path).read_trace(f"trace-{root.uid}")
+    for i, child in enumerate(trace_data["children"]):
+        value = child["entries"][0]["value"]
+        assert value["message"] == f"Attempt {i}"
+        frames = value["traceback"]["frames"]
+        assert frames[-1]["line"] == 'raise Exception(f"Attempt {i}")'
+        assert "id" not in value["traceback"]
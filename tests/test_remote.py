@@ -0,0 +1,122 @@
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from nicetrace import DirReader, DirWriter, RemoteWriter, trace
+from nicetrace.writer.remotewriter import decode_batch, encode_batch
+
+
+class IngestServer:
+    """
+    Minimal ingest endpoint (without flask) that fails first `failures` requests.
+    """
+
+    def __init__(self, path, failures=0):
+        writer = DirWriter(str(path))
+        self.requests = 0
+        self.failures = failures
+        self.connections = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                server.requests += 1
+                server.connections.add(self.client_address)
+                if server.requests <= server.failures:
+                    status = 503
+                else:
+                    for data in decode_batch(
+                        body, self.headers.get("Content-Encoding")
+                    ):
+                        writer.write_trace_data(data)
+                    status = 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("localhost", 0), Handler)
+        self.url = f"http://localhost:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_batch_roundtrip():
+    traces = [{"uid": "a", "name": "x" * 1000}]
+    assert decode_batch(encode_batch(traces), "gzip") == traces
+    assert decode_batch(encode_batch(traces, compress=False)) == traces
+    with pytest.raises(Exception, match="too large"):
+        decode_batch(encode_batch(traces), "gzip", max_size=100)
+    with pytest.raises(Exception):
+        decode_batch(b'{"traces": 1}')
+
+
+def test_remote_writer(tmp_path):
+    with IngestServer(tmp_path, failures=1) as server:
+        writer = RemoteWriter(
+            server.url, min_write_delay=timedelta(milliseconds=10), retry_delay=0.01
+        )
+        with writer:
+            for i in range(20):
+                with trace(f"Trace {i}"):
+                    with trace("Child"):
+                        pass
+        assert writer.errors == 0
+        assert writer.dropped == 0
+        # Requests are sent over one persistent connection
+        assert len(server.connections) == 1
+    summaries = DirReader(str(tmp_path)).list_summaries()
+    assert sorted(s["name"] for s in summaries) == sorted(
+        f"Trace {i}" for i in range(20)
+    )
+    assert all(s["state"] == "finished" and s["nodes"] == 2 for s in summaries)
+
+
+def test_remote_writer_unreachable(tmp_path):
+    writer = RemoteWriter(
+        "http://localhost:1", max_pending=3, retries=1, retry_delay=0.01
+    )
+    # Writer is not started, so nothing is sent in the background
+    for i in range(5):
+        with trace(f"Trace {i}", writer=writer):
+            pass
+    assert writer.dropped == 2
+    writer.sync()
+    assert writer.errors == 1
+    # Traces are kept for the next attempt
+    assert len(writer.pending) == 3
+
+
+def test_ingest_endpoint(tmp_path):
+    pytest.importorskip("flask")
+    from nicetrace.server.app import create_app
+
+    reader = DirReader(str(tmp_path))
+    app = create_app(reader, "http://localhost/", DirWriter(str(tmp_path)))
+    client = app.test_client()
+    with trace("Root") as root:
+        pass
+    response = client.post(
+        "/api/ingest",
+        data=encode_batch([root.to_dict()]),
+        headers={"Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert reader.read_trace(f"trace-{root.uid}") == root.to_dict()
+
+    bad = dict(root.to_dict(), uid="../x")
+    response = client.post("/api/ingest", data=encode_batch([bad], compress=False))
+    assert response.status_code == 400
@@ -0,0 +1,102 @@
+import os
+
+from nicetrace import DirWriter, TracingNodeState, trace, trace_instant, with_trace
+from nicetrace.spill import SpilledNode, SpillStore, _inner_stubs
+
+from testutils import strip_tree
+
+
+def build_trace(root, n):
+    for i in range(n):
+        with trace(f"step {i}", inputs={"i": i}):
+            with trace("inner") as inner:
+                inner.add_output("", "x" * 100)
+            trace_instant("event", inputs={"i": i})
+
+
+def test_spill_max_nodes(tmp_path):
+    with trace("root") as root:
+        root.enable_spilling(tmp_path / "spill", max_nodes=20)
+        build_trace(root, 50)
+        assert root._spill.n_nodes <= 21
+        stubs = [c for c in root.children if isinstance(c, SpilledNode)]
+        assert len(stubs) >= 40
+        assert len(os.listdir(tmp_path / "spill")) == len(_inner_stubs(root))
+
+    with trace("root") as reference:
+        build_trace(reference, 50)
+
+    assert strip_tree(root.to_dict()) == strip_tree(reference.to_dict())
+
+    found = root.find_nodes(lambda n: n.name == "inner")
+    assert len(found) == 50
+    assert all(n.state == TracingNodeState.FINISHED for n in found)
+    assert found[3].entries == [{"kind": "output", "value": "x" * 100}]
+
+
+def test_spill_max_bytes_nested(tmp_path):
+    with DirWriter(tmp_path / "traces") as writer:
+        with trace("root") as root:
+            root.enable_spilling(max_nodes=None, max_bytes=2000)
+            spill_path = root._spill.path
+            with trace("open parent") as parent:
+                build_trace(root, 30)
+                # Children of the open node are spilled
+                assert any(isinstance(c, SpilledNode) for c in parent.children)
+                assert root._spill.n_bytes <= 2000
+                writer.sync()
+        data = root.to_dict()
+    children = data["children"][0]["children"]
+    assert [c["name"] for c in children] == [f"step {i}" for i in range(30)]
+    assert children[1]["entries"] == [{"kind": "input", "name": "i", "value": 1}]
+    assert [c["name"] for c in children[1]["children"]] == ["inner", "event"]
+    assert os.path.isdir(spill_path)
+
+
+def test_spill_budget_taken_by_open_nodes(tmp_path, monkeypatch):
+    walks = []
+    recount = SpillStore._recount
+
+    def counting_recount(self, root):
+        walks.append(1)
+        recount(self, root)
+
+    monkeypatch.setattr(SpillStore, "_recount", counting_recount)
+
+    def nested(depth):
+        if depth == 0:
+            build_trace(None, 40)
+            return
+        with trace(f"open {depth}"):
+            nested(depth - 1)
+
+    with trace("root") as root:
+        root.enable_spilling(tmp_path / "spill", max_nodes=20)
+        nested(30)
+    # Without hysteresis, each of 120 closed nodes would walk the whole tree
+    assert 0 < len(walks) < 20
+    assert len(root.find_nodes(lambda n: n.name == "inner")) == 40
+
+
+def test_spill_open_generator_in_closed_node(tmp_path):
+    @with_trace
+    def tokens(n):
+        for i in range(n):
+            yield f"t{i}"
+        return "done"
+
+    with trace("root") as root:
+        root.enable_spilling(tmp_path / "spill", max_nodes=5)
+        with trace("req"):
+            gen = tokens(3)
+            assert next(gen) == "t0"
+        # "req" is closed, but the generator node inside it is still open
+        build_trace(root, 10)
+        assert not isinstance(root.children[0], SpilledNode)
+        assert list(gen) == ["t1", "t2"]
+        build_trace(root, 10)
+
+    req = root.to_dict()["children"][0]
+    [generator] = req["children"]
+    assert generator.get("state", "finished") == "finished"
+    assert {"kind": "output", "value": ["t0", "t1", "t2"]} in generator["entries"]
@@ -0,0 +1,75 @@
+import json
+import time
+from datetime import timedelta
+
+from nicetrace import DirWriter, trace
+from nicetrace.stats import (
+    Histogram,
+    add_stats_node,
+    disable_stats,
+    enable_stats,
+    get_stats,
+    reset_stats,
+    write_stats,
+)
+from nicetrace import stats
+
+
+def test_histogram():
+    h = Histogram()
+    for value in [0, 1, 3, 3, 100]:
+        h.add(value)
+    assert h.to_dict() == {
+        "count": 5,
+        "total": 107,
+        "mean": 21.4,
+        "max": 100,
+        "buckets": {"<1": 1, "<2": 1, "<4": 2, "<128": 1},
+    }
+
+
+def test_stats_disabled():
+    assert get_stats() is None
+    with trace("root", inputs={"a": 1}):
+        pass
+    assert stats.STATS is None
+
+
+def test_stats(tmp_path):
+    enable_stats()
+    try:
+        with DirWriter(str(tmp_path), min_write_delay=timedelta(seconds=10)) as writer:
+            with trace("root", inputs={"a": [1, 2, 3]}) as root:
+                for i in range(3):
+                    with trace("child", inputs={"i": i}):
+                        time.sleep(0.001)
+                writer.sync()
+                add_stats_node()
+            root.to_dict()
+        s = get_stats()
+        assert s["counters"] == {"nodes": 4}
+        histograms = s["histograms"]
+        assert histograms["serialize_us"]["count"] >= 4
+        # Writers stream traces, only the explicit `to_dict` creates a snapshot
+        assert histograms["to_dict_us"]["count"] >= 1
+        assert histograms["lock_wait_us"]["count"] >= 3
+        assert histograms["write_file_us"]["count"] >= 1
+        assert histograms["write_file_bytes"]["max"] > 0
+        assert histograms["pending_nodes"]["count"] >= 1
+        assert histograms["flush_us"]["count"] >= 1
+
+        stats_node = root.children[-1]
+        assert stats_node.kind == "stats"
+        assert (
+            stats_node.entries[0]["value"]["histograms"]["serialize_us"]["count"] >= 4
+        )
+
+        write_stats(tmp_path / "stats.json")
+        with open(tmp_path / "stats.json") as f:
+            assert json.load(f)["histograms"]["serialize_us"]["count"] >= 4
+
+        reset_stats()
+        assert get_stats() == {"counters": {}, "histograms": {}}
+    finally:
+        disable_stats()
+    assert get_stats() is None
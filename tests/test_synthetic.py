@@ -0,0 +1,79 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from nicetrace import DirReader, DirWriter
+from nicetrace.synthetic import (
+    TraceShape,
+    generate_trace,
+    generate_traces,
+    load_test,
+    percentiles,
+)
+
+
+def _count_nodes(node):
+    return 1 + sum(_count_nodes(child) for child in node.get("children", ()))
+
+
+def test_generate_trace():
+    shape = TraceShape(depth=3, fanout=2, payload_size=10, blob_size=5)
+    root = generate_trace(shape, seed=1)
+    data = root.to_dict()
+    assert _count_nodes(data) == 1 + 2 + 4 + 8
+    assert data.get("state", "finished") == "finished"
+    again = generate_trace(shape, seed=1).to_dict()
+    assert again["children"][0]["name"] == data["children"][0]["name"]
+
+    root = generate_trace(TraceShape(depth=2, fanout=2, error_rate=1.0), seed=1)
+    data = root.to_dict()
+    # Errors propagate up to the children of the root, the root handles them
+    assert data.get("state", "finished") == "finished"
+    assert all(child.get("state") == "error" for child in data["children"])
+
+
+def test_generate_traces(tmp_path):
+    shape = TraceShape(depth=2, fanout=2)
+    generate_traces(DirWriter(str(tmp_path)), 10, shape, concurrency=4)
+    summaries = DirReader(str(tmp_path)).list_summaries()
+    assert len(summaries) == 10
+    assert all(s["nodes"] == 7 for s in summaries)
+
+
+def test_percentiles():
+    values = [float(i) for i in range(1, 101)]
+    assert percentiles(values) == {"p50": 50.0, "p90": 90.0, "p99": 99.0}
+    assert percentiles([3.0], (50,)) == {"p50": 3.0}
+
+
+def test_load_test():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/api/list":
+                body = [{"storage_id": "trace-a"}, {"storage_id": "trace-b"}]
+            elif self.path.startswith("/api/traces/trace-"):
+                body = {"uid": self.path.rsplit("-", 1)[1]}
+            else:
+                self.send_error(404)
+                return
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("localhost", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://localhost:{server.server_address[1]}"
+        result = load_test(url, 50, concurrency=4, list_ratio=0.2)
+    finally:
+        server.shutdown()
+    assert result["errors"] == 0
+    latency = result["latency"]
+    assert latency["list"]["count"] + latency["traces"]["count"] == 50
+    assert latency["traces"]["p99"] >= latency["traces"]["p50"] > 0
@@ -1,5 +1,5 @@
 from nicetrace import TracingNodeState, current_tracing_node, trace, with_trace
-from nicetrace import Tag, Metadata
+from nicetrace import Tag, Metadata, TracingNode
 from nicetrace import trace_instant
 import pytest
 import copy
@@ -340,3 +340,246 @@ def test_to_dict(output):
             # only check attributes which are json serializable
             continue
         assert c_dict_val == c_val
+
+
+def test_with_trace_capture_options():
+    @with_trace(capture_inputs=["a", "kw"], capture_output=False)
+    def f1(a, b, *args, kw=None, **kwargs):
+        return a
+
+    @with_trace(exclude_inputs=["b"])
+    def f2(a, b, *args, kw=None, **kwargs):
+        return a
+
+    @with_trace(capture_inputs=False)
+    def f3(a):
+        return a
+
+    with trace("root") as c:
+        f1(1, 2, 3, kw=4, other=5)
+        f2(1, 2, 3, other=5, kw=4)
+        f2(b=2, a=1)
+        f3(1)
+
+    output = strip_tree(c.to_dict())
+    assert [ch["entries"] for ch in output["children"]] == [
+        [
+            {"kind": "input", "name": "a", "value": 1},
+            {"kind": "input", "name": "kw", "value": 4},
+        ],
+        [
+            {"kind": "input", "name": "a", "value": 1},
+            {"kind": "input", "name": "args", "value": [3]},
+            {"kind": "input", "name": "kw", "value": 4},
+            {"kind": "input", "name": "kwargs", "value": {"other": 5}},
+            {"kind": "output", "value": 1},
+        ],
+        [
+            {"kind": "input", "name": "a", "value": 1},
+            {"kind": "output", "value": 1},
+        ],
+        [
+            {"kind": "output", "value": 1},
+        ],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_async_with_trace_meta():
+    @with_trace(meta=Metadata(icon="query"))
+    async def query(prompt):
+        """Doc"""
+        return "answer"
+
+    assert query.__name__ == "query"
+    assert query.__doc__ == "Doc"
+
+    with trace("root") as c:
+        await query("Hello")
+
+    output = strip_tree(c.to_dict())
+    assert output["children"] == [
+        {
+            "name": "query",
+            "kind": "acall",
+            "entries": [
+                {"kind": "input", "name": "prompt", "value": "Hello"},
+                {"kind": "output", "value": "answer"},
+            ],
+            "meta": {"icon": "query", "_type": "Metadata"},
+        }
+    ]
+
+
+def test_with_trace_generator():
+    @with_trace
+    def tokens(n):
+        for i in range(n):
+            with trace(f"token {i}"):
+                pass
+            yield f"t{i}"
+        return "done"
+
+    @with_trace
+    def failing():
+        yield 1
+        raise Exception("Stream failed")
+
+    with trace("root") as c:
+        gen = tokens(200)
+        assert c.children is None
+        assert "".join(gen) == "".join(f"t{i}" for i in range(200))
+        assert current_tracing_node() is c
+
+        with pytest.raises(Exception, match="Stream failed"):
+            list(failing())
+
+        gen = tokens(10)
+        assert next(gen) == "t0"
+        assert next(gen) == "t1"
+        gen.close()
+
+    n1, n2, n3 = c.children
+    assert n1.state == TracingNodeState.FINISHED
+    assert [ch.name for ch in n1.children] == [f"token {i}" for i in range(200)]
+    output, ret, stream = n1.entries[1:]
+    assert output == {"kind": "output", "value": [f"t{i}" for i in range(200)]}
+    assert ret == {"kind": "output", "name": "return", "value": "done"}
+    assert stream["kind"] == "stream"
+    assert stream["value"]["items"] == 200
+    assert stream["value"]["time_to_first_item"] >= 0
+    assert stream["value"]["max_inter_item_time"] >= 0
+
+    assert n2.state == TracingNodeState.ERROR
+    assert n2.entries[0] == {"kind": "output", "value": [1]}
+    assert n2.entries[-1]["value"]["message"] == "Stream failed"
+
+    assert n3.state == TracingNodeState.FINISHED
+    assert n3.entries[1] == {"kind": "output", "value": ["t0", "t1"]}
+    assert n3.entries[2]["value"]["items"] == 2
+
+
+@pytest.mark.asyncio
+async def test_with_trace_async_generator():
+    @with_trace
+    async def tokens(n):
+        for i in range(n):
+            assert current_tracing_node().name == "tokens"
+            yield i
+
+    with trace("root") as c:
+        assert [i async for i in tokens(5)] == [0, 1, 2, 3, 4]
+        agen = tokens(5)
+        assert await agen.__anext__() == 0
+        await agen.aclose()
+        assert current_tracing_node() is c
+
+    n1, n2 = c.children
+    assert n1.kind == "acall"
+    assert n1.entries[1] == {"kind": "output", "value": [0, 1, 2, 3, 4]}
+    assert n2.state == TracingNodeState.FINISHED
+    assert n2.entries[-1]["value"]["items"] == 1
+
+
+def test_counters_roll_up():
+    with trace("root") as root:
+        with trace("chain"):
+            with trace("llm", meta=Metadata(counters={"tokens": 10})):
+                pass
+            with trace("llm", meta=Metadata(counters={"tokens": 5, "cost": 1})):
+                pass
+            assert root.total_counters == {}
+        root.add_instant("cached", meta=Metadata(counters={"tokens": 2}))
+        with trace("other"):
+            pass
+        with trace("running", meta=Metadata(counters={"tokens": 100})):
+            # Open nodes are not included
+            assert root.total_counters == {"tokens": 17, "cost": 1}
+
+    chain, _, other, _ = root.children
+    assert chain.total_counters == {"tokens": 15, "cost": 1}
+    assert other.total_counters == {}
+    assert root.total_counters == {"tokens": 117, "cost": 1}
+
+    data = root.to_dict()
+    assert data["total_counters"] == {"tokens": 117, "cost": 1}
+    assert data["children"][0]["total_counters"] == {"tokens": 15, "cost": 1}
+    assert "total_counters" not in data["children"][2]
+    assert TracingNode.from_dict(data).to_dict() == data
+
+
+def test_exception_chain():
+    from nicetrace import configure_exceptions
+
+    def fail(n):
+        if n == 0:
+            raise ValueError("Inner")
+        try:
+            fail(n - 1)
+        except Exception as e:
+            raise Exception(f"Outer {n}") from e
+
+    with pytest.raises(Exception):
+        with trace("root") as root:
+            fail(2)
+    value = root.to_dict()["entries"][0]["value"]
+    assert value["message"] == "Outer 2"
+    assert "tracing" not in value
+    assert value["cause"]["message"] == "Outer 1"
+    assert value["cause"]["cause"]["message"] == "Inner"
+    assert value["cause"]["cause"]["traceback"]["frames"][-1]["line"] == (
+        'raise ValueError("Inner")'
+    )
+
+    configure_exceptions(max_chain=2, max_frames=1, source_lines=False)
+    try:
+        with pytest.raises(Exception):
+            with trace("root") as root:
+                fail(2)
+    finally:
+        configure_exceptions()
+    value = root.to_dict()["entries"][0]["value"]
+    assert value["cause"]["skipped_chain"]
+    assert "cause" not in value["cause"]
+    traceback = value["cause"]["traceback"]
+    # Frames of `fail(2)` and `fail(1)`, only the innermost is kept
+    assert traceback["skipped_frames"] == 1
+    [frame] = traceback["frames"]
+    assert frame == {"name": "fail", "filename": __file__, "lineno": frame["lineno"]}
+
+
+def test_exception_cycle():
+    a = Exception("A")
+    b = Exception("B")
+    a.__context__ = b
+    b.__context__ = a
+    with trace("root") as root:
+        root.add_output("error", a)
+    value = root.to_dict()["entries"][0]["value"]
+    assert value["tracing"]["message"] == "B"
+    assert "tracing" not in value["tracing"]
+
+
+def test_exception_same_code_in_different_files():
+    source = "def fail():\n    raise ValueError('x')\n"
+    frames = []
+    for filename in ("/a/one.py", "/b/two.py"):
+        namespace = {}
+        exec(compile(source, filename, "exec"), namespace)
+        with pytest.raises(ValueError):
+            with trace("root") as root:
+                namespace["fail"]()
+        value = root.to_dict()["entries"][0]["value"]
+        frames.append(value["traceback"]["frames"][-1])
+    assert [frame["filename"] for frame in frames] == ["/a/one.py", "/b/two.py"]
+
+
+def test_user_dict_with_traceback_key():
+    from nicetrace.serialization import reference_tracebacks, resolve_tracebacks
+
+    with trace("root") as root:
+        root.add_output("a", {"traceback": {"frames": ["not a frame"]}})
+        root.add_output("b", {"traceback": "text", "cause": {"traceback": 1}})
+    data = root.to_dict()
+    assert reference_tracebacks(data) == data
+    assert resolve_tracebacks(data) == data
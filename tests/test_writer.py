@@ -2,6 +2,10 @@ from nicetrace import current_writer, DirWriter, FileWriter
 from nicetrace import trace
 import json
 import time
+import os
+import subprocess
+import sys
+import pytest
 
 
 def test_writer_contextvar(tmp_path):
@@ -87,3 +91,118 @@ def test_file_writer(tmp_path):
     data2 = read()
     assert "state" not in data2
     assert data["uid"] != data2["uid"]
+
+
+def test_write_file_durability(tmp_path, monkeypatch):
+    from nicetrace.writer import filewriter
+
+    cwd = tmp_path / "cwd"
+    cwd.mkdir()
+    monkeypatch.chdir(cwd)
+    target = tmp_path / "target"
+    target.mkdir()
+
+    fsynced = []
+    original_fsync = os.fsync
+
+    def fsync(fd):
+        fsynced.append(fd)
+        original_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", fsync)
+
+    filewriter.write_file(target / "a.json", "abc")
+    assert fsynced == []
+    filewriter.write_file(target / "a.json", "xyz", "safe")
+    # File and directory
+    assert len(fsynced) == 2
+    with open(target / "a.json") as f:
+        assert f.read() == "xyz"
+    # Temporary files are created in the target directory and removed
+    assert os.listdir(cwd) == []
+    assert os.listdir(target) == ["a.json"]
+
+
+@pytest.mark.parametrize("durability", ["fast", "safe", "batched"])
+def test_dir_writer_durability(tmp_path, durability):
+    with DirWriter(tmp_path, durability=durability) as writer:
+        with trace("Hello") as node:
+            with trace("Child"):
+                pass
+        if durability == "batched":
+            assert writer.unsynced
+    assert writer.unsynced == set()
+    with open(tmp_path / f"trace-{node.uid}.json") as f:
+        assert json.loads(f.read())["children"][0]["name"] == "Child"
+
+
+def test_invalid_durability(tmp_path):
+    with pytest.raises(Exception, match="Invalid durability"):
+        DirWriter(tmp_path, durability="slow")
+
+
+def test_dir_writer_flushes_at_exit(tmp_path):
+    script = f"""
+from datetime import timedelta
+from nicetrace import DirWriter, trace
+from nicetrace.tracing import start_trace_block
+
+writer = DirWriter({str(tmp_path)!r}, min_write_delay=timedelta(seconds=60))
+writer.start()
+start_trace_block("Root", None, None, None, writer, None)
+with trace("Child", writer=writer):
+    pass
+# Exits without stopping the writer and closing "Root", "Child" is only pending
+"""
+    src = os.path.join(os.path.dirname(__file__), "..", "src")
+    env = dict(os.environ, PYTHONPATH=src)
+    subprocess.run([sys.executable, "-c", script], env=env, check=True, timeout=30)
+    (filename,) = [f for f in os.listdir(tmp_path) if f.endswith(".json")]
+    with open(tmp_path / filename) as f:
+        data = json.load(f)
+    assert [c["name"] for c in data["children"]] == ["Child"]
+
+
+def test_write_trace_streamed(tmp_path):
+    from nicetrace.writer.base import serialize_trace
+    from nicetrace.writer.stream import write_trace
+
+    def check(node):
+        filename = tmp_path / "streamed.json"
+        with open(filename, "wb") as f:
+            write_trace(node, f)
+        with open(filename) as f:
+            assert json.load(f) == json.loads(serialize_trace(node))
+
+    with trace("root") as root:
+        check(root)
+        with trace("open") as node:
+            node.add_input("x", {"a": [1, 2]})
+            with trace("inner"):
+                pass
+            check(root)
+        try:
+            with trace("failing"):
+                raise Exception("Fail")
+        except Exception:
+            pass
+    check(root)
+    check(node)
+
+
+def test_write_trace_streamed_spilled(tmp_path):
+    from nicetrace.writer.base import serialize_trace
+
+    with trace("root") as root:
+        root.enable_spilling(tmp_path / "spill", max_nodes=10)
+        for i in range(30):
+            with trace(f"step {i}", inputs={"i": i}):
+                with trace("inner"):
+                    pass
+    with DirWriter(tmp_path / "traces") as writer:
+        writer.write_node(root, True)
+    with open(tmp_path / "traces" / f"trace-{root.uid}.json") as f:
+        data = json.load(f)
+    assert data == json.loads(serialize_trace(root))
+    assert data["header"]["nodes"] == 61
+    assert [c["name"] for c in data["children"]] == [f"step {i}" for i in range(30)]